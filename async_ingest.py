@@ -0,0 +1,383 @@
+"""
+async_ingest.py
+Refresh both data sources at once on one asyncio event loop.
+
+The Marvel catalogue download and the Disney page crawl run as two
+concurrent tasks, with at most --per-host requests in flight to any one
+host. Neither task touches SQLite directly: every write is handed to a
+single writer task that owns the only connection and runs the jobs one
+at a time, so the two sources never contend for the database lock.
+
+Rows are built by the same code as the blocking scripts
+(marvel_api.insert_hero_batch / split_hero_data and
+disney_api.crawl_page / store_page), and the same caps, API cache and
+resume cursor apply.
+
+aiohttp is used when it is installed; otherwise requests calls are run
+in worker threads with asyncio.to_thread.
+
+    python async_ingest.py [--only marvel|disney] [--bulk] [--max-new N]
+                           [--restart] [--per-host N]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import time
+import urllib.parse
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import create_marvel_db
+import database
+import disney_api
+import marvel_api
+import marvel_similarity
+import search
+
+DEFAULT_PER_HOST = 4
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+# ---------- HTTP clients ----------
+
+class HostLimitedClient:
+    """
+    Base for the clients: one semaphore per host bounds the requests
+    in flight. get() returns (status, headers, body bytes) and raises
+    OSError on connection problems.
+    """
+
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        self.per_host = per_host
+        self.semaphores = {}
+
+    def limit(self, url):
+        """
+        The semaphore that bounds in-flight requests to url's host.
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self.semaphores[host]
+
+
+class ThreadedClient(HostLimitedClient):
+    """
+    Fallback client: blocking requests calls run in worker threads.
+    """
+
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        super().__init__(per_host)
+        self.session = disney_api.make_session(per_host)
+
+    async def get(self, url, params=None, headers=None):
+        async with self.limit(url):
+            try:
+                resp = await asyncio.to_thread(
+                    self.session.get, url, params=params, headers=headers,
+                    timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+            except requests.RequestException as e:
+                raise OSError(str(e)) from e
+            return resp.status_code, resp.headers, resp.content
+
+    async def close(self):
+        self.session.close()
+
+
+class AiohttpClient(HostLimitedClient):
+    """
+    Native asyncio client, used when aiohttp is installed.
+    """
+
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        super().__init__(per_host)
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+        )
+
+    async def get(self, url, params=None, headers=None):
+        async with self.limit(url):
+            try:
+                async with self.session.get(url, params=params, headers=headers) as resp:
+                    return resp.status, resp.headers, await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise OSError(str(e)) from e
+
+    async def close(self):
+        await self.session.close()
+
+
+def make_client(per_host=DEFAULT_PER_HOST, use_aiohttp=True):
+    if use_aiohttp and aiohttp is not None:
+        return AiohttpClient(per_host)
+    return ThreadedClient(per_host)
+
+
+# ---------- Writer ----------
+
+async def db_writer(jobs):
+    """
+    The only task that writes to SQLite. Each job is (func, future):
+    func(cur) runs in a worker thread on this task's connection, is
+    committed, and its result (or exception) is set on future.
+    A None job stops the writer.
+    """
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        while True:
+            item = await jobs.get()
+            if item is None:
+                return
+            func, future = item
+            try:
+                result = await asyncio.to_thread(func, cur)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+    finally:
+        database.release_connection(conn)
+
+
+async def submit(jobs, func):
+    """
+    Queue func(cur) for the writer and wait for its result.
+    """
+    future = asyncio.get_running_loop().create_future()
+    await jobs.put((func, future))
+    return await future
+
+
+# ---------- Marvel ----------
+
+async def fetch_all_heroes_async(client, url=marvel_api.ALL_URL, ttl=marvel_api.CACHE_TTL_SECONDS):
+    """
+    fetch_all_heroes on the event loop: same disk cache, TTL and
+    ETag/Last-Modified revalidation, then the JSON is decoded in a thread.
+    """
+    body_path, meta_path = marvel_api.get_cache_paths(url)
+    meta = marvel_api.load_cache_meta(meta_path)
+    have_body = os.path.exists(body_path)
+
+    if marvel_api.cache_is_fresh(meta, have_body, ttl):
+        marvel_api.CACHE_STATS["hits"] += 1
+    else:
+        headers = marvel_api.get_revalidation_headers(meta, have_body)
+        try:
+            status, resp_headers, body = await client.get(url, headers=headers)
+        except OSError as e:
+            if not have_body:
+                raise
+            print(f"Request failed ({e}); using stale cached copy.")
+            status = None
+            marvel_api.CACHE_STATS["hits"] += 1
+
+        action = None if status is None else marvel_api.classify_response(status, have_body)
+        if action == "revalidated":
+            marvel_api.mark_revalidated(meta_path, meta)
+        elif action is not None:
+            if action == "refetch":
+                status, resp_headers, body = await client.get(url)
+                if status == 304:
+                    raise OSError(f"GET {url} returned 304 with nothing cached")
+            if status != 200:
+                raise OSError(f"GET {url} returned HTTP {status}")
+            await asyncio.to_thread(marvel_api.save_cached_response, url, [body], resp_headers)
+
+    def load():
+        with open(body_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    heroes = await asyncio.to_thread(load)
+    marvel_api.print_cache_stats()
+    print(f"Got {len(heroes)} heroes from API.")
+    return heroes
+
+
+def insert_marvel_batch(cur, heroes, state):
+    """
+    Writer job: one batch through marvel_api.insert_hero_batch, with the
+    lookup cache carried over in state.
+    """
+    inserted, processed, state["lookup_cache"] = marvel_api.insert_hero_batch(
+        cur, heroes, state.get("lookup_cache")
+    )
+    return inserted
+
+
+async def ingest_marvel(client, jobs, url=marvel_api.ALL_URL, max_new=25):
+    """
+    Download the catalogue and store the heroes that are new
+    (at most max_new; None for all of them). Returns heroes inserted.
+    """
+    await submit(jobs, lambda cur: create_marvel_db.create_power_index_tables(cur))
+    existing_ids, heroes = await asyncio.gather(
+        submit(jobs, lambda cur: marvel_api.get_existing_hero_ids(cur.connection)),
+        fetch_all_heroes_async(client, url),
+    )
+    new_heroes = marvel_api.choose_new_heroes(heroes, existing_ids, max_new=max_new)
+
+    inserted = 0
+    state = {}
+    for i in range(0, len(new_heroes), marvel_api.STORE_BATCH_SIZE):
+        batch = new_heroes[i:i + marvel_api.STORE_BATCH_SIZE]
+        inserted += await submit(jobs, functools.partial(insert_marvel_batch, heroes=batch, state=state))
+    if inserted:
+        await submit(jobs, search.apply_search_queue)
+        # after the last batch is committed, like marvel_api.store_marvel_data
+        await submit(jobs, lambda cur: marvel_similarity.refresh_index())
+    print(f"Inserted {inserted} heroes.")
+    return inserted
+
+
+# ---------- Disney ----------
+
+async def fetch_disney_page(client, url, page, retries=disney_api.MAX_RETRIES,
+                            backoff=disney_api.BACKOFF_SECONDS):
+    """
+    disney_api.fetch_page on the event loop (same retry rules).
+    """
+    for attempt in range(retries + 1):
+        try:
+            status, _, body = await client.get(url, params={"page": page})
+        except OSError:
+            status = None
+
+        if status == 200:
+            return json.loads(body)
+        # client errors (other than rate limiting) won't fix themselves
+        if status is not None and 400 <= status < 500 and status != 429:
+            return None
+
+        if attempt < retries:
+            await asyncio.sleep(backoff * (2 ** attempt))
+    return None
+
+
+async def ingest_disney(client, jobs, url=disney_api.BASE_URL, resume=True, ahead=DEFAULT_PER_HOST):
+    """
+    Crawl pages from the resume cursor, keeping `ahead` page downloads
+    in flight while the writer stores earlier pages in order.
+    Returns the run's counts.
+    """
+    # setup_database opens its own connection; running it as a job keeps
+    # it from overlapping any other write
+    await submit(jobs, lambda cur: disney_api.setup_database())
+    crawl = await submit(jobs, lambda cur: disney_api.begin_crawl(cur, resume))
+
+    page = crawl["cursor_page"] + 1
+    downloads = {
+        p: asyncio.create_task(fetch_disney_page(client, url, p))
+        for p in range(page, page + ahead)
+    }
+    try:
+        while not disney_api.crawl_full(crawl):
+            data = await downloads.pop(page)
+            if not data or not data.get("data"):
+                break
+            await submit(jobs, functools.partial(
+                disney_api.crawl_page, page=page, characters=data["data"], crawl=crawl,
+            ))
+            downloads[page + ahead] = asyncio.create_task(fetch_disney_page(client, url, page + ahead))
+            page += 1
+    finally:
+        for task in downloads.values():
+            task.cancel()
+
+    await submit(jobs, search.apply_search_queue)
+    # queued after the last page, so it reads what the writer committed;
+    # a restarted run may stop short of the cursor an earlier run saved
+    crawl["cursor_page"] = await submit(jobs, disney_api.get_crawl_cursor)
+    disney_api.print_crawl_summary(crawl)
+    return crawl["counts"]
+
+
+# ---------- Runner ----------
+
+async def run_ingest(marvel=True, disney=True, max_new=25, resume=True,
+                     per_host=DEFAULT_PER_HOST, use_aiohttp=True,
+                     marvel_url=marvel_api.ALL_URL, disney_url=disney_api.BASE_URL):
+    """
+    Run the selected sources concurrently. Returns {source: result}.
+    If the writer fails, the sources are cancelled and its error raised.
+    """
+    jobs = asyncio.Queue()
+    writer = asyncio.create_task(db_writer(jobs))
+    client = make_client(per_host, use_aiohttp)
+
+    sources = {}
+    if marvel:
+        sources["marvel"] = ingest_marvel(client, jobs, marvel_url, max_new)
+    if disney:
+        sources["disney"] = ingest_disney(client, jobs, disney_url, resume, per_host)
+
+    tasks = [asyncio.create_task(source) for source in sources.values()]
+    ingest = asyncio.gather(*tasks)
+    try:
+        await asyncio.wait([ingest, writer], return_when=asyncio.FIRST_COMPLETED)
+        if not ingest.done():
+            writer.result()
+            raise RuntimeError("database writer stopped before the ingest finished")
+        results = ingest.result()
+    finally:
+        # a source waiting on a dead writer (or outliving a failed one)
+        # would never finish
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(ingest, *tasks, return_exceptions=True)
+        if not writer.done():
+            await jobs.put(None)
+            await writer
+        await client.close()
+    return dict(zip(sources, results))
+
+
+def main(marvel=True, disney=True, bulk=False, max_new=25, resume=True,
+         per_host=DEFAULT_PER_HOST, use_aiohttp=True, **urls):
+    start = time.perf_counter()
+    results = asyncio.run(run_ingest(
+        marvel=marvel, disney=disney, max_new=None if bulk else max_new,
+        resume=resume, per_host=per_host, use_aiohttp=use_aiohttp, **urls,
+    ))
+    client = "aiohttp" if use_aiohttp and aiohttp is not None else "threads"
+    print(f"Async ingest ({client}) finished in {time.perf_counter() - start:.3f}s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh Marvel and Disney data concurrently")
+    parser.add_argument("--only", choices=["marvel", "disney"],
+                        help="refresh one source only")
+    parser.add_argument("--bulk", action="store_true",
+                        help="store every Marvel hero that is not stored yet")
+    parser.add_argument("--max-new", type=int, default=25,
+                        help="Marvel heroes to add per run (default 25)")
+    parser.add_argument("--restart", action="store_true",
+                        help="crawl Disney from page 1 instead of the saved cursor")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help="requests in flight per host")
+    parser.add_argument("--no-aiohttp", action="store_true",
+                        help="use requests in threads even if aiohttp is installed")
+    args = parser.parse_args()
+
+    main(
+        marvel=args.only in (None, "marvel"),
+        disney=args.only in (None, "disney"),
+        bulk=args.bulk,
+        max_new=args.max_new,
+        resume=not args.restart,
+        per_host=args.per_host,
+        use_aiohttp=not args.no_aiohttp,
+    )
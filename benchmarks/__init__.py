@@ -0,0 +1,16 @@
+"""
+Benchmarks for the ingest and analysis scripts.
+
+Run them from the project root, e.g.:
+
+    python -m benchmarks.bench_disney_resume
+
+benchmarks/suite.py runs every entry point end-to-end at a chosen
+scale and keeps a history file for before/after comparisons:
+
+    python -m benchmarks.suite run --scale medium
+    python -m benchmarks.suite compare
+
+They only talk to a local stand-in server (benchmarks/mock_server.py)
+and temporary databases, never to the real APIs or final_project.db.
+"""
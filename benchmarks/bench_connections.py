@@ -0,0 +1,91 @@
+"""
+Report workloads with a fresh default sqlite3 connection per call
+(the old behaviour) versus pooled, tuned connections from database.py.
+
+    python -m benchmarks.bench_connections [--repeat 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import calculations
+import database
+import marvel_analysis
+import marvel_write_results
+from benchmarks.fixtures import populate_database
+from benchmarks.synthetic import make_disney_characters, make_heroes
+
+
+def report_workload(out_dir):
+    """
+    One run of the text reports and the chart queries.
+    """
+    marvel_write_results.write_marvel_results(os.path.join(out_dir, "marvel_results.txt"))
+    marvel_analysis.calculate_power_index(top_n=10)
+    marvel_analysis.calculate_alignment_averages()
+    calculations.calculate_character_stats()
+    calculations.calculate_media_spread()
+
+
+@contextlib.contextmanager
+def unpooled_connections():
+    """
+    Temporarily make database.get_connection behave like the old
+    sqlite3.connect(DB_NAME) with default settings.
+    """
+    saved_get = database.get_connection
+    saved_release = database.release_connection
+    path = database.get_db_path()
+    database.get_connection = lambda db_path=None: sqlite3.connect(db_path or path)
+    database.release_connection = lambda conn: conn.close()
+    try:
+        yield
+    finally:
+        database.get_connection = saved_get
+        database.release_connection = saved_release
+
+
+def time_workload(repeat, out_dir):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            report_workload(out_dir)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--heroes", type=int, default=5000)
+    parser.add_argument("--characters", type=int, default=5000)
+    args = parser.parse_args()
+
+    saved_db = database.get_db_path()
+    saved_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            populate_database(os.path.join(tmp, "bench.db"),
+                              make_heroes(args.heroes),
+                              make_disney_characters(args.characters))
+            # calculate_character_stats writes calculated_stats.txt to the cwd
+            os.chdir(tmp)
+            with unpooled_connections():
+                old = time_workload(args.repeat, tmp)
+            new = time_workload(args.repeat, tmp)
+        finally:
+            os.chdir(saved_cwd)
+            database.set_db_path(saved_db)
+
+    print(f"report workload, {args.heroes} heroes / {args.characters} characters")
+    print(f"  sqlite3.connect per call : {old * 1000:8.2f} ms/run")
+    print(f"  pooled, tuned connections: {new * 1000:8.2f} ms/run")
+    print(f"  speedup                  : {old / new:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
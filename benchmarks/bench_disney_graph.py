@@ -0,0 +1,124 @@
+"""
+Co-appearance graph build time per engine (disney_graph.py).
+
+    python -m benchmarks.bench_disney_graph [--characters 100000] [--links 1000000]
+
+A database with the given number of characters and character_media
+links is filled directly (titles drawn uniformly from --titles), then the
+graph is built with every available engine. All engines must produce
+the same CSR arrays; the script exits with status 1 if they don't.
+Cached lookups (top-N, one character's co-stars) are timed afterwards.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import database
+import disney_api
+import disney_graph
+
+GRAPH_KEYS = ["character_ids", "indptr", "indices", "counts", "degree", "strength"]
+
+
+def build_database(path, characters, links, titles, seed=0):
+    """
+    characters rows, links distinct character_media rows spread evenly
+    over the characters, titles drawn uniformly from a pool.
+    """
+    rng = random.Random(seed)
+    database.set_db_path(path)
+    disney_api.setup_database()
+    conn = database.get_connection()
+    cur = conn.cursor()
+    disney_api.seed_media_types(cur)
+    type_ids = list(disney_api.load_type_ids(cur).values())
+
+    cur.executemany("INSERT INTO characters (id, name) VALUES (?, ?)",
+                    ((i, f"Character {i}") for i in range(1, characters + 1)))
+    cur.executemany("INSERT INTO media_titles (title_id, title) VALUES (?, ?)",
+                    ((i, f"Title {i}") for i in range(1, titles + 1)))
+
+    def media_rows():
+        for n in range(links):
+            yield n % characters + 1, rng.choice(type_ids), rng.randint(1, titles)
+
+    cur.executemany(
+        "INSERT OR IGNORE INTO character_media (character_id, type_id, title_id) VALUES (?, ?, ?)",
+        media_rows(),
+    )
+    conn.commit()
+    database.release_connection(conn)
+
+
+def same_graph(a, b):
+    return all(
+        [int(x) for x in a[key]] == [int(x) for x in b[key]] for key in GRAPH_KEYS
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--characters", type=int, default=100_000)
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--engine", action="append", choices=disney_graph.ENGINES,
+                        help="engine to time (repeatable; default: all available)")
+    args = parser.parse_args()
+    engines = [e for e in (args.engine or disney_graph.ENGINES)
+               if e in disney_graph.available_engines()]
+
+    saved_db = database.get_db_path()
+    mismatches = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            build_database(os.path.join(tmp, "bench.db"), args.characters, args.links, args.titles)
+            print(f"{args.characters:,} characters, {args.links:,} links over "
+                  f"{args.titles:,} titles (built in {time.perf_counter() - start:.1f}s)")
+
+            graphs = {}
+            conn = database.get_connection()
+            cur = conn.cursor()
+            print(f"{'engine':8s} {'build':>9s} {'pairs':>12s}")
+            for engine in engines:
+                start = time.perf_counter()
+                graphs[engine] = disney_graph.compute_coappearance(cur, engine)
+                elapsed = time.perf_counter() - start
+                print(f"{engine:8s} {elapsed:8.2f}s {len(graphs[engine]['counts']):12,d}")
+            database.release_connection(conn)
+
+            reference = engines[0]
+            mismatches = [e for e in engines[1:] if not same_graph(graphs[reference], graphs[e])]
+            print("engines agree:", "yes" if not mismatches else "NO: " + ", ".join(mismatches))
+
+            disney_graph.clear_cache()
+            start = time.perf_counter()
+            disney_graph.get_coappearance()
+            first = time.perf_counter() - start
+
+            start = time.perf_counter()
+            top = disney_graph.top_connected(10)
+            top_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            disney_graph.coappearances(top[0][0], 10)
+            costars_time = time.perf_counter() - start
+            database.close_all()
+    finally:
+        database.set_db_path(saved_db)
+
+    print(f"get_coappearance, cold:         {first * 1000:9.1f}ms")
+    print(f"top_connected(10), cached:      {top_time * 1000:9.2f}ms")
+    print(f"coappearances(id, 10), cached:  {costars_time * 1000:9.2f}ms")
+    print(f"most connected: {top[0][1]} ({top[0][2]} co-stars, {top[0][3]} shared appearances)")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Disney aggregate queries on a synthetic 1M-row character_media table,
+before and after migrate_disney_schema. The query plans themselves are
+checked by tests/test_disney_indexes.py.
+
+The "before" table is a legacy character_media without the UNIQUE
+constraint or any index; migrate_disney_schema adds the covering
+(character_id, type_id) index and the title-side index.
+
+    python -m benchmarks.bench_disney_indexes [--rows 1000000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import database
+import disney_api
+import disney_stats
+
+QUERIES = {
+    "character stats (disney_stats)": disney_stats.CHARACTER_STATS_SQL,
+    "appearances per character": """
+        select c.name, count(cm.id) as total
+        from characters c
+        left join character_media cm on c.id = cm.character_id
+        group by c.id
+        order by total desc
+    """,
+    "media spread top 10": """
+        select c.name, count(distinct cm.type_id) as spread
+        from characters c
+        left join character_media cm on c.id = cm.character_id
+        group by c.id
+        order by spread desc
+        limit 10
+    """,
+    "spread and total top 30": """
+        select c.name,
+               count(distinct cm.type_id) as spread,
+               count(cm.id) as total_appearances
+        from characters c
+        left join character_media cm on c.id = cm.character_id
+        group by c.id
+        order by total_appearances desc
+        limit 30
+    """,
+    "characters in one title": """
+        select count(distinct cm.character_id)
+        from character_media cm
+        where cm.title_id = 42
+    """,
+}
+
+
+def build_legacy_database(cur, characters, rows):
+    """
+    Disney tables as an old build would have them: character_media
+    without the UNIQUE constraint, filled with random links.
+    """
+    cur.execute("CREATE TABLE characters (id INTEGER PRIMARY KEY, name TEXT, image_url TEXT)")
+    cur.execute("""
+        CREATE TABLE character_media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            character_id INTEGER,
+            type_id INTEGER,
+            title_id INTEGER
+        )
+    """)
+    cur.execute("""
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+        INSERT INTO characters (id, name, image_url)
+        SELECT n, 'Character ' || n, NULL FROM seq
+    """, (characters,))
+    cur.execute("""
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+        INSERT INTO character_media (character_id, type_id, title_id)
+        SELECT abs(random()) % ? + 1, abs(random()) % 5 + 1, abs(random()) % 50000 + 1
+        FROM seq
+    """, (rows, characters))
+
+
+def time_queries(cur, repeat):
+    timings = {}
+    for name, sql in QUERIES.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cur.execute(sql)
+            cur.fetchall()
+        timings[name] = (time.perf_counter() - start) / repeat
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--characters", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = database.connect(os.path.join(tmp, "bench.db"))
+        cur = conn.cursor()
+        print(f"building {args.rows:,} character_media rows ...")
+        build_legacy_database(cur, args.characters, args.rows)
+        conn.commit()
+
+        before = time_queries(cur, args.repeat)
+        disney_api.migrate_disney_schema(cur)
+        conn.commit()
+        after = time_queries(cur, args.repeat)
+        conn.close()
+
+    print(f"{'query':32s} {'before':>10s} {'after':>10s} {'speedup':>8s}")
+    for name in QUERIES:
+        print(f"{name:32s} {before[name] * 1000:8.1f}ms {after[name] * 1000:8.1f}ms "
+              f"{before[name] / after[name]:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Pages fetched per Disney run, with and without the resume cursor.
+
+With resume the number of pages downloaded per run stays flat as the
+database grows; with --restart behaviour every run re-reads all earlier
+pages first.
+
+    python -m benchmarks.bench_disney_resume [--runs 15]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+import database
+import disney_api
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_disney_characters, make_disney_pages
+
+
+def run_crawls(base_url, server, runs, resume, concurrency):
+    """
+    Run store_characters `runs` times on a fresh database and return
+    the number of page requests each run made.
+    """
+    fetched = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_db_path(os.path.join(tmp, "bench.db"))
+        for _ in range(runs):
+            before = len(server.request_log)
+            with contextlib.redirect_stdout(io.StringIO()):
+                disney_api.store_characters(f"{base_url}/character",
+                                            concurrency=concurrency, resume=resume)
+            fetched.append(len(server.request_log) - before)
+        database.close_all()
+    return fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--characters", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=10)
+    # prefetching adds a few speculative requests per run; 1 keeps counts exact
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    characters = make_disney_characters(args.characters, max_titles=1)
+    pages = make_disney_pages(characters, args.page_size)
+    server, base_url = start_mock_server(disney_pages=pages)
+    saved_db = database.get_db_path()
+    try:
+        with_resume = run_crawls(base_url, server, args.runs, True, args.concurrency)
+        from_start = run_crawls(base_url, server, args.runs, False, args.concurrency)
+    finally:
+        database.set_db_path(saved_db)
+        stop_mock_server(server)
+
+    print("run  pages fetched (resume)  pages fetched (from page 1)")
+    for i, (a, b) in enumerate(zip(with_resume, from_start), start=1):
+        print(f"{i:3d}  {a:22d}  {b:27d}")
+    print(f"total {sum(with_resume):21d}  {sum(from_start):27d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Delta sync (disney_api.sync_characters) versus rebuilding the Disney
+tables from scratch, after a fraction of the characters changed.
+
+    python -m benchmarks.bench_disney_sync [--characters 20000] [--changed 0.01]
+
+The changed characters gain a title, lose one or get a new name. After
+the sync the stored characters and media are compared with a database
+built directly from the changed data; the script exits with status 1
+if they differ. A second sync with nothing changed is timed as well.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+import database
+import disney_api
+from benchmarks.fixtures import populate_database
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_disney_characters, make_disney_pages
+
+
+def change_characters(characters, fraction, seed=0):
+    """
+    Return a copy of characters with about fraction of them edited,
+    and the number edited.
+    """
+    rng = random.Random(seed)
+    changed = []
+    edited = 0
+    for character in characters:
+        character = {k: (list(v) if isinstance(v, list) else v) for k, v in character.items()}
+        if rng.random() < fraction:
+            edited += 1
+            kind = rng.choice(["add", "remove", "rename"])
+            if kind == "add":
+                character["films"].append(f"new film {rng.randrange(100)}")
+            elif kind == "remove" and any(character[k] for k in disney_api.MEDIA_TYPES):
+                key = rng.choice([k for k in disney_api.MEDIA_TYPES if character[k]])
+                character[key].pop(rng.randrange(len(character[key])))
+            else:
+                character["name"] += " (renamed)"
+        changed.append(character)
+    return changed, edited
+
+
+def dump_disney(path):
+    """
+    Characters and their media as plain values (ids of titles and media
+    rows depend on insert order, so titles are compared by text).
+    """
+    database.set_db_path(path)
+    conn = database.get_connection()
+    try:
+        characters = conn.execute(
+            "SELECT id, name, image_url, content_hash FROM characters ORDER BY id"
+        ).fetchall()
+        media = conn.execute("""
+            SELECT cm.character_id, mt.type_name, t.title
+            FROM character_media cm
+            JOIN media_types mt ON mt.type_id = cm.type_id
+            JOIN media_titles t ON t.title_id = cm.title_id
+            ORDER BY 1, 2, 3
+        """).fetchall()
+    finally:
+        database.release_connection(conn)
+    return characters, media
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--characters", type=int, default=20000)
+    parser.add_argument("--changed", type=float, default=0.01,
+                        help="fraction of characters edited between runs")
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    original = make_disney_characters(args.characters)
+    edited_characters, edited = change_characters(original, args.changed)
+
+    saved_db = database.get_db_path()
+    server, base_url = start_mock_server(disney_pages=make_disney_pages(edited_characters, args.page_size))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            sync_db = os.path.join(tmp, "sync.db")
+            rebuild_db = os.path.join(tmp, "rebuild.db")
+
+            populate_database(sync_db, characters=original)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                first = disney_api.sync_characters(f"{base_url}/character", concurrency=1)
+                sync_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                second = disney_api.sync_characters(f"{base_url}/character", concurrency=1)
+                noop_time = time.perf_counter() - start
+            database.close_all()
+
+            start = time.perf_counter()
+            populate_database(rebuild_db, characters=edited_characters)
+            rebuild_time = time.perf_counter() - start
+            database.close_all()
+
+            identical = dump_disney(sync_db) == dump_disney(rebuild_db)
+            database.close_all()
+    finally:
+        database.set_db_path(saved_db)
+        stop_mock_server(server)
+
+    print(f"{args.characters} characters, {edited} edited")
+    print(f"{'run':22s} {'seconds':>8s} {'unchanged':>10s} {'updated':>8s} {'new':>5s}")
+    for label, seconds, counts in [("delta sync", sync_time, first),
+                                   ("delta sync (no edits)", noop_time, second)]:
+        print(f"{label:22s} {seconds:8.3f} {counts['unchanged']:10d} "
+              f"{counts['updated']:8d} {counts['new']:5d}")
+    print(f"{'full rebuild':22s} {rebuild_time:8.3f}")
+    print("matches rebuild:", "yes" if identical else "NO")
+
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
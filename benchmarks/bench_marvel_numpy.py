@@ -0,0 +1,146 @@
+"""
+Power index and alignment averages: the original pure-Python loops
+versus SQL versus the NumPy backend, at several catalogue sizes.
+
+    python -m benchmarks.bench_marvel_numpy [--sizes 1000 100000 1000000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import create_marvel_db
+import database
+import marvel_analysis
+from create_marvel_db import STAT_NAMES
+
+
+def build_database(path, heroes):
+    """
+    Fill the Marvel tables with random heroes straight in SQL
+    (about 10% of the stats are NULL).
+    """
+    database.set_db_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+    conn = database.get_connection()
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO marvel_alignments (name) VALUES (?)",
+                    [("good",), ("bad",), ("neutral",), ("unknown",)])
+    cur.execute("""
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+        INSERT INTO marvel_hero_names (id, name) SELECT n, 'Hero ' || n FROM seq
+    """, (heroes,))
+    cur.execute("""
+        INSERT INTO marvel_heroes (id, name_id, alignment_id)
+        SELECT id, id, abs(random()) % 4 + 1 FROM marvel_hero_names
+    """)
+    stat_values = ", ".join(
+        "CASE WHEN abs(random()) % 10 = 0 THEN NULL ELSE abs(random()) % 100 + 1 END"
+        for _ in STAT_NAMES
+    )
+    cur.execute(f"""
+        INSERT INTO marvel_powerstats (hero_id, {", ".join(STAT_NAMES)})
+        SELECT id, {stat_values} FROM marvel_heroes
+    """)
+    conn.commit()
+    database.release_connection(conn)
+
+
+def python_loops():
+    """
+    The original implementation: fetch every joined row and average
+    the stats in Python loops.
+    """
+    conn = database.get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT h.id, n.name, p.intelligence, p.strength, p.speed,
+               p.durability, p.power, p.combat
+        FROM marvel_heroes AS h
+        JOIN marvel_hero_names AS n ON h.name_id = n.id
+        JOIN marvel_powerstats AS p ON h.id = p.hero_id
+    """)
+    power = []
+    for row in cur.fetchall():
+        values = [v for v in row[2:] if v is not None]
+        if values:
+            power.append((row[0], row[1], sum(values) / float(len(values))))
+    power.sort(key=lambda x: x[2], reverse=True)
+
+    cur.execute("""
+        SELECT a.name, p.intelligence, p.strength, p.speed,
+               p.durability, p.power, p.combat
+        FROM marvel_heroes AS h
+        JOIN marvel_alignments AS a ON h.alignment_id = a.id
+        JOIN marvel_powerstats AS p ON h.id = p.hero_id
+    """)
+    by_alignment = {}
+    for row in cur.fetchall():
+        lists = by_alignment.setdefault(row[0], {s: [] for s in STAT_NAMES})
+        for name, v in zip(STAT_NAMES, row[1:]):
+            if v is not None:
+                lists[name].append(v)
+    averages = [
+        (a, {s: sum(v) / float(len(v)) if v else None for s, v in lists.items()})
+        for a, lists in by_alignment.items()
+    ]
+    database.release_connection(conn)
+    return power[:10], averages
+
+
+def sql_backend():
+    return (marvel_analysis.recompute_power_index_sql(top_n=10),
+            marvel_analysis.recompute_alignment_averages_sql())
+
+
+def numpy_backend():
+    return (marvel_analysis.numpy_power_index(top_n=10),
+            marvel_analysis.numpy_alignment_averages())
+
+
+def numpy_extras():
+    marvel_analysis.calculate_stat_percentiles()
+    marvel_analysis.calculate_stat_correlations()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    if marvel_analysis.np is None:
+        raise SystemExit("NumPy is not installed; nothing to compare.")
+
+    saved_db = database.get_db_path()
+    print(f"{'heroes':>9s} {'python':>9s} {'sql':>9s} {'np load':>9s} {'np calc':>9s} "
+          f"{'np pct+corr':>12s}")
+    try:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                build_database(os.path.join(tmp, "bench.db"), size)
+                python_time = timed(python_loops)
+                sql_time = timed(sql_backend)
+                marvel_analysis.clear_powerstats_cache()
+                load_time = timed(marvel_analysis.load_powerstats_array)
+                numpy_time = timed(numpy_backend)
+                extras_time = timed(numpy_extras)
+                database.close_all()
+            print(f"{size:9,d} {python_time:8.3f}s {sql_time:8.3f}s {load_time:8.3f}s "
+                  f"{numpy_time:8.3f}s {extras_time:11.3f}s")
+    finally:
+        database.set_db_path(saved_db)
+    print("np load is paid once per change to the tables; np calc reuses the arrays.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Similar-heroes queries: KD-tree index against a brute-force scan.
+
+    python -m benchmarks.bench_marvel_similarity [--heroes 100000] [--queries 200]
+
+Synthetic heroes are loaded with the normal ingest code, the index is
+built, saved and loaded back, and k-nearest and radius queries for
+random heroes are timed on the tree and as a scan over every indexed
+point. Tree and scan must return the same heroes; the script exits with
+status 1 if they don't. Finally --added more heroes are stored with
+marvel_api.store_marvel_data, which updates the saved index in place,
+and that update is compared with a full rebuild.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import database
+import marvel_api
+import marvel_similarity
+from benchmarks.fixtures import populate_database
+from benchmarks.synthetic import make_heroes
+
+K = 10
+RADIUS = 0.5
+
+
+def brute_nearest(tree, point, k, exclude):
+    found = sorted(
+        (marvel_similarity.squared_distance(point, p), hero_id)
+        for hero_id, p in zip(tree["ids"], tree["points"]) if hero_id != exclude
+    )
+    return found[:k]
+
+
+def brute_within(tree, point, radius, exclude):
+    limit = radius * radius
+    return sorted(
+        (d, hero_id) for d, hero_id in (
+            (marvel_similarity.squared_distance(point, p), hero_id)
+            for hero_id, p in zip(tree["ids"], tree["points"]) if hero_id != exclude
+        ) if d <= limit
+    )
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--heroes", type=int, default=100_000)
+    parser.add_argument("--added", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    heroes = make_heroes(args.heroes + args.added)
+    saved_db = database.get_db_path()
+    mismatches = 0
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            populate_database(db_path, heroes=heroes[:args.heroes])
+            index_path = marvel_similarity.get_index_path(db_path)
+
+            tree, build = timed(lambda: marvel_similarity.get_index(db_path, rebuild=True))
+            size = os.path.getsize(index_path)
+            marvel_similarity.clear_cache()
+            _, load = timed(lambda: marvel_similarity.get_index(db_path))
+            print(f"{len(tree['ids']):,} heroes indexed: build + save {build:.2f}s, "
+                  f"load {load:.2f}s, {size / 1e6:.1f} MB on disk")
+
+            rng = random.Random(0)
+            sample = rng.sample(tree["ids"], min(args.queries, len(tree["ids"])))
+            times = {"tree k": [], "scan k": [], "tree r": [], "scan r": []}
+            matches = []
+            for hero_id in sample:
+                point = marvel_similarity.get_point(tree, hero_id)
+                near, t = timed(lambda: marvel_similarity.nearest(tree, point, K, hero_id))
+                times["tree k"].append(t)
+                expected, t = timed(lambda: brute_nearest(tree, point, K, hero_id))
+                times["scan k"].append(t)
+                mismatches += near != expected
+
+                found, t = timed(lambda: marvel_similarity.within(tree, point, RADIUS, hero_id))
+                times["tree r"].append(t)
+                expected, t = timed(lambda: brute_within(tree, point, RADIUS, hero_id))
+                times["scan r"].append(t)
+                mismatches += found != expected
+                matches.append(len(found))
+
+            def p95(values):
+                return sorted(values)[int(len(values) * 0.95)]
+
+            print(f"{'query':22s} {'tree p50':>9s} {'tree p95':>9s} {'scan p50':>9s}")
+            for label, key in [(f"{K} nearest", "k"), (f"radius {RADIUS}", "r")]:
+                tree_times, scan_times = times["tree " + key], times["scan " + key]
+                print(f"{label:22s} {statistics.median(tree_times) * 1000:7.3f}ms "
+                      f"{p95(tree_times) * 1000:7.3f}ms {statistics.median(scan_times) * 1000:7.1f}ms")
+            print(f"heroes within radius {RADIUS}: median {statistics.median(matches):.0f}")
+
+            _, public = timed(lambda: marvel_similarity.similar_heroes(sample[0], K, db_path))
+            print(f"similar_heroes(), with names: {public * 1000:.2f}ms")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, update = timed(lambda: marvel_api.store_marvel_data(heroes[args.heroes:]))
+            tree = marvel_similarity.get_index(db_path)
+            _, rebuild = timed(lambda: marvel_similarity.get_index(db_path, rebuild=True))
+            print(f"store {args.added:,} more heroes (index updated): {update:.2f}s, "
+                  f"{len(tree['ids']):,} indexed; full rebuild {rebuild:.2f}s")
+
+            # the updated tree (not rebalanced) must still answer exactly
+            for hero_id in tree["ids"][-20:] + sample[:20]:
+                point = marvel_similarity.get_point(tree, hero_id)
+                near = marvel_similarity.nearest(tree, point, K, hero_id)
+                mismatches += near != brute_nearest(tree, point, K, hero_id)
+            database.close_all()
+    finally:
+        database.set_db_path(saved_db)
+        marvel_similarity.clear_cache()
+
+    print("tree matches scan:", "yes" if not mismatches else f"NO ({mismatches} mismatches)")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Python ingest (json.loads + split_hero_data) versus the SQLite JSON1
+staging ingest in marvel_sql_ingest.py, on the same all.json text.
+
+    python -m benchmarks.bench_marvel_sql_ingest [--sizes 1000 100000]
+
+Besides timing both paths, every run checks that they produce
+identical rows in all Marvel tables (lookup IDs included), on the
+synthetic heroes plus the hand-written EDGE_CASE_HEROES. The script
+exits with status 1 if any table differs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import create_marvel_db
+import database
+import marvel_api
+import marvel_sql_ingest
+from benchmarks.synthetic import make_heroes
+
+MARVEL_TABLES = [
+    "marvel_hero_names",
+    "marvel_publishers",
+    "marvel_alignments",
+    "marvel_genders",
+    "marvel_races",
+    "marvel_heroes",
+    "marvel_powerstats",
+    "marvel_power_index",
+    "marvel_alignment_stats",
+]
+
+# Awkward values the parsers have to agree on.
+EDGE_CASE_HEROES = [
+    {"id": None, "name": "No id"},
+    {"name": "Missing id"},
+    {"id": 900001, "name": "  Padded Name\t", "biography": {"alignment": "  ", "publisher": " - "},
+     "appearance": {"height": ["-", "  185  cm "], "weight": ["- lb", "0 kg"], "gender": "-"},
+     "powerstats": {"intelligence": " 55 ", "strength": "+7", "speed": "-3", "durability": "x",
+                    "power": 5.0, "combat": True}},
+    {"id": 900002, "name": 42, "biography": {"alignment": "-"},
+     "appearance": {"height": [180, "170 cm"], "weight": [72.5], "race": None},
+     "powerstats": {"intelligence": "007", "strength": "", "speed": None, "durability": "-",
+                    "power": False, "combat": "1.5"}},
+    {"id": 900003, "name": "Numbers", "biography": {"alignment": "good"},
+     "appearance": {"height": [".5 cm", "9"], "weight": ["5.", "1"]}, "powerstats": {}},
+    {"id": 900004, "name": "Exponents", "biography": {},
+     "appearance": {"height": ["1.5e2 cm"], "weight": ["+2E1 kg"]}},
+    {"id": 900005, "name": "Bad numbers", "biography": {"alignment": None},
+     "appearance": {"height": ["e5", ".", "+", "1.2.3", "0x10", "5 5"], "weight": ["-0", "3"]}},
+    {"id": 900006, "name": "Zeros",
+     "appearance": {"height": ["00.50 cm"], "weight": ["000 kg"]}},
+    {"id": 900007, "name": "Units only", "appearance": {"height": ["cm", "cmcm 12"], "weight": ["kg"]}},
+    {"id": 900008, "name": "Not a list", "appearance": {"height": [], "weight": None}},
+    {"id": 900001, "name": "Duplicate id", "biography": {"alignment": "bad"}},
+    {"id": 900009, "name": "Padded Name", "biography": {"alignment": "neutral", "publisher": "Marvel Comics"},
+     "appearance": {"gender": " Female　", "race": "Human"}},
+    {"id": 900010, "name": "Unknown side", "biography": {"alignment": "unknown", "publisher": "Marvel Comics"},
+     "appearance": {"height": ["5'10", "178 cm"], "weight": ["170 lb", "77 kg"]},
+     "powerstats": {"intelligence": 50, "strength": "unknown"}},
+    {"id": 900011, "name": "Tons", "biography": {"alignment": "Unknown"},
+     "appearance": {"height": ["30'0", "9.1 meters"], "weight": ["2 tons", "1,800 kg"]}},
+]
+
+
+def dump_tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+            for table in MARVEL_TABLES
+        }
+    finally:
+        conn.close()
+
+
+def load_python(json_text, bulk=True):
+    heroes = json.loads(json_text)
+    new_heroes = marvel_api.choose_new_heroes(heroes, set(), max_new=None)
+    marvel_api.store_marvel_data(new_heroes, bulk=bulk)
+
+
+def load_sql(json_text, bulk=True):
+    marvel_sql_ingest.store_marvel_json(json_text, bulk=bulk)
+
+
+def run_path(tmp, name, loader, json_text):
+    """
+    Load json_text into a fresh database with loader. Returns
+    (seconds, table dump).
+    """
+    path = os.path.join(tmp, f"{name}.db")
+    database.set_db_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+        start = time.perf_counter()
+        loader(json_text)
+        elapsed = time.perf_counter() - start
+    database.close_all()
+    return elapsed, dump_tables(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    saved_db = database.get_db_path()
+    mismatches = 0
+    print(f"{'heroes':>8s} {'python':>10s} {'sql':>10s} {'speedup':>8s}  identical")
+    try:
+        for size in args.sizes:
+            heroes = make_heroes(size) + EDGE_CASE_HEROES
+            json_text = json.dumps(heroes)
+            with tempfile.TemporaryDirectory() as tmp:
+                py_time, py_rows = run_path(tmp, "python", load_python, json_text)
+                sql_time, sql_rows = run_path(tmp, "sql", load_sql, json_text)
+
+            different = [t for t in MARVEL_TABLES if py_rows[t] != sql_rows[t]]
+            mismatches += len(different)
+            print(f"{size:8d} {py_time:10.3f} {sql_time:10.3f} {py_time / sql_time:7.2f}x  "
+                  f"{'yes' if not different else 'NO: ' + ', '.join(different)}")
+            for table in different:
+                for py_row, sql_row in zip(py_rows[table], sql_rows[table]):
+                    if py_row != sql_row:
+                        print(f"  {table}: python {py_row} != sql {sql_row}")
+                        break
+                if len(py_rows[table]) != len(sql_rows[table]):
+                    print(f"  {table}: {len(py_rows[table])} vs {len(sql_rows[table])} rows")
+    finally:
+        database.set_db_path(saved_db)
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
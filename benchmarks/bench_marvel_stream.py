@@ -0,0 +1,109 @@
+"""
+Peak memory of the Marvel ingest: whole-payload json.load versus the
+streaming parser with batched writes, on a synthetic all.json.
+
+Each mode runs in its own child process so ru_maxrss is its own peak.
+
+    python -m benchmarks.bench_marvel_stream [--heroes 100000]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import create_marvel_db
+import database
+import marvel_api
+from benchmarks.synthetic import iter_heroes
+
+
+def write_payload(path, count):
+    """
+    Write a synthetic all.json one hero at a time.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, hero in enumerate(iter_heroes(count)):
+            if i:
+                f.write(",")
+            json.dump(hero, f)
+        f.write("]")
+
+
+def run_child(mode, payload_path, db_path):
+    """
+    Ingest payload_path into db_path and print peak RSS (KiB) and seconds.
+    """
+    database.set_db_path(db_path)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+        if mode == "baseline":
+            pass
+        elif mode == "load":
+            with open(payload_path, "r", encoding="utf-8") as f:
+                heroes = json.load(f)
+            new_heroes = marvel_api.choose_new_heroes(heroes, set(), max_new=None)
+            marvel_api.store_marvel_data(new_heroes, bulk=True)
+        else:
+            heroes = marvel_api.iter_heroes_from_file(payload_path)
+            new_heroes = marvel_api.iter_new_heroes(heroes, set())
+            marvel_api.store_marvel_stream(new_heroes, bulk=True)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"peak_kib": peak, "seconds": elapsed}))
+
+
+def measure(mode, payload_path, db_path):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_marvel_stream",
+         "--child", mode, payload_path, db_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:5])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--heroes", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        payload_path = os.path.join(tmp, "all.json")
+        write_payload(payload_path, args.heroes)
+        size_mb = os.path.getsize(payload_path) / 1e6
+
+        baseline = measure("baseline", os.devnull, os.path.join(tmp, "baseline.db"))
+        results = {}
+        for mode in ("load", "stream"):
+            results[mode] = measure(mode, payload_path, os.path.join(tmp, f"{mode}.db"))
+
+        conns = {mode: database.connect(os.path.join(tmp, f"{mode}.db")) for mode in results}
+        dumps = {
+            mode: conn.execute("SELECT * FROM marvel_heroes ORDER BY id").fetchall()
+            for mode, conn in conns.items()
+        }
+        for conn in conns.values():
+            conn.close()
+
+    print(f"synthetic all.json: {args.heroes:,} heroes, {size_mb:.1f} MB")
+    print(f"  interpreter + imports: {baseline['peak_kib'] / 1024:7.1f} MiB peak")
+    for mode, label in (("load", "json.load + list"), ("stream", "streaming + batches")):
+        r = results[mode]
+        print(f"  {label:21s}: {r['peak_kib'] / 1024:7.1f} MiB peak, {r['seconds']:6.2f}s")
+    print("  identical rows:", dumps["load"] == dumps["stream"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Search latency over a synthetic catalogue of a million media titles.
+
+    python -m benchmarks.bench_search [--titles 1000000] [--repeat 20]
+
+Titles are made of words from a fixed pseudo-word vocabulary (seeded,
+so every run builds the same catalogue) and inserted through the normal
+media_titles table, so the search triggers queue them; the time to
+apply that queue to the index is reported separately. Each query is
+then timed with search.search (FTS5, top 20 by rank) and with the
+LIKE '%...%' scan it replaces, which has to read every title to find
+all matches before anything could be ranked.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+import disney_api
+import search
+
+SYLLABLES = ["ka", "ri", "to", "mo", "sen", "la", "dor", "vi", "an", "el",
+             "zu", "qua", "ber", "nix", "po", "ly", "ta", "gon", "wi", "sha"]
+
+LIMIT = 20
+INSERT_BATCH = 50000
+
+
+def make_vocabulary(size, rng):
+    """
+    size pseudo-words; iter_titles uses the list order as frequency rank.
+    """
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+def make_queries(vocabulary):
+    """
+    label -> (search text, prefix). The vocabulary is ordered by
+    frequency, so the first words are the common ones.
+    """
+    common, other, rare = vocabulary[0], vocabulary[20], vocabulary[-1]
+    return {
+        "common word": (common, False),
+        "rare word": (rare, False),
+        "two words": (f"{common} {other}", False),
+        "prefix, 2 chars": (common[:2], True),
+        "prefix, 4 chars": (common[:4], True),
+        "prefix, two words": (f"{common} {other[:3]}", True),
+    }
+
+
+def iter_titles(count, vocabulary, seed=0):
+    """
+    count distinct titles of 1-5 words; word frequencies are skewed so
+    some words are common and some are rare, as in real titles.
+    """
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 5))
+        yield f"{' '.join(words).title()} {i}"
+
+
+def like_search(cur, text):
+    """
+    The scan search.search replaces: every word as a substring.
+    """
+    words = text.split()
+    conditions = " AND ".join("title LIKE ?" for _ in words)
+    cur.execute(
+        f"SELECT title_id, title FROM media_titles WHERE {conditions}",
+        [f"%{w}%" for w in words],
+    )
+    return cur.fetchall()
+
+
+def time_calls(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--titles", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    saved_db = database.get_db_path()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.set_db_path(os.path.join(tmp, "bench.db"))
+            disney_api.setup_database()
+
+            conn = database.get_connection()
+            cur = conn.cursor()
+            start = time.perf_counter()
+            batch = []
+            vocabulary = make_vocabulary(5000, random.Random(0))
+            for title in iter_titles(args.titles, vocabulary):
+                batch.append((title,))
+                if len(batch) == INSERT_BATCH:
+                    cur.executemany("INSERT INTO media_titles (title) VALUES (?)", batch)
+                    batch = []
+            cur.executemany("INSERT INTO media_titles (title) VALUES (?)", batch)
+            conn.commit()
+            load_time = time.perf_counter() - start
+            print(f"{args.titles:,} titles inserted in {load_time:.1f}s")
+
+            start = time.perf_counter()
+            search.apply_search_queue(cur)
+            conn.commit()
+            print(f"queued entries applied to the index: {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            search.rebuild_search_index(cur)
+            conn.commit()
+            print(f"rebuild + optimize: {time.perf_counter() - start:.1f}s")
+
+            print(f"{'query':20s} {'fts p50':>9s} {'fts max':>9s} {'LIKE p50':>9s} "
+                  f"{'speedup':>8s} {'LIKE rows':>9s}")
+            for label, (text, prefix) in make_queries(vocabulary).items():
+                fts_p50, fts_max = time_calls(
+                    lambda: search.search(text, kinds=["title"], limit=LIMIT, prefix=prefix),
+                    args.repeat)
+                # the scan is slow; a few runs are enough for its median
+                like_p50, _ = time_calls(lambda: like_search(cur, text), 3)
+                matches = len(like_search(cur, text))
+                print(f"{label:20s} {fts_p50 * 1000:7.2f}ms {fts_max * 1000:7.2f}ms "
+                      f"{like_p50 * 1000:7.1f}ms {like_p50 / fts_p50:7.0f}x {matches:9d}")
+
+            database.release_connection(conn)
+            database.close_all()
+    finally:
+        database.set_db_path(saved_db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Build throwaway databases filled with synthetic data.
+"""
+
+import contextlib
+import io
+
+import create_marvel_db
+import database
+import disney_api
+import marvel_api
+import search
+
+
+def populate_database(path, heroes=(), characters=()):
+    """
+    Point the project at path and load the given synthetic heroes and
+    Disney characters with the normal ingest code (no per-run caps).
+    """
+    database.set_db_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+        if heroes:
+            marvel_api.store_marvel_data(list(heroes), bulk=True)
+
+        disney_api.setup_database()
+        if characters:
+            conn = database.get_connection()
+            cur = conn.cursor()
+            disney_api.seed_media_types(cur)
+            type_ids = disney_api.load_type_ids(cur)
+            counts = {"characters": 0, "media": 0, "titles": 0}
+            no_cap = float("inf")
+            disney_api.store_page(cur, list(characters), set(), type_ids, {}, counts, no_cap)
+            search.apply_search_queue(cur)
+            conn.commit()
+            database.release_connection(conn)
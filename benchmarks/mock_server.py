@@ -0,0 +1,111 @@
+"""
+A local stand-in for the Disney and superhero APIs.
+
+    server, base_url = start_mock_server(disney_pages=pages, heroes=heroes)
+    ...  # GET {base_url}/character?page=N and {base_url}/all.json
+    stop_mock_server(server)
+
+Every request path is appended to server.request_log so benchmarks can
+count how many pages a run actually downloaded. all.json is sent with
+an ETag and answers If-None-Match with 304, like the real host
+(server.spurious_not_modified makes it answer 304 unconditionally).
+
+Failures can be injected per Disney page: server.page_failures maps a
+page number to the answers its next requests get, in order, before it
+is served normally, e.g. {2: [503, 503]} or {3: ["drop"]} ("drop"
+closes the connection without answering).
+"""
+
+import hashlib
+import http.server
+import json
+import threading
+import urllib.parse
+
+
+class MockApiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; with Nagle on, every
+    # keep-alive response would stall ~40ms on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        with self.server.log_lock:
+            self.server.request_log.append(self.path)
+
+        if parsed.path == "/character":
+            query = urllib.parse.parse_qs(parsed.query)
+            page = int(query.get("page", ["1"])[0])
+            with self.server.log_lock:
+                failures = self.server.page_failures.get(page)
+                failure = failures.pop(0) if failures else None
+            if failure == "drop":
+                self.close_connection = True
+                return
+            if failure is not None:
+                self.send_body(failure, b"")
+                return
+            pages = self.server.disney_pages
+            data = pages[page - 1] if 1 <= page <= len(pages) else []
+            body = json.dumps({
+                "info": {"count": len(data), "totalPages": len(pages)},
+                "data": data,
+            }).encode("utf-8")
+            self.send_body(200, body)
+        elif parsed.path == "/all.json" and self.server.heroes_body is not None:
+            etag = self.server.heroes_etag
+            with self.server.log_lock:
+                spurious = self.server.spurious_not_modified > 0
+                if spurious:
+                    self.server.spurious_not_modified -= 1
+            if spurious or self.headers.get("If-None-Match") == etag:
+                self.send_body(304, b"", etag=etag)
+            else:
+                self.send_body(200, self.server.heroes_body, etag=etag)
+        else:
+            self.send_body(404, b"")
+
+    def send_body(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(disney_pages=None, heroes=None):
+    """
+    Serve the given data on a free localhost port in a background thread.
+    heroes (a list of hero dicts) is encoded once and served as all.json.
+    Returns (server, base_url).
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockApiHandler)
+    server.daemon_threads = True
+    server.disney_pages = disney_pages or []
+    server.heroes_body = None
+    server.heroes_etag = None
+    if heroes is not None:
+        server.heroes_body = json.dumps(list(heroes)).encode("utf-8")
+        server.heroes_etag = '"' + hashlib.sha256(server.heroes_body).hexdigest()[:16] + '"'
+    server.request_log = []
+    server.log_lock = threading.Lock()
+    # answer this many all.json requests with 304 whatever their headers,
+    # like a misbehaving proxy
+    server.spurious_not_modified = 0
+    # page -> answers (status codes or "drop") for its next requests
+    server.page_failures = {}
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def stop_mock_server(server):
+    server.shutdown()
+    server.server_close()
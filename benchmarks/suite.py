@@ -0,0 +1,351 @@
+"""
+End-to-end benchmark suite with a saved history, for spotting regressions.
+
+    python -m benchmarks.suite run [--scale small|medium|large] [--repeat 3] [--label TEXT]
+    python -m benchmarks.suite compare [--baseline -2] [--current -1] [--threshold 0.1]
+    python -m benchmarks.suite list
+
+"run" generates a synthetic all.json payload and paged Disney responses
+(fixed seeds, so every run sees the same data), serves them from the
+local stand-in server and times the real entry points:
+
+  - ingest:    marvel_api.main (bulk and streaming) and a full
+               disney_api.store_characters crawl, each into a fresh database
+  - analytics: marvel_analysis.* and calculations.* on a populated database
+  - reports:   marvel_write_results and calculations.calculate_character_stats
+
+Each case is run --repeat times; the median, min and mean are appended
+to the history file together with the scale, git commit and Python
+version. The default file, benchmarks/history.json, is ignored by git;
+--history picks another. "compare" prints two history entries side by
+side and flags cases that got slower by more than the threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import calculations
+import create_marvel_db
+import database
+import disney_api
+import disney_stats
+import marvel_analysis
+import marvel_api
+import marvel_write_results
+from benchmarks.fixtures import populate_database
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_disney_characters, make_disney_pages, make_heroes
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+
+# scale name -> (heroes, disney characters)
+SCALES = {
+    "small": (1000, 500),
+    "medium": (10000, 2000),
+    "large": (100000, 5000),
+}
+
+DISNEY_PAGE_SIZE = 50
+DEFAULT_THRESHOLD = 0.10
+
+
+# ---------- Cases ----------
+# name -> (group, setup, run). setup(env) returns the state passed to
+# run(state); only run is timed.
+
+def fresh_database(env):
+    """
+    A new empty database in its own folder (so the API cache is cold too).
+    """
+    env["fresh"] = env.get("fresh", 0) + 1
+    folder = os.path.join(env["tmp"], f"ingest-{env['fresh']}")
+    os.makedirs(folder)
+    database.set_db_path(os.path.join(folder, "bench.db"))
+    return env
+
+
+def fresh_marvel_database(env):
+    """
+    fresh_database with the Marvel schema created (create_marvel_db.py
+    is a separate script, so it is not part of the timed ingest).
+    """
+    fresh_database(env)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+    return env
+
+
+def analysis_database(env):
+    """
+    The shared populated database, with every in-process cache cleared
+    so the queries themselves are measured.
+    """
+    database.set_db_path(env["analysis_db"])
+    disney_stats.clear_cache()
+    marvel_analysis.clear_powerstats_cache()
+    return env
+
+
+def run_marvel_main_bulk(env):
+    marvel_api.main(bulk=True, url=env["base_url"] + "/all.json")
+
+
+def run_marvel_main_stream(env):
+    marvel_api.main(bulk=True, stream=True, url=env["base_url"] + "/all.json")
+
+
+def run_disney_crawl(env):
+    """
+    Repeated store_characters runs (each capped at 25 characters or 25
+    media rows) until the stand-in API has nothing new, like a user
+    running it to completion.
+    """
+    while True:
+        counts = disney_api.store_characters(url=env["base_url"] + "/character", concurrency=1)
+        if counts["characters"] == 0:
+            break
+
+
+def run_write_marvel_results(env):
+    marvel_write_results.write_marvel_results(os.path.join(env["tmp"], "marvel_results.txt"))
+
+
+def run_calculate_character_stats(env):
+    # writes calculated_stats.txt to the cwd, which run_suite points at tmp
+    calculations.calculate_character_stats()
+
+
+CASES = {
+    "marvel_main_bulk": ("ingest", fresh_marvel_database, run_marvel_main_bulk),
+    "marvel_main_stream": ("ingest", fresh_marvel_database, run_marvel_main_stream),
+    "disney_store_characters": ("ingest", fresh_database, run_disney_crawl),
+    "power_index_top10": (
+        "analytics", analysis_database, lambda env: marvel_analysis.top_k_power_index(10)),
+    "power_index_all": (
+        "analytics", analysis_database, lambda env: marvel_analysis.calculate_power_index()),
+    "alignment_averages": (
+        "analytics", analysis_database, lambda env: marvel_analysis.calculate_alignment_averages()),
+    "recompute_power_index": (
+        "analytics", analysis_database, lambda env: marvel_analysis.recompute_power_index()),
+    "recompute_alignment_averages": (
+        "analytics", analysis_database, lambda env: marvel_analysis.recompute_alignment_averages()),
+    "stat_percentiles": (
+        "analytics", analysis_database, lambda env: marvel_analysis.calculate_stat_percentiles()),
+    "stat_zscores": (
+        "analytics", analysis_database, lambda env: marvel_analysis.calculate_stat_zscores()),
+    "stat_correlations": (
+        "analytics", analysis_database, lambda env: marvel_analysis.calculate_stat_correlations()),
+    "appearance_summary": (
+        "analytics", analysis_database, lambda env: calculations.get_appearance_summary()),
+    "media_spread": (
+        "analytics", analysis_database, lambda env: calculations.calculate_media_spread()),
+    "write_marvel_results": ("reports", analysis_database, run_write_marvel_results),
+    "calculate_character_stats": ("reports", analysis_database, run_calculate_character_stats),
+}
+
+
+def time_case(setup, run, env, repeat):
+    """
+    Run one case repeat times. Returns its timing summary in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup(env)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "mean": statistics.fmean(times),
+        "runs": len(times),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+# ---------- History ----------
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def describe(entry):
+    label = f" [{entry['label']}]" if entry.get("label") else ""
+    return (f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['timestamp']))} "
+            f"{entry.get('commit') or '-'} {entry['scale']['name']}{label}")
+
+
+# ---------- Commands ----------
+
+def run_suite(scale="small", repeat=3, cases=None, label=None,
+              heroes=None, characters=None, seed=0, history_path=HISTORY_PATH):
+    """
+    Run the selected cases (default: all) and append the results to the
+    history file. Returns the new history entry.
+    """
+    default_heroes, default_characters = SCALES[scale]
+    heroes = heroes or default_heroes
+    characters = characters or default_characters
+    names = list(cases or CASES)
+
+    hero_data = make_heroes(heroes, seed=seed)
+    disney_characters = make_disney_characters(characters, seed=seed)
+    pages = make_disney_pages(disney_characters, DISNEY_PAGE_SIZE)
+
+    saved_db = database.get_db_path()
+    saved_cwd = os.getcwd()
+    server, base_url = start_mock_server(disney_pages=pages, heroes=hero_data)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"tmp": tmp, "base_url": base_url,
+                   "analysis_db": os.path.join(tmp, "analysis.db")}
+            populate_database(env["analysis_db"], hero_data, disney_characters)
+            os.chdir(tmp)
+
+            print(f"scale {scale}: {heroes} heroes, {characters} characters, {repeat} runs each")
+            print(f"{'case':30s} {'group':10s} {'median':>10s} {'min':>10s}")
+            for name in names:
+                group, setup, run = CASES[name]
+                summary = time_case(setup, run, env, repeat)
+                summary["group"] = group
+                results[name] = summary
+                print(f"{name:30s} {group:10s} {summary['median']:10.4f} {summary['min']:10.4f}")
+            database.close_all()
+    finally:
+        os.chdir(saved_cwd)
+        stop_mock_server(server)
+        database.set_db_path(saved_db)
+
+    entry = {
+        "timestamp": time.time(),
+        "label": label,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": marvel_analysis.numpy_enabled(),
+        "scale": {"name": scale, "heroes": heroes, "characters": characters, "seed": seed},
+        "repeat": repeat,
+        "results": results,
+    }
+    history = load_history(history_path)
+    history.append(entry)
+    save_history(history, history_path)
+    print(f"saved as entry {len(history) - 1} in {history_path}")
+    return entry
+
+
+def compare(baseline=-2, current=-1, threshold=DEFAULT_THRESHOLD, history_path=HISTORY_PATH):
+    """
+    Print median times of two history entries side by side.
+    Returns the names of the cases that regressed by more than threshold.
+    """
+    history = load_history(history_path)
+    if len(history) < 2:
+        print("need at least two runs in the history to compare")
+        return []
+    old, new = history[baseline], history[current]
+    if old["scale"] != new["scale"]:
+        print("warning: the two runs used different scales")
+
+    print(f"baseline: {describe(old)}")
+    print(f"current:  {describe(new)}")
+    print(f"{'case':30s} {'baseline':>10s} {'current':>10s} {'change':>9s}")
+
+    regressions = []
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        if name not in old["results"] or name not in new["results"]:
+            print(f"{name:30s} (only in one run)")
+            continue
+        before = old["results"][name]["median"]
+        after = new["results"][name]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:30s} {before:10.4f} {after:10.4f} {change:+8.1%}{flag}")
+
+    print(f"{len(regressions)} case(s) slower by more than {threshold:.0%}")
+    return regressions
+
+
+def list_history(history_path=HISTORY_PATH):
+    history = load_history(history_path)
+    for i, entry in enumerate(history):
+        print(f"{i:3d}  {describe(entry)}")
+    if not history:
+        print("no runs saved yet")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", default=HISTORY_PATH, help="history JSON file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and save the results")
+    run_parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--heroes", type=int, help="override the scale's hero count")
+    run_parser.add_argument("--characters", type=int, help="override the scale's character count")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--case", action="append", choices=sorted(CASES),
+                            help="run only this case (repeatable)")
+    run_parser.add_argument("--label", help="note stored with the results")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("--baseline", type=int, default=-2,
+                                help="history index of the baseline (default: second to last)")
+    compare_parser.add_argument("--current", type=int, default=-1,
+                                help="history index to compare (default: last)")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative slowdown reported as a regression")
+    compare_parser.add_argument("--fail-on-regression", action="store_true",
+                                help="exit with status 1 if any case regressed")
+
+    commands.add_parser("list", help="list saved runs")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_suite(args.scale, args.repeat, args.case, args.label,
+                  args.heroes, args.characters, args.seed, args.history)
+    elif args.command == "compare":
+        regressions = compare(args.baseline, args.current, args.threshold, args.history)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+    else:
+        list_history(args.history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Synthetic data shaped like the real API responses.
+"""
+
+import random
+
+DISNEY_MEDIA_KEYS = ["films", "shortFilms", "tvShows", "videoGames", "parkAttractions"]
+
+
+def make_disney_characters(count, title_pool=2000, max_titles=6, seed=0):
+    """
+    Return count character dicts shaped like api.disneyapi.dev results.
+    Titles are drawn from a shared pool so characters share media.
+    """
+    rng = random.Random(seed)
+    characters = []
+    for i in range(count):
+        character = {
+            "_id": i + 1,
+            "name": f"Character {i + 1}",
+            "imageUrl": f"https://example.invalid/{i + 1}.png",
+        }
+        for key in DISNEY_MEDIA_KEYS:
+            n = rng.randint(0, max_titles)
+            character[key] = [f"{key} title {rng.randrange(title_pool)}" for _ in range(n)]
+        characters.append(character)
+    return characters
+
+
+def make_disney_pages(characters, page_size=50):
+    """
+    Split a character list into pages (list of lists).
+    """
+    return [characters[i:i + page_size] for i in range(0, len(characters), page_size)]
+
+
+HERO_STATS = ["intelligence", "strength", "speed", "durability", "power", "combat"]
+
+
+def make_heroes(count, seed=0):
+    """
+    Return count hero dicts shaped like the superhero-api all.json entries,
+    including the awkward bits the parser has to handle ("-", missing
+    values, feet/inches next to cm, tons next to kg).
+    """
+    return list(iter_heroes(count, seed))
+
+
+def iter_heroes(count, seed=0):
+    """
+    Generator version of make_heroes, for payloads too big to keep in memory.
+    """
+    rng = random.Random(seed)
+    publishers = ["Marvel Comics", "DC Comics", "Dark Horse Comics", "Image Comics", "-", None]
+    alignments = ["good", "bad", "neutral", "-", "", None]
+    genders = ["Male", "Female", "-"]
+    races = ["Human", "Mutant", "Android", "Alien", "God / Eternal", "-", None]
+
+    for i in range(count):
+        hero_id = i + 1
+        height_cm = rng.choice([rng.randint(120, 250), 0, None])
+        weight_kg = rng.choice([rng.randint(40, 400), 0, None])
+        yield {
+            "id": hero_id,
+            "name": f"Hero {hero_id}",
+            "powerstats": {
+                stat: rng.choice([rng.randint(1, 100), rng.randint(1, 100), None])
+                for stat in HERO_STATS
+            },
+            "appearance": {
+                "gender": rng.choice(genders),
+                "race": rng.choice(races),
+                "height": ["-" if height_cm is None else "6'1",
+                           "-" if height_cm is None else f"{height_cm} cm"],
+                "weight": ["- lb" if weight_kg is None else "180 lb",
+                           "0 kg" if weight_kg is None else
+                           rng.choice([f"{weight_kg} kg", f"{weight_kg} tons"])],
+            },
+            "biography": {
+                "fullName": f"Full Name {hero_id}",
+                "publisher": rng.choice(publishers),
+                "alignment": rng.choice(alignments),
+            },
+        }
@@ -0,0 +1,356 @@
+"""
+build_cache.py
+Content-addressed cache for the generated reports and figures.
+
+Every artifact is keyed on a fingerprint of the data it is built from
+plus the source code of the modules that build it: the reports on
+their source tables (report_key), the figures on their input data
+(artifact_key). A manifest (build_manifest.json, in the directory the
+outputs are written to) records the key and a hash of each output
+file, so a run where nothing changed skips the report analytics and
+all the writing and drawing. build_reports and pipeline.py build the
+reports through the same functions, so they share one manifest entry
+per report.
+
+Source tables are fingerprinted on the change counters the triggers
+keep (marvel_data_version, disney_data_version) and their entries in
+sqlite_master, so checking a report costs a few small reads. --verify
+also hashes every row of the source tables, for databases that may
+have been changed behind the triggers' back.
+
+    python build_cache.py [--force] [--verify]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import create_marvel_db
+import database
+import disney_stats
+
+MANIFEST_PATH = "build_manifest.json"
+
+# bump to invalidate every cached artifact
+CACHE_VERSION = 1
+
+# counters for this process, see print_cache_stats
+CACHE_STATS = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+
+# serialises manifest updates from concurrent builders (see pipeline.py)
+_manifest_lock = threading.Lock()
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# change counters and the tables whose writes bump them; the power-index
+# summaries change through the triggers on the Marvel tables or
+# through rebuild_power_index_tables, which bumps marvel_data_version
+CHANGE_COUNTERS = [
+    ("marvel_data_version", create_marvel_db.get_data_version,
+     create_marvel_db.VERSIONED_TABLES + ["marvel_power_index", "marvel_alignment_stats"]),
+    ("disney_data_version", disney_stats.get_watermark, disney_stats.VERSIONED_TABLES),
+]
+
+
+def table_fingerprint(tables, db_path=None):
+    """
+    Cheap fingerprint of the given tables: the database file, their
+    schema (tables, indexes and triggers) and the change counters
+    covering them. A table no counter
+    covers (or a database without counters) is hashed row by row.
+    """
+    parts = [os.path.abspath(db_path or database.get_db_path())]
+    remaining = set(tables)
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        # the schema of these tables only: other tables may be created
+        # concurrently (pipeline.py runs the schema stages in parallel)
+        cur.execute(f"""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE tbl_name IN ({", ".join("?" for _ in tables)})
+            ORDER BY type, name
+        """, sorted(tables))
+        parts.append(repr(cur.fetchall()))
+        for counter, read_version, covered in CHANGE_COUNTERS:
+            if not remaining & set(covered):
+                continue
+            version = read_version(cur)
+            if version is not None:
+                parts.append(f"{counter} {version}")
+                remaining -= set(covered)
+    finally:
+        database.release_connection(conn)
+    if remaining:
+        parts.append(table_content_fingerprint(remaining, db_path))
+    return combine(*parts)
+
+
+def table_content_fingerprint(tables, db_path=None):
+    """
+    Hash of every row of the given tables, read in rowid order.
+    """
+    h = hashlib.sha256()
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        for table in sorted(tables):
+            h.update(table.encode("utf-8"))
+            cur.execute(f"SELECT * FROM {table} ORDER BY rowid")
+            for row in cur:
+                h.update(repr(row).encode("utf-8"))
+    finally:
+        database.release_connection(conn)
+    return h.hexdigest()
+
+
+def code_fingerprint(module_names):
+    """
+    Hash of the source files of the given project modules.
+    """
+    h = hashlib.sha256(str(CACHE_VERSION).encode("utf-8"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(module_names):
+        h.update(name.encode("utf-8"))
+        h.update(file_hash(os.path.join(here, name + ".py")).encode("utf-8"))
+    return h.hexdigest()
+
+
+def data_fingerprint(data):
+    """
+    Hash of in-memory input data (tuples and lists hash the same).
+    """
+    text = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def combine(*parts):
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def artifact_key(data, module_names):
+    """
+    The cache key of an artifact built from data by the given modules.
+    """
+    return combine(data_fingerprint(data), code_fingerprint(module_names))
+
+
+def manifest_path(output_dir):
+    """
+    The manifest for artifacts written to output_dir, so whether they
+    are up to date does not depend on the current directory.
+    """
+    return os.path.join(os.path.abspath(output_dir), MANIFEST_PATH)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(name, key, manifest, content=None):
+    """
+    True if the manifest has name built with key and every output
+    still exists unchanged (and, if content is given, built from source
+    tables with that content fingerprint).
+    """
+    entry = manifest.get(name)
+    if not entry or entry.get("key") != key:
+        return False
+    if content is not None and entry.get("content") != content:
+        return False
+    for path, digest in entry.get("outputs", {}).items():
+        if not os.path.exists(path) or file_hash(path) != digest:
+            return False
+    return True
+
+
+def record(name, key, outputs, seconds, manifest, content=None):
+    """
+    Store name's key, output hashes and build time in the manifest
+    (and the content fingerprint of its sources, if it was computed).
+    """
+    manifest[name] = {
+        "key": key,
+        "outputs": {path: file_hash(path) for path in outputs if os.path.exists(path)},
+        "seconds": seconds,
+        "built_at": time.time(),
+    }
+    if content is not None:
+        manifest[name]["content"] = content
+
+
+def save_records(records, manifest_path=MANIFEST_PATH, contents=None):
+    """
+    Record (name, key, outputs, seconds) entries and save the manifest.
+    contents optionally maps names to content fingerprints. The manifest
+    is re-read first so entries written by other builders since it was
+    loaded are kept.
+    """
+    contents = contents or {}
+    with _manifest_lock:
+        manifest = load_manifest(manifest_path)
+        for name, key, outputs, seconds in records:
+            record(name, key, outputs, seconds, manifest, contents.get(name))
+        save_manifest(manifest, manifest_path)
+
+
+def cached_build(name, key, outputs, build, force=False, content=None):
+    """
+    Run build() unless the manifest next to the first output says
+    outputs were already produced for key (and content, if given).
+    Returns True if build() ran.
+    """
+    outputs = [os.path.abspath(path) for path in outputs]
+    path = manifest_path(os.path.dirname(outputs[0]))
+    manifest = load_manifest(path)
+    if not force and is_fresh(name, key, manifest, content):
+        CACHE_STATS["hits"] += 1
+        CACHE_STATS["seconds_saved"] += manifest[name].get("seconds", 0.0)
+        print(f"  {name:30s} up to date")
+        return False
+
+    start = time.perf_counter()
+    build()
+    seconds = time.perf_counter() - start
+    CACHE_STATS["misses"] += 1
+
+    save_records([(name, key, outputs, seconds)], path, {name: content})
+    print(f"  {name:30s} built in {seconds:.3f}s")
+    return True
+
+
+def print_cache_stats():
+    print(
+        f"Build cache: {CACHE_STATS['hits']} up to date, "
+        f"{CACHE_STATS['misses']} rebuilt, "
+        f"~{CACHE_STATS['seconds_saved']:.2f}s of work skipped."
+    )
+
+
+# ---------- Project artifacts ----------
+
+MARVEL_REPORT = "marvel_results.txt"
+DISNEY_REPORT = "calculated_stats.txt"
+
+# the tables each report's analytics read, and the modules that compute
+# and write it; a report is keyed on these rather than on the analytics,
+# so an up-to-date report is skipped without running any queries
+MARVEL_REPORT_TABLES = [
+    "marvel_power_index", "marvel_alignment_stats", "marvel_heroes",
+    "marvel_hero_names", "marvel_alignments", "marvel_powerstats",
+]
+MARVEL_REPORT_MODULES = ["marvel_analysis", "marvel_write_results"]
+DISNEY_REPORT_TABLES = ["characters", "character_media"]
+DISNEY_REPORT_MODULES = ["calculations", "disney_stats"]
+
+
+def report_key(tables, module_names, db_path=None):
+    """
+    The cache key of a report computed from tables by the given modules.
+    """
+    return combine(table_fingerprint(tables, db_path), code_fingerprint(module_names))
+
+
+def report_content(tables, verify):
+    """
+    The row-by-row fingerprint of a report's tables if verify is set.
+    """
+    return table_content_fingerprint(tables) if verify else None
+
+
+def build_marvel_report(top_power_index=None, alignment_averages=None, force=False,
+                        verify=False):
+    """
+    marvel_results.txt, unless it is up to date. The analytics are only
+    computed when it has to be written and were not passed in.
+    """
+    import marvel_analysis
+    import marvel_write_results
+
+    def build():
+        marvel_write_results.write_marvel_results(
+            MARVEL_REPORT,
+            power_list=(top_power_index if top_power_index is not None
+                        else marvel_analysis.top_k_power_index(10)),
+            alignment_avgs=(alignment_averages if alignment_averages is not None
+                            else marvel_analysis.calculate_alignment_averages()),
+        )
+
+    key = report_key(MARVEL_REPORT_TABLES, MARVEL_REPORT_MODULES)
+    return cached_build(MARVEL_REPORT, key, [MARVEL_REPORT], build, force=force,
+                        content=report_content(MARVEL_REPORT_TABLES, verify))
+
+
+def build_disney_report(summary=None, force=False, verify=False):
+    """
+    calculated_stats.txt, unless it is up to date. summary (from
+    calculations.get_appearance_summary) is computed only if needed.
+    """
+    import calculations
+
+    key = report_key(DISNEY_REPORT_TABLES, DISNEY_REPORT_MODULES)
+    return cached_build(
+        DISNEY_REPORT, key, [DISNEY_REPORT],
+        lambda: calculations.calculate_character_stats(summary=summary),
+        force=force,
+        content=report_content(DISNEY_REPORT_TABLES, verify),
+    )
+
+
+def build_reports(force=False, verify=False):
+    """
+    marvel_results.txt and calculated_stats.txt, each only if its
+    source tables or code changed.
+    """
+    build_marvel_report(force=force, verify=verify)
+    build_disney_report(force=force, verify=verify)
+
+
+def build_all(force=False, workers=None, verify=False):
+    """
+    Reports and figures. Figures are checked by render_figures, which
+    keys each PNG on its input data and drawing code.
+    """
+    import render_figures
+
+    start = time.perf_counter()
+    build_reports(force=force, verify=verify)
+    render_figures.render_all(workers=workers, force=force)
+    print_cache_stats()
+    print(f"total {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build reports and figures (cached)")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild everything even if nothing changed")
+    parser.add_argument("--verify", action="store_true",
+                        help="also hash every row of the report source tables")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for figures")
+    args = parser.parse_args()
+
+    build_all(force=args.force, workers=args.workers, verify=args.verify)
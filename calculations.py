@@ -1,33 +1,34 @@
-import sqlite3
+import disney_stats
+import profiling
 
-DB_NAME = "final_project.db"
+@profiling.timed("calculations.get_appearance_summary")
+def get_appearance_summary(db_path=None):
+    """
+    total characters, average appearances and top 10 characters by
+    appearances, from the shared stats engine (no file is written)
+    """
+    stats = disney_stats.get_character_stats(db_path)
+    return {
+        "total_characters": stats["total_characters"],
+        "avg_appearances": stats["avg_appearances"],
+        "top_10": disney_stats.top_by_appearances(10, db_path)
+    }
 
-def calculate_character_stats(db_path=DB_NAME):
+@profiling.timed("calculations.calculate_character_stats")
+def calculate_character_stats(db_path=None, summary=None):
     """
     calculates simple stats using normalized tables:
     - total appearances per character (count of rows in character_media)
     - average appearances
     - top 10 characters by appearances
     writes results to calculated_stats.txt
+    pass summary (from get_appearance_summary) to skip recomputing it
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
-    # total media appearances per character (count of join rows)
-    cur.execute("""
-        select c.name, count(cm.id) as total
-        from characters c
-        left join character_media cm on c.id = cm.character_id
-        group by c.id
-        order by total desc;
-    """)
-    results = cur.fetchall()
-
-    total_characters = len(results)
-    total_appearances = sum(row[1] for row in results)
-    avg_appearances = total_appearances / total_characters if total_characters else 0
-
-    top_10 = results[:10]
+    if summary is None:
+        summary = get_appearance_summary(db_path)
+    total_characters = summary["total_characters"]
+    avg_appearances = summary["avg_appearances"]
+    top_10 = summary["top_10"]
 
     # write to text file
     with open("calculated_stats.txt", "w") as f:
@@ -39,35 +40,16 @@ def calculate_character_stats(db_path=DB_NAME):
         for name, count in top_10:
             f.write(f"- {name}: {count} appearances\n")
 
-    conn.close()
+    return summary
 
-    return {
-        "total_characters": total_characters,
-        "avg_appearances": avg_appearances,
-        "top_10": top_10
-    }
-
-def calculate_media_spread(db_path=DB_NAME):
+@profiling.timed("calculations.calculate_media_spread")
+def calculate_media_spread(db_path=None):
     """
     calculates media spread score (0-5) for each character:
     count distinct media types per character (via character_media -> media_types)
     returns top 10 characters by spread
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
-    cur.execute("""
-        select c.name,
-               count(distinct cm.type_id) as spread
-        from characters c
-        left join character_media cm on c.id = cm.character_id
-        group by c.id
-        order by spread desc
-        limit 10;
-    """)
-    results = cur.fetchall()
-    conn.close()
-    return results
+    return disney_stats.top_by_spread(10, db_path)
 
 if __name__ == "__main__":
     calculate_character_stats()
@@ -1,6 +1,36 @@
 import sqlite3
 
-DB_NAME = "final_project.db"
+import database
+import search
+
+# Secondary indexes on the Marvel tables. They are kept in one place so
+# bulk loads can drop them and build them once after the data is in.
+MARVEL_INDEXES = {
+    "idx_marvel_heroes_name": "marvel_heroes (name_id)",
+    "idx_marvel_heroes_alignment": "marvel_heroes (alignment_id)",
+}
+
+STAT_NAMES = ["intelligence", "strength", "speed", "durability", "power", "combat"]
+
+# Tables whose changes bump marvel_data_version.
+VERSIONED_TABLES = ["marvel_heroes", "marvel_powerstats", "marvel_hero_names", "marvel_alignments"]
+
+
+def create_marvel_indexes(cur):
+    """
+    Create the secondary indexes on the Marvel tables (if missing).
+    """
+    for index_name, target in MARVEL_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+
+
+def drop_marvel_indexes(cur):
+    """
+    Drop the secondary indexes so a bulk load does not maintain them
+    row by row. Call create_marvel_indexes afterwards.
+    """
+    for index_name in MARVEL_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {index_name}")
 
 
 def create_marvel_tables():
@@ -11,7 +41,7 @@ def create_marvel_tables():
     lookup tables so that the main tables only store integer IDs
     and numeric values.
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = database.get_connection()
     cur = conn.cursor()
 
     # ---------- Lookup tables (each string stored once, UNIQUE) ----------
@@ -89,8 +119,248 @@ def create_marvel_tables():
         )
     """)
 
+    create_marvel_indexes(cur)
+    # the counter first: rebuilding the summaries bumps it
+    create_version_tracking(cur)
+    create_power_index_tables(cur)
+    search.create_search_index(cur)
+
     conn.commit()
-    conn.close()
+    database.release_connection(conn)
+
+
+def create_version_tracking(cur):
+    """
+    Create the marvel_data_version counter and the triggers that bump it
+    on every insert, update and delete in VERSIONED_TABLES.
+
+    Caches built from the Marvel tables (the NumPy columns in
+    marvel_analysis, the similarity index, the report cache) compare
+    this single row instead of scanning the tables.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS marvel_data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO marvel_data_version (id, version) VALUES (1, 0)")
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS marvel_version_{table}_after_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE marvel_data_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+
+def bump_data_version(cur):
+    """
+    Move marvel_data_version on for a write the triggers don't see
+    (no-op if the database has no counter yet).
+    """
+    try:
+        cur.execute("UPDATE marvel_data_version SET version = version + 1 WHERE id = 1")
+    except sqlite3.OperationalError:
+        pass
+
+
+def get_data_version(cur):
+    """
+    The current marvel_data_version counter, or None if the database
+    has no counter yet (then nothing should be cached).
+    """
+    try:
+        cur.execute("SELECT version FROM marvel_data_version WHERE id = 1")
+    except sqlite3.OperationalError:
+        return None
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def create_power_index_tables(cur):
+    """
+    Create the materialized power-index summary tables and the triggers
+    that keep them up to date.
+
+    - marvel_power_index: one row per hero with its power index
+      (average of the non-null stats), indexed so the top N heroes can
+      be read without touching the rest of the table.
+    - marvel_alignment_stats: per-alignment running sums and counts of
+      each stat, so averages are a single row read per alignment.
+
+    The triggers fire on every insert, update and delete in
+    marvel_powerstats and on alignment changes in marvel_heroes, so the
+    summaries are updated inside the same transaction as the write.
+    If the summaries are empty but powerstats exist (an older database),
+    they are filled once with rebuild_power_index_tables.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS marvel_power_index (
+            hero_id INTEGER PRIMARY KEY,
+            power_index REAL NOT NULL,
+            stat_count INTEGER NOT NULL,
+            FOREIGN KEY (hero_id) REFERENCES marvel_heroes(id)
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_marvel_power_index_rank
+        ON marvel_power_index (power_index DESC, hero_id)
+    """)
+
+    stat_columns = ",\n            ".join(
+        f"{s}_sum INTEGER NOT NULL DEFAULT 0,\n            {s}_count INTEGER NOT NULL DEFAULT 0"
+        for s in STAT_NAMES
+    )
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS marvel_alignment_stats (
+            alignment_id INTEGER PRIMARY KEY,
+            hero_count INTEGER NOT NULL DEFAULT 0,
+            {stat_columns},
+            FOREIGN KEY (alignment_id) REFERENCES marvel_alignments(id)
+        )
+    """)
+
+    stat_count = " + ".join(f"(NEW.{s} IS NOT NULL)" for s in STAT_NAMES)
+    stat_sum = " + ".join(f"COALESCE(NEW.{s}, 0)" for s in STAT_NAMES)
+    insert_columns = ", ".join(f"{s}_sum, {s}_count" for s in STAT_NAMES)
+    insert_values = ", ".join(
+        f"COALESCE(NEW.{s}, 0), (NEW.{s} IS NOT NULL)" for s in STAT_NAMES
+    )
+    add_updates = ",\n                ".join(
+        f"{s}_sum = {s}_sum + excluded.{s}_sum, {s}_count = {s}_count + excluded.{s}_count"
+        for s in STAT_NAMES
+    )
+    sub_updates = ",\n                ".join(
+        f"{s}_sum = {s}_sum - COALESCE(OLD.{s}, 0), {s}_count = {s}_count - (OLD.{s} IS NOT NULL)"
+        for s in STAT_NAMES
+    )
+
+    # Statements shared by the insert/update/delete triggers on
+    # marvel_powerstats: add the NEW row, remove the OLD row.
+    add_new_row = f"""
+            INSERT OR REPLACE INTO marvel_power_index (hero_id, power_index, stat_count)
+            SELECT NEW.hero_id, ({stat_sum}) * 1.0 / ({stat_count}), {stat_count}
+            WHERE ({stat_count}) > 0;
+
+            INSERT INTO marvel_alignment_stats (alignment_id, hero_count, {insert_columns})
+            SELECT h.alignment_id, 1, {insert_values}
+            FROM marvel_heroes AS h
+            WHERE h.id = NEW.hero_id AND h.alignment_id IS NOT NULL
+            ON CONFLICT (alignment_id) DO UPDATE SET
+                hero_count = hero_count + 1,
+                {add_updates};
+    """
+    remove_old_row = f"""
+            DELETE FROM marvel_power_index WHERE hero_id = OLD.hero_id;
+
+            UPDATE marvel_alignment_stats SET
+                hero_count = hero_count - 1,
+                {sub_updates}
+            WHERE alignment_id = (
+                SELECT alignment_id FROM marvel_heroes WHERE id = OLD.hero_id
+            );
+    """
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS marvel_powerstats_after_insert
+        AFTER INSERT ON marvel_powerstats
+        BEGIN
+            {add_new_row}
+        END
+    """)
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS marvel_powerstats_after_delete
+        AFTER DELETE ON marvel_powerstats
+        BEGIN
+            {remove_old_row}
+        END
+    """)
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS marvel_powerstats_after_update
+        AFTER UPDATE ON marvel_powerstats
+        BEGIN
+            {remove_old_row}
+            {add_new_row}
+        END
+    """)
+
+    # A hero changing alignment moves its stats from one row of
+    # marvel_alignment_stats to the other.
+    hero_stat = "(SELECT p.{s} FROM marvel_powerstats AS p WHERE p.hero_id = NEW.id)"
+    move_out = ",\n                ".join(
+        f"{s}_sum = {s}_sum - COALESCE({hero_stat.format(s=s)}, 0), "
+        f"{s}_count = {s}_count - ({hero_stat.format(s=s)} IS NOT NULL)"
+        for s in STAT_NAMES
+    )
+    move_in_values = ", ".join(
+        f"COALESCE(p.{s}, 0), (p.{s} IS NOT NULL)" for s in STAT_NAMES
+    )
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS marvel_heroes_after_alignment_update
+        AFTER UPDATE OF alignment_id ON marvel_heroes
+        WHEN OLD.alignment_id IS NOT NEW.alignment_id
+            AND EXISTS (SELECT 1 FROM marvel_powerstats WHERE hero_id = NEW.id)
+        BEGIN
+            UPDATE marvel_alignment_stats SET
+                hero_count = hero_count - 1,
+                {move_out}
+            WHERE alignment_id = OLD.alignment_id;
+
+            INSERT INTO marvel_alignment_stats (alignment_id, hero_count, {insert_columns})
+            SELECT NEW.alignment_id, 1, {move_in_values}
+            FROM marvel_powerstats AS p
+            WHERE p.hero_id = NEW.id AND NEW.alignment_id IS NOT NULL
+            ON CONFLICT (alignment_id) DO UPDATE SET
+                hero_count = hero_count + 1,
+                {add_updates};
+        END
+    """)
+
+    cur.execute("SELECT EXISTS (SELECT 1 FROM marvel_power_index)")
+    has_summary = cur.fetchone()[0]
+    cur.execute("SELECT EXISTS (SELECT 1 FROM marvel_powerstats)")
+    has_stats = cur.fetchone()[0]
+    if has_stats and not has_summary:
+        rebuild_power_index_tables(cur)
+
+
+def rebuild_power_index_tables(cur):
+    """
+    Recompute both summary tables from scratch out of marvel_powerstats.
+    The triggers don't fire for these writes, so marvel_data_version is
+    bumped here.
+    """
+    stat_count = " + ".join(f"(p.{s} IS NOT NULL)" for s in STAT_NAMES)
+    stat_sum = " + ".join(f"COALESCE(p.{s}, 0)" for s in STAT_NAMES)
+    insert_columns = ", ".join(f"{s}_sum, {s}_count" for s in STAT_NAMES)
+    select_columns = ", ".join(
+        f"COALESCE(SUM(p.{s}), 0), COUNT(p.{s})" for s in STAT_NAMES
+    )
+
+    cur.execute("DELETE FROM marvel_power_index")
+    cur.execute(f"""
+        INSERT INTO marvel_power_index (hero_id, power_index, stat_count)
+        SELECT p.hero_id, ({stat_sum}) * 1.0 / ({stat_count}), {stat_count}
+        FROM marvel_powerstats AS p
+        WHERE ({stat_count}) > 0
+    """)
+
+    cur.execute("DELETE FROM marvel_alignment_stats")
+    cur.execute(f"""
+        INSERT INTO marvel_alignment_stats (alignment_id, hero_count, {insert_columns})
+        SELECT h.alignment_id, COUNT(*), {select_columns}
+        FROM marvel_heroes AS h
+        JOIN marvel_powerstats AS p
+            ON h.id = p.hero_id
+        WHERE h.alignment_id IS NOT NULL
+        GROUP BY h.alignment_id
+    """)
+    bump_data_version(cur)
 
 
 if __name__ == "__main__":
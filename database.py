@@ -0,0 +1,110 @@
+"""
+database.py
+Shared access to final_project.db for every script in the project.
+
+Connections are pooled: get_connection() hands out an idle connection
+if there is one and release_connection() gives it back instead of
+closing it, so a run that queries the database many times only opens
+it once. Every connection is tuned the same way (WAL journal,
+synchronous=NORMAL, a larger page cache, memory-mapped I/O and a
+prepared-statement cache).
+"""
+
+import sqlite3
+import threading
+
+import profiling
+
+DB_NAME = "final_project.db"
+
+# Tuning applied to every connection.
+CACHE_SIZE_KB = 64 * 1024          # page cache (PRAGMA cache_size is negative for KiB)
+MMAP_SIZE = 256 * 1024 * 1024      # bytes of the file that may be memory mapped
+STATEMENT_CACHE_SIZE = 256         # prepared statements kept per connection
+MAX_IDLE_CONNECTIONS = 4           # idle connections kept per database file
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection that remembers which file it belongs to,
+    so release_connection() knows which pool to return it to.
+    """
+    db_path = None
+
+
+def set_db_path(path):
+    """
+    Point every module at a different database file (used by benchmarks).
+    Idle connections to the previous file are closed.
+    """
+    global DB_NAME
+    close_all()
+    DB_NAME = path
+
+
+def get_db_path():
+    return DB_NAME
+
+
+def connect(db_path=None):
+    """
+    Open a new tuned connection. Pass it to release_connection() to
+    keep it for reuse, or close() it.
+    """
+    path = db_path or DB_NAME
+    conn = sqlite3.connect(
+        path,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        factory=PooledConnection,
+    )
+    conn.db_path = path
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    profiling.install_sql_trace(conn)
+    return conn
+
+
+def get_connection(db_path=None):
+    """
+    Return a pooled connection to db_path (default: DB_NAME).
+    The caller has it to itself until release_connection(conn).
+    """
+    path = db_path or DB_NAME
+    with _pool_lock:
+        idle = _pool.get(path)
+        if idle:
+            return idle.pop()
+    return connect(path)
+
+
+def release_connection(conn):
+    """
+    Give a connection back to the pool. Anything not committed is
+    rolled back, like closing a connection would.
+    """
+    if conn.in_transaction:
+        conn.rollback()
+    with _pool_lock:
+        idle = _pool.setdefault(conn.db_path, [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def close_all():
+    """
+    Close every idle pooled connection.
+    """
+    with _pool_lock:
+        for idle in _pool.values():
+            for conn in idle:
+                conn.close()
+        _pool.clear()
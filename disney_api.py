@@ -1,10 +1,50 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import sqlite3
+from requests.adapters import HTTPAdapter
+
+import database
+import disney_stats
+import profiling
+import search
+
+BASE_URL = "https://api.disneyapi.dev/character"
+
+# page fetching: how many pages are downloaded ahead of the inserter,
+# and how often a failed page is retried (with exponential backoff)
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5
 
-DB_NAME = "final_project.db"
+# key for this crawl in the crawl_state table
+CRAWL_SOURCE = "disney_characters"
+
+# characters (and media rows) added per run, per the assignment
+MAX_PER_RUN = 25
+
+# delta sync: changed characters rewritten per transaction
+SYNC_BATCH_SIZE = 500
+
+# secondary indexes on character_media, created by migrate_disney_schema.
+# the per-character count / count(distinct type_id) aggregations need an
+# index that starts with (character_id, type_id); the UNIQUE constraint
+# provides one, so the fallback below is only built for tables created
+# without it. nothing covered lookups from the title side before.
+DISNEY_INDEXES = {
+    "idx_character_media_title": "character_media (title_id, character_id)",
+}
+CHARACTER_SIDE_INDEX = ("idx_character_media_character_type",
+                        "character_media (character_id, type_id)")
 
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    return database.get_connection()
 
 def setup_database():
     conn = get_connection()
@@ -14,7 +54,8 @@ def setup_database():
         CREATE TABLE IF NOT EXISTS characters (
             id INTEGER PRIMARY KEY,
             name TEXT,
-            image_url TEXT
+            image_url TEXT,
+            content_hash TEXT
         );
     """)
 
@@ -42,129 +83,543 @@ def setup_database():
         );
     """)
 
+    # resumable crawl: last fully consumed page per source, and a content
+    # hash per page so unchanged pages can be skipped
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            source TEXT PRIMARY KEY,
+            last_page INTEGER
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_pages (
+            page INTEGER PRIMARY KEY,
+            content_hash TEXT,
+            completed INTEGER
+        );
+    """)
+
+    migrate_disney_schema(cur)
+    search.create_search_index(cur)
+
     conn.commit()
-    conn.close()
+    database.release_connection(conn)
+
+def has_character_side_index(cur):
+    """true if some index on character_media starts with (character_id, type_id)"""
+    cur.execute("PRAGMA index_list(character_media);")
+    for row in cur.fetchall():
+        index_name = row[1]
+        cur.execute(f"PRAGMA index_info({index_name});")
+        columns = [r[2] for r in sorted(cur.fetchall())]
+        if columns[:2] == ["character_id", "type_id"]:
+            return True
+    return False
+
+def migrate_disney_schema(cur):
+    """
+    bring an existing database up to the current schema: create any
+    missing secondary indexes and refresh the planner statistics for them.
+    safe to run on every setup
+    """
+    # per-character hash for delta sync; NULL for rows stored before it
+    cur.execute("PRAGMA table_info(characters);")
+    if "content_hash" not in {r[1] for r in cur.fetchall()}:
+        cur.execute("ALTER TABLE characters ADD COLUMN content_hash TEXT;")
+
+    # change counter behind the disney_stats / disney_graph caches
+    disney_stats.create_version_tracking(cur)
+
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'index';")
+    present = {r[0] for r in cur.fetchall()}
+
+    wanted = dict(DISNEY_INDEXES)
+    if not has_character_side_index(cur):
+        wanted[CHARACTER_SIDE_INDEX[0]] = CHARACTER_SIDE_INDEX[1]
+
+    created = False
+    for index_name, target in wanted.items():
+        if index_name not in present:
+            cur.execute(f"CREATE INDEX {index_name} ON {target};")
+            created = True
+
+    if created:
+        cur.execute("ANALYZE character_media;")
+
+MEDIA_TYPES = ["films", "shortFilms", "tvShows", "videoGames", "parkAttractions"]
+
+# sqlite's default limit on ? placeholders is 999, so IN (...) lists are chunked
+SQL_CHUNK_SIZE = 500
 
 def seed_media_types(cur):
-    types = ["films", "shortFilms", "tvShows", "videoGames", "parkAttractions"]
-    for t in types:
-        cur.execute(
-            "INSERT OR IGNORE INTO media_types (type_name) VALUES (?);",
-            (t,)
-        )
+    cur.executemany(
+        "INSERT OR IGNORE INTO media_types (type_name) VALUES (?);",
+        [(t,) for t in MEDIA_TYPES]
+    )
+
+def load_type_ids(cur):
+    """{type_name: type_id} for the five media types (call after seed_media_types)"""
+    cur.execute("SELECT type_name, type_id FROM media_types;")
+    return dict(cur.fetchall())
 
 def get_existing_character_ids(cur):
     cur.execute("SELECT id FROM characters;")
     return {r[0] for r in cur.fetchall()}
 
-def get_type_id(type_name, cur):
-    cur.execute(
-        "SELECT type_id FROM media_types WHERE type_name = ?;",
-        (type_name,)
-    )
-    return cur.fetchone()[0]
-
-def get_title_id(title, cur):
-    cur.execute(
-        "SELECT title_id FROM media_titles WHERE title = ?;",
-        (title,)
-    )
+def get_crawl_cursor(cur, source=CRAWL_SOURCE):
+    """last page that was fully consumed (0 if the crawl never ran)"""
+    cur.execute("SELECT last_page FROM crawl_state WHERE source = ?;", (source,))
     row = cur.fetchone()
-    if row:
-        return row[0]
-
-    cur.execute(
-        "INSERT INTO media_titles (title) VALUES (?);",
-        (title,)
-    )
-    return cur.lastrowid
-
-def store_characters():
-    setup_database()
-    conn = get_connection()
-    cur = conn.cursor()
-
-    seed_media_types(cur)
-    existing = get_existing_character_ids(cur)
-
-    url = "https://api.disneyapi.dev/character"
-    page = 1
-
-    character_added = 0
-    media_added = 0
-    titles_added = 0
-
-    MAX_PER_RUN = 25
-
-    while character_added < MAX_PER_RUN and media_added < MAX_PER_RUN:
-        response = requests.get(f"{url}?page={page}")
-        if response.status_code != 200:
+    return row[0] if row else 0
+
+def save_crawl_cursor(cur, page, source=CRAWL_SOURCE):
+    """
+    record page as consumed. the cursor only moves forward: runs that
+    start again from page 1 (--restart, --sync) and are interrupted must
+    not send the next resume back over pages already stored
+    """
+    cur.execute("""
+        INSERT INTO crawl_state (source, last_page) VALUES (?, ?)
+        ON CONFLICT(source) DO UPDATE SET last_page = max(last_page, excluded.last_page);
+    """, (source, page))
+
+def page_hash(characters):
+    """stable hash of a page's character list"""
+    text = json.dumps(characters, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def character_hash(character):
+    """
+    stable hash of what is stored for a character: name, image and the
+    title lists (order doesn't matter, the media rows are a set)
+    """
+    content = {
+        "name": character.get("name"),
+        "imageUrl": character.get("imageUrl"),
+        "media": {m_type: sorted(set(titles)) for m_type, titles in get_media_lists(character).items()},
+    }
+    text = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def load_character_hashes(cur):
+    """{character id: content_hash} for every stored character"""
+    cur.execute("SELECT id, content_hash FROM characters;")
+    return dict(cur.fetchall())
+
+def get_page_state(cur, page):
+    """(content_hash, completed) stored for a page, or None"""
+    cur.execute("SELECT content_hash, completed FROM crawl_pages WHERE page = ?;", (page,))
+    return cur.fetchone()
+
+def save_page_state(cur, page, content_hash, completed):
+    cur.execute("""
+        INSERT INTO crawl_pages (page, content_hash, completed) VALUES (?, ?, ?)
+        ON CONFLICT(page) DO UPDATE SET
+            content_hash = excluded.content_hash,
+            completed = excluded.completed;
+    """, (page, content_hash, int(completed)))
+
+@profiling.timed("disney.lookup_title_ids")
+def lookup_title_ids(titles, cur):
+    """returns {title: title_id} for the given titles that are already in media_titles"""
+    titles = list(titles)
+    found = {}
+    for i in range(0, len(titles), SQL_CHUNK_SIZE):
+        chunk = titles[i:i + SQL_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"SELECT title, title_id FROM media_titles WHERE title IN ({placeholders});",
+            chunk
+        )
+        found.update(cur.fetchall())
+    return found
+
+def get_media_lists(character):
+    return {
+        "films": character.get("films", []),
+        "shortFilms": character.get("shortFilms", []),
+        "tvShows": character.get("tvShows", []),
+        "videoGames": character.get("videoGames", []),
+        "parkAttractions": character.get("parkAttractions", [])
+    }
+
+@profiling.timed("disney.store_page")
+def store_page(cur, characters, existing, type_ids, title_ids, counts, max_per_run):
+    """
+    insert the new characters of one page plus their titles and media rows.
+
+    the page is planned in memory first (respecting the per-run caps in
+    counts), then written with a few batched statements: one executemany
+    for characters, one INSERT OR IGNORE executemany for the missing
+    titles, one query to read their ids back, and one executemany for
+    character_media. title_ids is a {title: title_id} cache kept across pages.
+    """
+    # titles on this page we haven't resolved yet -> one lookup query
+    unknown = set()
+    for character in characters:
+        if character["_id"] in existing:
+            continue
+        for titles in get_media_lists(character).values():
+            unknown.update(t for t in titles if t not in title_ids)
+    if unknown:
+        title_ids.update(lookup_title_ids(unknown, cur))
+
+    character_rows = []
+    new_titles = {}
+    planned = {}
+
+    for character in characters:
+        # a character is only added while it can get at least one media row
+        if counts["characters"] >= max_per_run or counts["media"] >= max_per_run:
             break
 
-        data = response.json()
-        if "data" not in data or not data["data"]:
-            break
+        cid = character["_id"]
+        if cid in existing:
+            continue
+
+        counts["characters"] += 1
+        existing.add(cid)
+        # only a character whose media all fit in this run gets a hash;
+        # a cut-off one keeps NULL so the next delta sync completes it
+        complete = True
 
-        for character in data["data"]:
-            if character_added >= MAX_PER_RUN:
+        for m_type, titles in get_media_lists(character).items():
+            if counts["media"] >= max_per_run:
+                complete = False
                 break
 
-            cid = character["_id"]
-            if cid in existing:
-                continue
+            type_id = type_ids[m_type]
 
-            cur.execute("""
-                INSERT OR IGNORE INTO characters (id, name, image_url)
-                VALUES (?, ?, ?);
-            """, (cid, character.get("name"), character.get("imageUrl")))
+            for title in titles:
+                if counts["media"] >= max_per_run:
+                    complete = False
+                    break
 
-            character_added += 1
-            existing.add(cid)
+                # insert title if needed
+                if title not in title_ids and title not in new_titles:
+                    new_titles[title] = None
+                    counts["titles"] += 1
+                    if counts["titles"] > max_per_run:
+                        complete = False
+                        break
 
-            media_lists = {
-                "films": character.get("films", []),
-                "shortFilms": character.get("shortFilms", []),
-                "tvShows": character.get("tvShows", []),
-                "videoGames": character.get("videoGames", []),
-                "parkAttractions": character.get("parkAttractions", [])
-            }
+                key = (cid, type_id, title)
+                if key not in planned:
+                    planned[key] = None
+                    counts["media"] += 1
 
-            for m_type, titles in media_lists.items():
-                if media_added >= MAX_PER_RUN:
-                    break
+        content_hash = character_hash(character) if complete else None
+        character_rows.append((cid, character.get("name"), character.get("imageUrl"), content_hash))
 
-                type_id = get_type_id(m_type, cur)
+    cur.executemany("""
+        INSERT OR IGNORE INTO characters (id, name, image_url, content_hash)
+        VALUES (?, ?, ?, ?);
+    """, character_rows)
 
-                for title in titles:
-                    if media_added >= MAX_PER_RUN:
-                        break
+    if new_titles:
+        cur.executemany(
+            "INSERT OR IGNORE INTO media_titles (title) VALUES (?);",
+            [(t,) for t in new_titles]
+        )
+        title_ids.update(lookup_title_ids(new_titles, cur))
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO character_media
+        (character_id, type_id, title_id)
+        VALUES (?, ?, ?);
+    """, [(cid, type_id, title_ids[title]) for cid, type_id, title in planned])
+
+@profiling.timed("disney.rewrite_characters")
+def rewrite_characters(cur, characters, type_ids, title_ids):
+    """
+    replace the stored row and all character_media rows of already stored
+    characters with their fetched content, so removed titles go away too.
+    the media rows are deleted and re-inserted rather than diffed; every
+    write bumps the disney_stats change counter, which invalidates its cache.
+    """
+    wanted = set()
+    for character in characters:
+        for titles in get_media_lists(character).values():
+            wanted.update(titles)
+    missing = [t for t in wanted if t not in title_ids]
+    if missing:
+        title_ids.update(lookup_title_ids(missing, cur))
+        new_titles = [t for t in missing if t not in title_ids]
+        if new_titles:
+            cur.executemany(
+                "INSERT OR IGNORE INTO media_titles (title) VALUES (?);",
+                [(t,) for t in new_titles]
+            )
+            title_ids.update(lookup_title_ids(new_titles, cur))
+
+    cur.executemany("""
+        UPDATE characters SET name = ?, image_url = ?, content_hash = ?
+        WHERE id = ?;
+    """, [(c.get("name"), c.get("imageUrl"), character_hash(c), c["_id"]) for c in characters])
+
+    cur.executemany(
+        "DELETE FROM character_media WHERE character_id = ?;",
+        [(c["_id"],) for c in characters]
+    )
+    cur.executemany("""
+        INSERT OR IGNORE INTO character_media
+        (character_id, type_id, title_id)
+        VALUES (?, ?, ?);
+    """, [
+        (c["_id"], type_ids[m_type], title_ids[title])
+        for c in characters
+        for m_type, titles in get_media_lists(c).items()
+        for title in titles
+    ])
+
+def make_session(concurrency=DEFAULT_CONCURRENCY):
+    """shared keep-alive session with a connection pool sized for the workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session, url, page, retries=None, backoff=None):
+    """
+    fetch one page of characters and return the decoded json.
+    non-200 answers and connection errors are retried with backoff
+    (MAX_RETRIES and BACKOFF_SECONDS unless given); other 4xx answers
+    are not retried. returns None if the page still can't be fetched
+    """
+    retries = MAX_RETRIES if retries is None else retries
+    backoff = BACKOFF_SECONDS if backoff is None else backoff
+    for attempt in range(retries + 1):
+        try:
+            with profiling.timer("disney.http_wait"):
+                response = session.get(url, params={"page": page}, timeout=30)
+        except requests.RequestException:
+            response = None
+
+        if response is not None:
+            if response.status_code == 200:
+                with profiling.timer("disney.json_decode"):
+                    return response.json()
+            # client errors (other than rate limiting) won't fix themselves
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                return None
+
+        if attempt < retries:
+            profiling.count("disney.page_retries")
+            time.sleep(backoff * (2 ** attempt))
+    return None
+
+def iter_pages(url=BASE_URL, start_page=1, concurrency=DEFAULT_CONCURRENCY, session=None):
+    """
+    yields (page, data) in page order. a producer thread keeps up to
+    `concurrency` pages in flight on a thread pool and hands them to the
+    caller through a bounded queue, so downloads overlap with the inserts.
+    stops at the first page that is missing, empty or failed.
+    """
+    if session is None:
+        session = make_session(concurrency)
+
+    stop = threading.Event()
+    pending = queue.Queue(maxsize=concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def producer():
+        page = start_page
+        while not stop.is_set():
+            try:
+                future = executor.submit(fetch_page, session, url, page)
+            except RuntimeError:
+                # executor was shut down by the consumer
+                return
+            while not stop.is_set():
+                try:
+                    pending.put((page, future), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            page += 1
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            page, future = pending.get()
+            # time the inserter spends waiting on downloads
+            with profiling.timer("disney.page_wait"):
+                data = future.result()
+            if not data or "data" not in data or not data["data"]:
+                return
+            yield page, data
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def begin_crawl(cur, resume=True):
+    """
+    state for one run of the crawl: the per-run counts, the caches used by
+    store_page and the resume cursor (0 when resume is False).
+    """
+    seed_media_types(cur)
+    return {
+        "type_ids": load_type_ids(cur),
+        "title_ids": {},
+        "existing": get_existing_character_ids(cur),
+        "cursor_page": get_crawl_cursor(cur) if resume else 0,
+        "counts": {"characters": 0, "media": 0, "titles": 0},
+        "pages_seen": 0,
+        "pages_skipped": 0,
+    }
+
+def crawl_full(crawl):
+    """true once this run has added as much as it is allowed to"""
+    counts = crawl["counts"]
+    return counts["characters"] >= MAX_PER_RUN or counts["media"] >= MAX_PER_RUN
+
+def crawl_page(cur, page, characters, crawl):
+    """
+    store one fetched page (skipping it if an identical copy was already
+    completed), record its state and move the resume cursor if possible.
+    """
+    crawl["pages_seen"] += 1
+    content_hash = page_hash(characters)
+
+    state = get_page_state(cur, page)
+    if state is not None and state[0] == content_hash and state[1]:
+        crawl["pages_skipped"] += 1
+        profiling.count("disney.pages_unchanged")
+    else:
+        store_page(cur, characters, crawl["existing"], crawl["type_ids"],
+                   crawl["title_ids"], crawl["counts"], MAX_PER_RUN)
+
+    completed = all(c["_id"] in crawl["existing"] for c in characters)
+    save_page_state(cur, page, content_hash, completed)
+
+    # the cursor only moves over an unbroken run of completed pages
+    if completed and page == crawl["cursor_page"] + 1:
+        crawl["cursor_page"] = page
+        save_crawl_cursor(cur, page)
+
+def print_crawl_summary(crawl):
+    counts = crawl["counts"]
+    print("Run summary:")
+    print("characters added:", counts["characters"])
+    print("media rows added:", counts["media"])
+    print("titles added:", counts["titles"])
+    print("pages processed:", crawl["pages_seen"], f"({crawl['pages_skipped']} unchanged, skipped)")
+    print("resume cursor: page", crawl["cursor_page"])
+
+@profiling.timed("disney.store_characters")
+def store_characters(url=BASE_URL, concurrency=DEFAULT_CONCURRENCY, resume=True, write_lock=None):
+    """
+    add up to 25 new characters (and their media rows) per run.
+
+    with resume=True the crawl starts after the last page that an earlier
+    run fully consumed, instead of re-downloading every page from 1.
+    pages whose content hash matches an already completed page are skipped.
+    each page is committed on its own. write_lock (a lock shared with other
+    writers, see pipeline.py) is held around each page's writes only, not
+    while pages download.
+    returns the counts of characters, media rows and titles added.
+    """
+    lock = write_lock or contextlib.nullcontext()
+    with lock:
+        setup_database()
+    conn = get_connection()
+    cur = conn.cursor()
 
-                    # insert title if needed
-                    before = titles_added
-                    title_id = get_title_id(title, cur)
-                    if cur.rowcount > 0:
-                        titles_added += 1
-                        if titles_added > MAX_PER_RUN:
-                            break
+    with lock:
+        crawl = begin_crawl(cur, resume)
+        conn.commit()
 
-                    cur.execute("""
-                        INSERT OR IGNORE INTO character_media
-                        (character_id, type_id, title_id)
-                        VALUES (?, ?, ?);
-                    """, (cid, type_id, title_id))
+    for page, data in iter_pages(url, start_page=crawl["cursor_page"] + 1, concurrency=concurrency):
+        if crawl_full(crawl):
+            break
+        with lock:
+            crawl_page(cur, page, data["data"], crawl)
+            conn.commit()
+
+    with lock:
+        # a restarted run may stop short of the cursor an earlier run saved
+        crawl["cursor_page"] = get_crawl_cursor(cur)
+        search.apply_search_queue(cur)
+        conn.commit()
+    database.release_connection(conn)
+
+    print_crawl_summary(crawl)
+    return crawl["counts"]
+
+@profiling.timed("disney.sync_characters")
+def sync_characters(url=BASE_URL, concurrency=DEFAULT_CONCURRENCY, batch_size=SYNC_BATCH_SIZE):
+    """
+    delta sync: walk every page from page 1 and compare each character's
+    content hash with the stored one. changed characters (and ones stored
+    without a hash) are rewritten with rewrite_characters, committed every
+    batch_size characters. characters that aren't stored yet are added the
+    normal way, so the per-run cap still applies to them.
+    the rewrites bump the disney_stats change counter (triggers on
+    characters and character_media), so the cached stats and
+    co-appearance graph are recomputed on their next use.
+    returns counts of unchanged, updated and new characters.
+    """
+    setup_database()
+    conn = get_connection()
+    cur = conn.cursor()
 
-                    if cur.rowcount > 0:
-                        media_added += 1
+    crawl = begin_crawl(cur, resume=False)
+    stored = load_character_hashes(cur)
+    sync = {"unchanged": 0, "updated": 0, "new": 0, "new_waiting": 0}
+    changed = {}
 
-        page += 1
+    for page, data in iter_pages(url, start_page=1, concurrency=concurrency):
+        characters = data["data"]
+        for character in characters:
+            cid = character["_id"]
+            if cid not in stored:
+                continue
+            if stored[cid] == character_hash(character):
+                sync["unchanged"] += 1
+            else:
+                changed[cid] = character
+
+        # once the run is full, later pages are only checked for changes
+        if not crawl_full(crawl):
+            crawl_page(cur, page, characters, crawl)
+        sync["new_waiting"] += sum(c["_id"] not in crawl["existing"] for c in characters)
+
+        if len(changed) >= batch_size:
+            rewrite_characters(cur, list(changed.values()), crawl["type_ids"], crawl["title_ids"])
+            sync["updated"] += len(changed)
+            changed = {}
+            conn.commit()
+
+    if changed:
+        rewrite_characters(cur, list(changed.values()), crawl["type_ids"], crawl["title_ids"])
+        sync["updated"] += len(changed)
+    sync["new"] = crawl["counts"]["characters"]
+    search.apply_search_queue(cur)
 
     conn.commit()
-    conn.close()
+    database.release_connection(conn)
 
-    print("Run summary:")
-    print("characters added:", character_added)
-    print("media rows added:", media_added)
-    print("titles added:", titles_added)
+    print("Sync summary:")
+    print("unchanged characters:", sync["unchanged"])
+    print("updated characters:", sync["updated"])
+    print("new characters added:", sync["new"], f"({sync['new_waiting']} left for later runs)")
+    return sync
 
 if __name__ == "__main__":
-    store_characters()
+    parser = argparse.ArgumentParser(description="add disney characters to final_project.db")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the saved page cursor and crawl from page 1")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="pages fetched ahead of the inserter")
+    parser.add_argument("--sync", action="store_true",
+                        help="re-check every page and refresh characters whose content changed")
+    args = parser.parse_args()
+
+    if args.sync:
+        sync_characters(concurrency=args.concurrency)
+    else:
+        store_characters(concurrency=args.concurrency, resume=not args.restart)
@@ -0,0 +1,328 @@
+"""
+disney_graph.py
+who appears with whom: a co-appearance graph of disney characters built
+from character_media.
+
+the character x title incidence matrix A (1 where a character appears in
+a title, under any media type) is loaded once; A @ A.T then gives, for
+every pair of characters, the number of titles they share. the result is
+kept as a sparse matrix in CSR form (indptr / indices / counts, diagonal
+dropped), together with each character's degree (distinct co-stars) and
+strength (shared appearances summed over co-stars).
+
+engines, best available first:
+  - scipy:  scipy.sparse CSR product
+  - numpy:  the same CSR arrays built with numpy: every title's cast is
+            expanded to its character pairs and the pairs are counted
+            with np.unique, so there is no python loop over characters.
+            the pairs are expanded PAIR_BUDGET at a time, so a title
+            with a huge cast can't blow up memory
+  - sql:    a self-join of character_media grouped by character pair
+
+like disney_stats, the graph is cached per database until the tables
+change (same watermark: the disney_data_version counter).
+
+    python disney_graph.py [--top 10] [--by degree|strength] [--character ID]
+"""
+
+import argparse
+import heapq
+import itertools
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+import database
+import disney_stats
+import profiling
+
+ENGINES = ["scipy", "numpy", "sql"]
+
+# most character pairs the numpy engine expands at once
+PAIR_BUDGET = 4_000_000
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def available_engines():
+    """the engines that can run here, best first"""
+    usable = {"scipy": sparse is not None and np is not None, "numpy": np is not None, "sql": True}
+    return [e for e in ENGINES if usable[e]]
+
+def load_incidence(cur):
+    """
+    distinct (character, title) links as numpy arrays: rows are positions
+    in the sorted character_ids array, cols positions in title_ids
+    """
+    cur.execute("""
+        select distinct character_id, title_id
+        from character_media
+        where character_id is not null and title_id is not null;
+    """)
+    rows = cur.fetchall()
+    # flattening into fromiter is ~2x faster than np.array on the tuples
+    links = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64,
+                        count=2 * len(rows)).reshape(-1, 2)
+    character_ids, rows = np.unique(links[:, 0], return_inverse=True)
+    title_ids, cols = np.unique(links[:, 1], return_inverse=True)
+    return character_ids, title_ids, rows, cols
+
+def finish_graph(character_ids, indptr, indices, counts):
+    """add per-character degree and strength to a CSR co-appearance matrix"""
+    degree = np.diff(indptr)
+    pair_rows = np.repeat(np.arange(len(character_ids)), degree)
+    return {
+        "character_ids": character_ids,
+        "indptr": indptr,
+        "indices": indices,
+        "counts": counts,
+        "degree": degree,
+        "strength": np.bincount(pair_rows, weights=counts,
+                                minlength=len(character_ids)).astype(np.int64),
+    }
+
+def coappearance_scipy(cur):
+    """A @ A.T with scipy.sparse"""
+    character_ids, title_ids, rows, cols = load_incidence(cur)
+    a = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+        shape=(len(character_ids), len(title_ids)),
+    )
+    c = (a @ a.T).tocsr()
+    c.setdiag(0)
+    c.eliminate_zeros()
+    c.sort_indices()
+    return finish_graph(character_ids, c.indptr.astype(np.int64),
+                        c.indices.astype(np.int64), c.data.astype(np.int64))
+
+def count_pairs(members, pairs_per_link, first_link, lo, hi, n):
+    """
+    (pair keys, counts) for the ordered pairs of links lo..hi (in title
+    order): link i pairs with every member of its title. a pair of
+    characters a, b is keyed a * n + b; self pairs are dropped
+    """
+    repeat = pairs_per_link[lo:hi]
+    left = np.repeat(members[lo:hi], repeat)
+    offsets = np.arange(repeat.sum()) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    right = members[np.repeat(first_link[lo:hi], repeat) + offsets]
+    keep = left != right
+    return np.unique(left[keep] * n + right[keep], return_counts=True)
+
+def merge_pair_counts(keys, counts):
+    """sum the counts of equal keys across several (keys, counts) chunks"""
+    if len(keys) == 1:
+        return keys[0], counts[0]
+    merged, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(merged))
+    return merged, totals.astype(np.int64)
+
+def coappearance_numpy(cur):
+    """
+    A @ A.T without scipy: group the links by title, expand each title's
+    k characters to its k*k ordered pairs with array arithmetic, drop the
+    self pairs and count the rest with np.unique.
+    the links are expanded in chunks of at most PAIR_BUDGET pairs (a
+    title with a huge cast is split across chunks), so memory stays
+    bounded by the budget plus the distinct pairs of the result
+    """
+    character_ids, _, rows, cols = load_incidence(cur)
+    n = len(character_ids)
+
+    by_title = np.lexsort((rows, cols))
+    members = rows[by_title]
+    titles = cols[by_title]
+    starts = np.flatnonzero(np.r_[True, titles[1:] != titles[:-1]]) if len(titles) else titles
+    sizes = np.diff(np.r_[starts, len(titles)])
+
+    # per link (in title order): pairs it makes, and its title's first link
+    pairs_per_link = np.repeat(sizes, sizes)
+    first_link = np.repeat(starts, sizes)
+    pair_ends = np.cumsum(pairs_per_link)
+
+    keys, counts = [], []
+    pending = 0
+    lo = 0
+    while lo < len(members):
+        limit = pair_ends[lo] - pairs_per_link[lo] + PAIR_BUDGET
+        hi = max(lo + 1, int(np.searchsorted(pair_ends, limit, side="right")))
+        chunk_keys, chunk_counts = count_pairs(members, pairs_per_link, first_link, lo, hi, n)
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+        pending += len(chunk_keys)
+        if len(keys) > 1 and pending > PAIR_BUDGET:
+            merged = merge_pair_counts(keys, counts)
+            keys, counts = [merged[0]], [merged[1]]
+            pending = len(merged[0])
+        lo = hi
+
+    if keys:
+        keys, counts = merge_pair_counts(keys, counts)
+    else:
+        keys = counts = np.zeros(0, dtype=np.int64)
+    pair_rows = keys // n if n else keys
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_rows, minlength=n), out=indptr[1:])
+    return finish_graph(character_ids, indptr, keys % n if n else keys, counts.astype(np.int64))
+
+def coappearance_sql(cur):
+    """the pair counts from sqlite, in the same CSR layout (python lists)"""
+    cur.execute("""
+        with links as (
+            select distinct character_id, title_id
+            from character_media
+            where character_id is not null and title_id is not null
+        )
+        select a.character_id, b.character_id, count(*)
+        from links a
+        join links b on b.title_id = a.title_id and b.character_id != a.character_id
+        group by a.character_id, b.character_id
+        order by a.character_id, b.character_id;
+    """)
+    pairs = cur.fetchall()
+    cur.execute("select distinct character_id from character_media where title_id is not null "
+                "and character_id is not null order by character_id;")
+    character_ids = [r[0] for r in cur.fetchall()]
+    position = {cid: i for i, cid in enumerate(character_ids)}
+
+    indptr = [0] * (len(character_ids) + 1)
+    strength = [0] * len(character_ids)
+    for a, _, shared in pairs:
+        indptr[position[a] + 1] += 1
+        strength[position[a]] += shared
+    for i in range(len(character_ids)):
+        indptr[i + 1] += indptr[i]
+
+    return {
+        "character_ids": character_ids,
+        "indptr": indptr,
+        "indices": [position[b] for _, b, _ in pairs],
+        "counts": [shared for _, _, shared in pairs],
+        "degree": [indptr[i + 1] - indptr[i] for i in range(len(character_ids))],
+        "strength": strength,
+    }
+
+@profiling.timed("disney.compute_coappearance")
+def compute_coappearance(cur, engine=None):
+    """co-appearance graph with the given engine (default: best available)"""
+    engine = engine or available_engines()[0]
+    if engine not in available_engines():
+        raise ValueError(f"engine {engine!r} is not available here")
+    builders = {"scipy": coappearance_scipy, "numpy": coappearance_numpy, "sql": coappearance_sql}
+    graph = builders[engine](cur)
+    graph["engine"] = engine
+    return graph
+
+def get_coappearance(db_path=None):
+    """cached compute_coappearance for db_path (default: the shared database)"""
+    path = db_path or database.get_db_path()
+    conn = database.get_connection(path)
+    try:
+        cur = conn.cursor()
+        watermark = disney_stats.get_watermark(cur)
+        with _cache_lock:
+            cached = _cache.get(path)
+        if watermark is not None and cached is not None and cached[0] == watermark:
+            profiling.count("disney.graph_cache_hits")
+            return cached[1]
+
+        graph = compute_coappearance(cur)
+    finally:
+        database.release_connection(conn)
+
+    with _cache_lock:
+        _cache[path] = (watermark, graph)
+    return graph
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def get_names(character_ids, db_path=None):
+    """{character id: name} for the given ids"""
+    ids = [int(c) for c in character_ids]
+    names = {}
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur.execute(f"select id, name from characters where id in ({', '.join('?' for _ in chunk)});",
+                        chunk)
+            names.update(cur.fetchall())
+    finally:
+        database.release_connection(conn)
+    return names
+
+def top_connected(n, by="degree", db_path=None):
+    """
+    [(character_id, name, degree, strength)] for the n most connected
+    characters: by distinct co-stars ("degree") or shared appearances
+    ("strength"), ties broken by the other measure, then by id
+    """
+    if by not in ("degree", "strength"):
+        raise ValueError(f"unknown ranking {by!r}, expected 'degree' or 'strength'")
+    if n <= 0:
+        return []
+    graph = get_coappearance(db_path)
+    ids, degree, strength = graph["character_ids"], graph["degree"], graph["strength"]
+    first, second = (degree, strength) if by == "degree" else (strength, degree)
+
+    if isinstance(ids, list):
+        best = heapq.nsmallest(n, range(len(ids)), key=lambda i: (-first[i], -second[i], ids[i]))
+    elif len(ids) > n:
+        # only the candidates at or above the n-th largest value get sorted
+        cutoff = np.partition(first, len(first) - n)[len(first) - n]
+        candidates = np.flatnonzero(first >= cutoff)
+        order = np.lexsort((ids[candidates], -second[candidates], -first[candidates]))
+        best = candidates[order][:n]
+    else:
+        best = np.lexsort((ids, -second, -first))
+
+    names = get_names([ids[i] for i in best], db_path)
+    return [(int(ids[i]), names.get(int(ids[i])), int(degree[i]), int(strength[i])) for i in best]
+
+def coappearances(character_id, n=None, db_path=None):
+    """[(character_id, name, shared titles)] for one character's co-stars, most shared first"""
+    graph = get_coappearance(db_path)
+    ids = graph["character_ids"]
+    if isinstance(ids, list):
+        position = ids.index(character_id) if character_id in ids else None
+    else:
+        position = int(np.searchsorted(ids, character_id))
+        if position >= len(ids) or ids[position] != character_id:
+            position = None
+    if position is None:
+        return []
+
+    start, end = graph["indptr"][position], graph["indptr"][position + 1]
+    neighbours = [(int(ids[j]), int(shared)) for j, shared in
+                  zip(graph["indices"][start:end], graph["counts"][start:end])]
+    neighbours.sort(key=lambda r: (-r[1], r[0]))
+    if n is not None:
+        neighbours = neighbours[:n]
+    names = get_names([cid for cid, _ in neighbours], db_path)
+    return [(cid, names.get(cid), shared) for cid, shared in neighbours]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="disney character co-appearances")
+    parser.add_argument("--top", type=int, default=10, help="how many characters to list")
+    parser.add_argument("--by", choices=["degree", "strength"], default="degree",
+                        help="rank by distinct co-stars or by shared appearances")
+    parser.add_argument("--character", type=int, help="list this character's co-stars instead")
+    args = parser.parse_args()
+
+    if args.character is not None:
+        for cid, name, shared in coappearances(args.character, args.top):
+            print(f"{cid:8d}  {name}: {shared} shared titles")
+    else:
+        print("character  co-stars  shared appearances  name")
+        for cid, name, degree, strength in top_connected(args.top, args.by):
+            print(f"{cid:9d}  {degree:8d}  {strength:18d}  {name}")
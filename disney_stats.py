@@ -0,0 +1,138 @@
+"""
+disney_stats.py
+one grouped pass over characters + character_media that serves every
+disney statistic (calculations.py and visulizations.py).
+
+the result is cached per database and reused until the tables change.
+changes are detected with a counter in disney_data_version that
+triggers on characters and character_media bump on every insert,
+update and delete (renames and rewritten media lists included), so
+checking it is one single-row read.
+"""
+
+import sqlite3
+import threading
+
+import database
+import profiling
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+VERSIONED_TABLES = ["characters", "character_media"]
+
+def create_version_tracking(cur):
+    """
+    the disney_data_version counter and the triggers that bump it.
+    called by disney_api.setup_database; safe to run on every setup
+    """
+    cur.execute("""
+        create table if not exists disney_data_version (
+            id integer primary key check (id = 1),
+            version integer not null
+        );
+    """)
+    cur.execute("insert or ignore into disney_data_version (id, version) values (1, 0);")
+    for table in VERSIONED_TABLES:
+        for event in ("insert", "update", "delete"):
+            cur.execute(f"""
+                create trigger if not exists disney_version_{table}_after_{event}
+                after {event} on {table}
+                begin
+                    update disney_data_version set version = version + 1 where id = 1;
+                end;
+            """)
+
+def get_watermark(cur):
+    """
+    changes whenever characters or character_media change. None if the
+    database has no version counter yet (not set up by disney_api), in
+    which case nothing is cached
+    """
+    try:
+        cur.execute("select version from disney_data_version where id = 1;")
+    except sqlite3.OperationalError:
+        return None
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+# reads character_media once, in (character_id, type_id) index order
+CHARACTER_STATS_SQL = """
+    select c.id,
+           c.name,
+           coalesce(m.total, 0) as total,
+           coalesce(m.spread, 0) as spread
+    from characters c
+    left join (
+        select character_id,
+               count(*) as total,
+               count(distinct type_id) as spread
+        from character_media
+        group by character_id
+    ) m on m.character_id = c.id;
+"""
+
+@profiling.timed("disney.compute_character_stats")
+def compute_character_stats(cur):
+    """
+    single pass: per-character total appearances (character_media rows)
+    and media spread (distinct media types, 0-5), plus global averages.
+    character_media is grouped first (in index order), then joined to
+    characters so characters without media still count with 0.
+    """
+    cur.execute(CHARACTER_STATS_SQL)
+    rows = cur.fetchall()
+
+    total_characters = len(rows)
+    total_appearances = sum(r[2] for r in rows)
+    total_spread = sum(r[3] for r in rows)
+
+    return {
+        # (character_id, name, total, spread), most appearances first
+        "characters": sorted(rows, key=lambda r: (-r[2], r[0])),
+        "total_characters": total_characters,
+        "total_appearances": total_appearances,
+        "avg_appearances": total_appearances / total_characters if total_characters else 0,
+        "avg_spread": total_spread / total_characters if total_characters else 0,
+    }
+
+def get_character_stats(db_path=None):
+    """cached compute_character_stats for db_path (default: the shared database)"""
+    path = db_path or database.get_db_path()
+    conn = database.get_connection(path)
+    try:
+        cur = conn.cursor()
+        watermark = get_watermark(cur)
+        with _cache_lock:
+            cached = _cache.get(path)
+        if watermark is not None and cached is not None and cached[0] == watermark:
+            profiling.count("disney.stats_cache_hits")
+            return cached[1]
+
+        stats = compute_character_stats(cur)
+    finally:
+        database.release_connection(conn)
+
+    with _cache_lock:
+        _cache[path] = (watermark, stats)
+    return stats
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def top_by_appearances(n, db_path=None):
+    """[(name, total)] for the n characters with the most appearances"""
+    rows = get_character_stats(db_path)["characters"][:n]
+    return [(name, total) for _, name, total, _ in rows]
+
+def top_by_spread(n, db_path=None):
+    """[(name, spread)] for the n characters with the widest media spread"""
+    rows = get_character_stats(db_path)["characters"]
+    ranked = sorted(rows, key=lambda r: (-r[3], r[0]))[:n]
+    return [(name, spread) for _, name, _, spread in ranked]
+
+def top_spread_and_total(n, db_path=None):
+    """[(name, spread, total)] for the n characters with the most appearances"""
+    rows = get_character_stats(db_path)["characters"][:n]
+    return [(name, spread, total) for _, name, total, spread in rows]
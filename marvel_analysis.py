@@ -1,17 +1,172 @@
-import sqlite3
+import argparse
+import heapq
 
-DB_NAME = "final_project.db"
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import database
+import profiling
+from create_marvel_db import STAT_NAMES, get_data_version, rebuild_power_index_tables
 
 
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    return database.get_connection()
+
+
+# SQL expressions over marvel_powerstats (alias p): number of non-null
+# stats, and the sum of the non-null stats.
+STAT_COUNT_SQL = " + ".join(f"(p.{s} IS NOT NULL)" for s in STAT_NAMES)
+STAT_SUM_SQL = " + ".join(f"COALESCE(p.{s}, 0)" for s in STAT_NAMES)
 
+# Materialized power index, best first (walks idx_marvel_power_index_rank).
+POWER_INDEX_SQL = """
+    SELECT pi.hero_id,
+           n.name,
+           pi.power_index
+    FROM marvel_power_index AS pi
+    JOIN marvel_heroes AS h
+        ON h.id = pi.hero_id
+    JOIN marvel_hero_names AS n
+        ON h.name_id = n.id
+    ORDER BY pi.power_index DESC, pi.hero_id
+"""
 
-def calculate_power_index():
+
+@profiling.timed("marvel.calculate_power_index")
+def calculate_power_index(top_n=None):
     """
     For each hero, compute a power index as the average of
     the six powerstats: intelligence, strength, speed,
-    durability, power, combat.
+    durability, power, combat. Missing (NULL) stats are left out
+    of the average; heroes with no stats at all are skipped.
+
+    Values come from the materialized marvel_power_index table, which
+    is maintained on ingest. Its (power_index DESC, hero_id) index means
+    a top_n query only reads top_n rows.
+
+    Uses:
+      - marvel_power_index
+      - marvel_heroes
+      - marvel_hero_names
+
+    Returns:
+      list of (hero_id, name, power_index), sorted descending
+      (ties by hero_id). If top_n is given, only the first top_n rows.
+    """
+    if top_n is not None:
+        return top_k_power_index(top_n)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(POWER_INDEX_SQL)
+    results = cur.fetchall()
+    database.release_connection(conn)
+    return results
+
+
+@profiling.timed("marvel.top_k_power_index")
+def top_k_power_index(k):
+    """
+    The k heroes with the highest power index, ties broken by hero id.
+
+    Rows are read one at a time from the cursor under a SQL LIMIT on the
+    (power_index DESC, hero_id) index, so only k rows are ever read or
+    held in memory.
+
+    Returns:
+      list of (hero_id, name, power_index), at most k rows.
+    """
+    if k <= 0:
+        return []
+
+    conn = get_connection()
+    cur = conn.cursor()
+    results = []
+    for row in cur.execute(POWER_INDEX_SQL + " LIMIT ?", (k,)):
+        results.append(row)
+    database.release_connection(conn)
+    return results
+
+
+def top_k_rows(rows, k):
+    """
+    Keep the k best (hero_id, name, power_index) rows from any iterable
+    using a bounded min-heap: O(k) memory and O(n log k) time.
+
+    Ordering matches the SQL queries: power_index descending, then
+    hero_id ascending.
+    """
+    if k <= 0:
+        return []
+
+    heap = []
+    for hero_id, name, power_index in rows:
+        # smallest key = worst row: lowest index, then highest hero id
+        key = (power_index, -hero_id, name)
+        if len(heap) < k:
+            heapq.heappush(heap, key)
+        elif key > heap[0]:
+            heapq.heapreplace(heap, key)
+
+    heap.sort(reverse=True)
+    return [(-neg_id, name, power_index) for power_index, neg_id, name in heap]
+
+
+@profiling.timed("marvel.calculate_alignment_averages")
+def calculate_alignment_averages():
+    """
+    Compute average powerstats for each alignment (good, bad, neutral, etc.).
+
+    Reads the running sums and counts in marvel_alignment_stats (one row
+    per alignment), maintained on ingest.
+
+    Uses:
+      - marvel_alignment_stats
+      - marvel_alignments (alignment names)
+
+    Returns:
+        A list of (alignment, stats_dict), where stats_dict has keys:
+            "intelligence", "strength", "speed",
+            "durability", "power", "combat"
+        and values are the average value for that stat and alignment
+        (None if no hero of that alignment has the stat).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+
+    avg_columns = ",\n               ".join(
+        f"s.{s}_sum * 1.0 / NULLIF(s.{s}_count, 0)" for s in STAT_NAMES
+    )
+    cur.execute(f"""
+        SELECT a.name AS alignment,
+               {avg_columns}
+        FROM marvel_alignment_stats AS s
+        JOIN marvel_alignments AS a
+            ON s.alignment_id = a.id
+        WHERE s.hero_count > 0
+        ORDER BY a.id
+    """)
+
+    rows = cur.fetchall()
+    database.release_connection(conn)
+
+    results = []
+    for row in rows:
+        results.append((row[0], dict(zip(STAT_NAMES, row[1:]))))
+    return results
+
+
+@profiling.timed("marvel.recompute_power_index_sql")
+def recompute_power_index_sql(top_n=None):
+    """
+    Full recomputation of calculate_power_index straight from
+    marvel_powerstats (ignores the materialized marvel_power_index).
+
+    The averaging is done in SQLite. Without top_n SQLite also sorts;
+    with top_n the unsorted rows are streamed from the cursor through
+    top_k_rows, so only top_n rows are kept in memory.
 
     Uses:
       - marvel_heroes
@@ -19,48 +174,41 @@ def calculate_power_index():
       - marvel_powerstats (one row per hero)
 
     Returns:
-      list of (hero_id, name, power_index), sorted descending.
+      list of (hero_id, name, power_index), sorted descending
+      (ties by hero_id). If top_n is given, only the first top_n rows.
     """
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute("""
+    sql = f"""
         SELECT h.id,
                n.name,
-               p.intelligence,
-               p.strength,
-               p.speed,
-               p.durability,
-               p.power,
-               p.combat
+               ({STAT_SUM_SQL}) * 1.0 / ({STAT_COUNT_SQL}) AS power_index
         FROM marvel_heroes AS h
         JOIN marvel_hero_names AS n
             ON h.name_id = n.id
         JOIN marvel_powerstats AS p
             ON h.id = p.hero_id
-    """)
-
-    rows = cur.fetchall()
-    conn.close()
-
-    results = []
-    for row in rows:
-        hero_id = row[0]
-        name = row[1]
-        stats = row[2:]
-        values = [v for v in stats if v is not None]
-        if not values:
-            continue
-        avg_power = sum(values) / float(len(values))
-        results.append((hero_id, name, avg_power))
+        WHERE ({STAT_COUNT_SQL}) > 0
+    """
 
-    results.sort(key=lambda x: x[2], reverse=True)
+    if top_n is not None:
+        results = top_k_rows(cur.execute(sql), top_n)
+    else:
+        cur.execute(sql + " ORDER BY power_index DESC, h.id")
+        results = cur.fetchall()
+    database.release_connection(conn)
     return results
 
 
-def calculate_alignment_averages():
+@profiling.timed("marvel.recompute_alignment_averages_sql")
+def recompute_alignment_averages_sql():
     """
-    Compute average powerstats for each alignment (good, bad, neutral, etc.).
+    Full recomputation of calculate_alignment_averages straight from
+    marvel_powerstats (ignores marvel_alignment_stats).
+
+    AVG() in SQLite skips NULLs, so each stat is averaged over the heroes
+    that have a value for it (None if no hero of the alignment has one).
 
     Uses:
       - marvel_heroes (alignment_id)
@@ -76,65 +224,422 @@ def calculate_alignment_averages():
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute("""
+    avg_columns = ",\n               ".join(f"AVG(p.{s})" for s in STAT_NAMES)
+    cur.execute(f"""
         SELECT a.name AS alignment,
-               p.intelligence,
-               p.strength,
-               p.speed,
-               p.durability,
-               p.power,
-               p.combat
+               {avg_columns}
         FROM marvel_heroes AS h
         JOIN marvel_alignments AS a
             ON h.alignment_id = a.id
         JOIN marvel_powerstats AS p
             ON h.id = p.hero_id
+        GROUP BY a.id
+        ORDER BY a.id
     """)
 
     rows = cur.fetchall()
-    conn.close()
+    database.release_connection(conn)
 
-    stat_order = ["intelligence", "strength", "speed", "durability", "power", "combat"]
-
-    # alignment -> {stat_name: [values]}
-    stats_by_align = {}
+    results = []
     for row in rows:
-        alignment = row[0]
-        values = row[1:]
+        results.append((row[0], dict(zip(STAT_NAMES, row[1:]))))
+    return results
+
+
+# ---------- Optional NumPy backend ----------
+# When NumPy is installed, the full recomputations and the distribution
+# statistics below run on a column-oriented copy of marvel_powerstats
+# (one float column per stat, NaN for missing values) instead of row
+# loops. Set USE_NUMPY = False to force the SQL / pure-Python paths.
+
+USE_NUMPY = np is not None
+
+# (watermark, arrays) of the last load_powerstats_array() call
+_powerstats_cache = {}
+
 
-        if alignment not in stats_by_align:
-            stats_by_align[alignment] = {name: [] for name in stat_order}
+def numpy_enabled():
+    return np is not None and USE_NUMPY
 
-        for name, v in zip(stat_order, values):
-            if v is not None:
-                stats_by_align[alignment][name].append(v)
 
-    # alignment -> {stat_name: avg_value}
+def get_powerstats_watermark(cur):
+    """
+    Changes whenever heroes, names, alignments or powerstats are added,
+    updated or removed (the marvel_data_version counter, one row read).
+    None if the database has no counter, in which case nothing is cached.
+    """
+    return get_data_version(cur)
+
+
+@profiling.timed("marvel.load_powerstats_array")
+def load_powerstats_array():
+    """
+    Load marvel_powerstats once into NumPy arrays (cached until the
+    tables change).
+
+    Returns a dict with:
+      "hero_ids":      int64 array, one entry per hero (sorted by id)
+      "names":         list of hero names (None if the hero has no name)
+      "alignment_ids": int64 array (-1 if the hero has no alignment)
+      "alignments":    {alignment_id: alignment name}
+      "values":        float64 array of shape (n, 6), NaN where missing
+      "mask":          bool array of shape (n, 6), True where present
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    watermark = get_powerstats_watermark(cur)
+    cached = _powerstats_cache.get(database.get_db_path())
+    if cached is not None and watermark is not None and cached[0] == watermark:
+        database.release_connection(conn)
+        return cached[1]
+
+    stat_columns = ", ".join(f"p.{s}" for s in STAT_NAMES)
+    cur.execute(f"""
+        SELECT p.hero_id,
+               n.name,
+               COALESCE(h.alignment_id, -1),
+               {stat_columns}
+        FROM marvel_powerstats AS p
+        JOIN marvel_heroes AS h
+            ON h.id = p.hero_id
+        LEFT JOIN marvel_hero_names AS n
+            ON h.name_id = n.id
+        ORDER BY p.hero_id
+    """)
+    rows = cur.fetchall()
+    cur.execute("SELECT id, name FROM marvel_alignments")
+    alignments = dict(cur.fetchall())
+    database.release_connection(conn)
+
+    count = len(rows)
+    hero_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+    alignment_ids = np.fromiter((r[2] for r in rows), dtype=np.int64, count=count)
+    # None becomes NaN in a float array
+    values = np.array([r[3:] for r in rows], dtype=np.float64).reshape(count, len(STAT_NAMES))
+    arrays = {
+        "hero_ids": hero_ids,
+        "names": [r[1] for r in rows],
+        "alignment_ids": alignment_ids,
+        "alignments": alignments,
+        "values": values,
+        "mask": ~np.isnan(values),
+    }
+    _powerstats_cache[database.get_db_path()] = (watermark, arrays)
+    return arrays
+
+
+def clear_powerstats_cache():
+    _powerstats_cache.clear()
+
+
+@profiling.timed("marvel.numpy_power_index")
+def numpy_power_index(top_n=None):
+    """
+    NumPy version of recompute_power_index (same result and ordering).
+    """
+    arrays = load_powerstats_array()
+    mask = arrays["mask"]
+    counts = mask.sum(axis=1)
+    sums = np.where(mask, arrays["values"], 0.0).sum(axis=1)
+
+    has_name = np.fromiter((n is not None for n in arrays["names"]),
+                           dtype=bool, count=len(arrays["names"]))
+    rows = np.nonzero((counts > 0) & has_name)[0]
+    power = sums[rows] / counts[rows]
+    hero_ids = arrays["hero_ids"][rows]
+
+    # descending power index, ties by hero id
+    if top_n is not None and top_n <= 0:
+        return []
+    if top_n is not None and top_n < len(rows):
+        keep = np.argpartition(-power, top_n - 1)[:top_n]
+        cutoff = power[keep].min()
+        keep = np.nonzero(power >= cutoff)[0]
+        order = keep[np.lexsort((hero_ids[keep], -power[keep]))][:top_n]
+    else:
+        order = np.lexsort((hero_ids, -power))
+
+    names = arrays["names"]
+    return [
+        (int(hero_ids[i]), names[rows[i]], float(power[i]))
+        for i in order
+    ]
+
+
+@profiling.timed("marvel.numpy_alignment_averages")
+def numpy_alignment_averages():
+    """
+    NumPy version of recompute_alignment_averages (same result and ordering).
+    """
+    arrays = load_powerstats_array()
+    alignment_ids = arrays["alignment_ids"]
+    known = np.isin(alignment_ids, list(arrays["alignments"]))
+    groups, inverse = np.unique(alignment_ids[known], return_inverse=True)
+    mask = arrays["mask"][known]
+    values = np.where(mask, arrays["values"][known], 0.0)
+
     results = []
-    for alignment, stat_lists in stats_by_align.items():
+    for g, alignment_id in enumerate(groups):
+        in_group = inverse == g
+        counts = mask[in_group].sum(axis=0)
+        sums = values[in_group].sum(axis=0)
         stats_dict = {}
-        for name in stat_order:
-            vals = stat_lists[name]
-            if not vals:
-                stats_dict[name] = None
+        for j, name in enumerate(STAT_NAMES):
+            stats_dict[name] = float(sums[j] / counts[j]) if counts[j] else None
+        results.append((arrays["alignments"][int(alignment_id)], stats_dict))
+    return results
+
+
+def load_stat_columns():
+    """
+    Pure-Python fallback loader: {stat_name: [values]} with None kept,
+    plus the matching list of hero ids.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    stat_columns = ", ".join(STAT_NAMES)
+    cur.execute(f"SELECT hero_id, {stat_columns} FROM marvel_powerstats ORDER BY hero_id")
+    rows = cur.fetchall()
+    database.release_connection(conn)
+
+    hero_ids = [r[0] for r in rows]
+    columns = {name: [r[j + 1] for r in rows] for j, name in enumerate(STAT_NAMES)}
+    return hero_ids, columns
+
+
+def percentile(sorted_values, pct):
+    """
+    Linear-interpolation percentile of an already sorted list
+    (same definition as numpy.percentile's default).
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100.0
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    fraction = position - low
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * fraction
+
+
+@profiling.timed("marvel.calculate_stat_percentiles")
+def calculate_stat_percentiles(percentiles=(25, 50, 75, 90)):
+    """
+    Percentiles of each powerstat over all heroes, ignoring missing values.
+
+    Returns:
+        {stat_name: {pct: value}} (value None if no hero has the stat).
+    """
+    results = {}
+    if numpy_enabled():
+        arrays = load_powerstats_array()
+        for j, name in enumerate(STAT_NAMES):
+            column = arrays["values"][arrays["mask"][:, j], j]
+            if column.size == 0:
+                results[name] = {pct: None for pct in percentiles}
             else:
-                stats_dict[name] = sum(vals) / float(len(vals))
-        results.append((alignment, stats_dict))
+                values = np.percentile(column, percentiles)
+                results[name] = {pct: float(v) for pct, v in zip(percentiles, values)}
+        return results
+
+    _, columns = load_stat_columns()
+    for name in STAT_NAMES:
+        values = sorted(v for v in columns[name] if v is not None)
+        results[name] = {pct: percentile(values, pct) for pct in percentiles}
+    return results
+
+
+@profiling.timed("marvel.calculate_stat_zscores")
+def calculate_stat_zscores():
+    """
+    Standard score of every hero's stats relative to all heroes
+    ((value - mean) / population standard deviation, per stat).
+
+    Returns:
+        list of (hero_id, {stat_name: z}) sorted by hero id; z is None
+        where the stat is missing or has no spread.
+    """
+    if numpy_enabled():
+        arrays = load_powerstats_array()
+        values = arrays["values"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nanmean(values, axis=0) if values.size else np.zeros(len(STAT_NAMES))
+            stds = np.nanstd(values, axis=0) if values.size else np.zeros(len(STAT_NAMES))
+            z = (values - means) / np.where(stds > 0, stds, np.nan)
+        z_rows = np.where(np.isnan(z), None, z).tolist()
+        return [
+            (int(hero_id), dict(zip(STAT_NAMES, row)))
+            for hero_id, row in zip(arrays["hero_ids"], z_rows)
+        ]
+
+    hero_ids, columns = load_stat_columns()
+    scale = {}
+    for name in STAT_NAMES:
+        values = [v for v in columns[name] if v is not None]
+        if not values:
+            scale[name] = (0.0, 0.0)
+            continue
+        mean = sum(values) / float(len(values))
+        variance = sum((v - mean) ** 2 for v in values) / float(len(values))
+        scale[name] = (mean, variance ** 0.5)
 
+    results = []
+    for i, hero_id in enumerate(hero_ids):
+        z = {}
+        for name in STAT_NAMES:
+            v = columns[name][i]
+            mean, std = scale[name]
+            z[name] = (v - mean) / std if v is not None and std > 0 else None
+        results.append((hero_id, z))
     return results
 
 
+@profiling.timed("marvel.calculate_stat_correlations")
+def calculate_stat_correlations():
+    """
+    Pearson correlation between every pair of powerstats, using the
+    heroes that have both stats of a pair.
+
+    Returns:
+        {stat_a: {stat_b: r}} for all six stats (r is None when a pair
+        has fewer than two heroes or no spread).
+    """
+    matrix = {a: {} for a in STAT_NAMES}
+
+    if numpy_enabled():
+        arrays = load_powerstats_array()
+        values, mask = arrays["values"], arrays["mask"]
+        for i, a in enumerate(STAT_NAMES):
+            for j, b in enumerate(STAT_NAMES):
+                if j < i:
+                    matrix[a][b] = matrix[b][a]
+                    continue
+                both = mask[:, i] & mask[:, j]
+                x = values[both, i]
+                y = values[both, j]
+                r = None
+                if x.size >= 2 and x.std() > 0 and y.std() > 0:
+                    r = float(np.corrcoef(x, y)[0, 1])
+                matrix[a][b] = r
+        return matrix
+
+    _, columns = load_stat_columns()
+    for i, a in enumerate(STAT_NAMES):
+        for j, b in enumerate(STAT_NAMES):
+            if j < i:
+                matrix[a][b] = matrix[b][a]
+                continue
+            pairs = [(x, y) for x, y in zip(columns[a], columns[b])
+                     if x is not None and y is not None]
+            matrix[a][b] = pearson(pairs)
+    return matrix
+
+
+def pearson(pairs):
+    """
+    Pearson correlation of a list of (x, y) pairs, or None.
+    """
+    n = len(pairs)
+    if n < 2:
+        return None
+    mean_x = sum(x for x, _ in pairs) / float(n)
+    mean_y = sum(y for _, y in pairs) / float(n)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in pairs)
+    var_x = sum((x - mean_x) ** 2 for x, _ in pairs)
+    var_y = sum((y - mean_y) ** 2 for _, y in pairs)
+    if var_x == 0 or var_y == 0:
+        return None
+    return cov / (var_x ** 0.5 * var_y ** 0.5)
+
+
+def recompute_power_index(top_n=None):
+    """
+    Full recomputation of the power index (ignores marvel_power_index),
+    on the NumPy backend when available, otherwise in SQL.
+    """
+    if numpy_enabled():
+        return numpy_power_index(top_n)
+    return recompute_power_index_sql(top_n)
+
+
+def recompute_alignment_averages():
+    """
+    Full recomputation of the alignment averages (ignores
+    marvel_alignment_stats), on the NumPy backend when available,
+    otherwise in SQL.
+    """
+    if numpy_enabled():
+        return numpy_alignment_averages()
+    return recompute_alignment_averages_sql()
+
+
+def check_materialized(tolerance=1e-9):
+    """
+    Verify the materialized power-index tables against a full
+    recomputation. Prints every mismatch and returns True if all
+    values agree.
+    """
+    ok = True
+
+    stored = {row[0]: row for row in calculate_power_index()}
+    fresh = {row[0]: row for row in recompute_power_index()}
+    for hero_id in sorted(set(stored) | set(fresh)):
+        a = stored.get(hero_id)
+        b = fresh.get(hero_id)
+        if a is None or b is None or abs(a[2] - b[2]) > tolerance:
+            print(f"power index mismatch for hero {hero_id}: stored={a} expected={b}")
+            ok = False
+
+    stored_align = dict(calculate_alignment_averages())
+    fresh_align = dict(recompute_alignment_averages())
+    for alignment in sorted(set(stored_align) | set(fresh_align)):
+        a = stored_align.get(alignment)
+        b = fresh_align.get(alignment)
+        for stat_name in STAT_NAMES:
+            x = a.get(stat_name) if a else None
+            y = b.get(stat_name) if b else None
+            if (x is None) != (y is None) or (x is not None and abs(x - y) > tolerance):
+                print(f"alignment mismatch for {alignment}/{stat_name}: stored={x} expected={y}")
+                ok = False
+
+    print("Materialized power index is consistent." if ok
+          else "Materialized power index is OUT OF SYNC (run with --rebuild).")
+    return ok
+
+
+def rebuild_materialized():
+    """
+    Recompute the materialized power-index tables from scratch.
+    """
+    conn = get_connection()
+    rebuild_power_index_tables(conn.cursor())
+    conn.commit()
+    database.release_connection(conn)
+    print("Rebuilt marvel_power_index and marvel_alignment_stats.")
+
+
 if __name__ == "__main__":
-    power_list = calculate_power_index()
+    parser = argparse.ArgumentParser(description="Marvel power index analysis")
+    parser.add_argument("--check", action="store_true",
+                        help="verify the materialized tables against a full recomputation")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute the materialized tables from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_materialized()
+    if args.check:
+        raise SystemExit(0 if check_materialized() else 1)
+
+    power_list = top_k_power_index(10)
     print("Top 10 heroes by power index:")
-    for hero_id, name, pi in power_list[:10]:
+    for hero_id, name, pi in power_list:
         print(hero_id, name, pi)
 
     print("\nAverage powerstats by alignment:")
     alignment_avgs = calculate_alignment_averages()
     for alignment, stats in alignment_avgs:
         print(f"\nAlignment: {alignment}")
-        for stat_name in ["intelligence", "strength", "speed", "durability", "power", "combat"]:
+        for stat_name in STAT_NAMES:
             value = stats[stat_name]
             if value is None:
                 print(f"  {stat_name}: None")
@@ -1,29 +1,375 @@
-import sqlite3
+import argparse
+import codecs
+import json
+import mmap
+import os
+import time
 import requests
 
-DB_NAME = "final_project.db"
+import database
+import marvel_similarity
+import profiling
+import search
+from create_marvel_db import (
+    create_marvel_indexes,
+    create_power_index_tables,
+    drop_marvel_indexes,
+)
+
 ALL_URL = "https://akabab.github.io/superhero-api/api/all.json"
 
+# Responses are cached in a folder next to the database so repeat runs
+# only need a conditional request (or no request at all within the TTL).
+CACHE_DIR_NAME = "api_cache"
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Counters for the current process, printed after each fetch.
+CACHE_STATS = {"hits": 0, "misses": 0, "revalidated": 0}
+
+# Streaming ingest: bytes read per step, and heroes written per batch.
+STREAM_CHUNK_SIZE = 64 * 1024
+STORE_BATCH_SIZE = 500
+
+# iter_json_array: characters that can extend a number the decoder has
+# already stopped at
+NUMBER_CONTINUATIONS = ".eE+-"
+# iter_json_array: longest single element (in characters) it will buffer
+MAX_ELEMENT_CHARS = 64 * 1024 * 1024
+
 
 def get_connection():
     """
-    Return a connection to the SQLite database.
+    Return a pooled connection to the SQLite database
+    (give it back with database.release_connection).
     """
-    return sqlite3.connect(DB_NAME)
+    return database.get_connection()
 
 
-def fetch_all_heroes():
+def get_cache_paths(url):
     """
-    Call the Akabab Superhero API /all.json endpoint and return the list of heroes.
+    Return (body_path, meta_path) for the cached copy of url.
+    The cache folder lives next to the database file.
+    """
+    db_dir = os.path.dirname(os.path.abspath(database.get_db_path()))
+    cache_dir = os.path.join(db_dir, CACHE_DIR_NAME)
+    filename = os.path.basename(url.rstrip("/")) or "index"
+    body_path = os.path.join(cache_dir, filename)
+    meta_path = body_path + ".meta.json"
+    return body_path, meta_path
+
+
+def load_cache_meta(meta_path):
+    """
+    Read the cache metadata (ETag, Last-Modified, fetched_at).
+    Returns an empty dict if there is no usable metadata.
+    """
+    if not os.path.exists(meta_path):
+        return {}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache_meta(meta_path, meta):
+    """
+    Write the cache metadata next to the cached body.
+    """
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def fetch_cached(url, ttl=CACHE_TTL_SECONDS):
     """
-    print(f"Requesting all heroes from {ALL_URL} ...")
-    resp = requests.get(ALL_URL)
+    Return the path of an up-to-date cached copy of url.
+
+    - Within the TTL the disk copy is used without any request (hit).
+    - After the TTL we send If-None-Match / If-Modified-Since; a 304
+      answer keeps the disk copy (hit, revalidated).
+    - Otherwise the new body is downloaded and stored (miss), also if
+      the server answers 304 while nothing is cached.
+    """
+    body_path, meta_path = get_cache_paths(url)
+    meta = load_cache_meta(meta_path)
+    have_body = os.path.exists(body_path)
+
+    if cache_is_fresh(meta, have_body, ttl):
+        CACHE_STATS["hits"] += 1
+        return body_path
+
+    headers = get_revalidation_headers(meta, have_body)
+
+    try:
+        with profiling.timer("marvel.http_wait"):
+            resp = requests.get(url, headers=headers, stream=True)
+    except requests.RequestException as e:
+        if have_body:
+            print(f"Request failed ({e}); using stale cached copy.")
+            CACHE_STATS["hits"] += 1
+            return body_path
+        raise
+
+    action = classify_response(resp.status_code, have_body)
+    if action == "revalidated":
+        resp.close()
+        mark_revalidated(meta_path, meta)
+        return body_path
+
+    if action == "refetch":
+        resp.close()
+        with profiling.timer("marvel.http_wait"):
+            resp = requests.get(url, stream=True)
+        if resp.status_code == 304:
+            raise requests.HTTPError(f"GET {url} returned 304 with nothing cached", response=resp)
+
     resp.raise_for_status()
-    data = resp.json()
+
+    with profiling.timer("marvel.http_download"):
+        # written in chunks so the payload is never held in memory whole
+        save_cached_response(url, resp.iter_content(STREAM_CHUNK_SIZE), resp.headers)
+    return body_path
+
+
+def cache_is_fresh(meta, have_body, ttl):
+    """
+    True if the cached copy is recent enough to use without a request.
+    """
+    return bool(have_body and meta and time.time() - meta.get("fetched_at", 0) < ttl)
+
+
+def classify_response(status, have_body):
+    """
+    What to do with the answer to a (possibly conditional) request:
+
+    - "revalidated": 304 and a cached copy exists; keep the disk copy.
+    - "refetch": 304 with nothing cached (a 304 to an unconditional
+      request); ask again for the full body.
+    - "download": anything else; store the body (if the status is OK).
+    """
+    if status == 304:
+        return "revalidated" if have_body else "refetch"
+    return "download"
+
+
+def mark_revalidated(meta_path, meta):
+    """
+    Record that the server confirmed the cached copy is still current.
+    """
+    meta["fetched_at"] = time.time()
+    save_cache_meta(meta_path, meta)
+    CACHE_STATS["hits"] += 1
+    CACHE_STATS["revalidated"] += 1
+
+
+def get_revalidation_headers(meta, have_body):
+    """
+    Conditional request headers for a cached copy (empty if there is none).
+    """
+    headers = {}
+    if have_body:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def save_cached_response(url, chunks, headers):
+    """
+    Write a downloaded body (an iterable of byte chunks) and its
+    validators to the cache, and count it as a miss.
+    """
+    body_path, meta_path = get_cache_paths(url)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    tmp_path = body_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, body_path)
+
+    save_cache_meta(meta_path, {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+    })
+    CACHE_STATS["misses"] += 1
+
+
+def print_cache_stats():
+    """
+    Print the cache hit/miss counters for this run.
+    """
+    print(
+        f"Cache: {CACHE_STATS['hits']} hit(s) "
+        f"({CACHE_STATS['revalidated']} revalidated), "
+        f"{CACHE_STATS['misses']} miss(es)."
+    )
+
+
+def fetch_all_heroes(url=ALL_URL, use_cache=True, ttl=CACHE_TTL_SECONDS):
+    """
+    Call the Akabab Superhero API /all.json endpoint and return the list of heroes.
+
+    By default the response is cached on disk (see fetch_cached), so
+    repeat runs read the local copy instead of downloading it again.
+    """
+    print(f"Requesting all heroes from {url} ...")
+    if use_cache:
+        body_path = fetch_cached(url, ttl=ttl)
+        with open(body_path, "r", encoding="utf-8") as f, profiling.timer("marvel.json_decode"):
+            data = json.load(f)
+        print_cache_stats()
+    else:
+        with profiling.timer("marvel.http_wait"):
+            resp = requests.get(url)
+        resp.raise_for_status()
+        with profiling.timer("marvel.json_decode"):
+            data = resp.json()
     print(f"Got {len(data)} heroes from API.")
     return data
 
 
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array, given its text as an
+    iterable of string chunks.
+
+    Only the element being decoded (plus one chunk) is held in memory,
+    so a large all.json can be processed hero by hero.
+
+    Elements can be any JSON value and chunks can split them anywhere;
+    the result is the same as json.loads on the whole text. Raises
+    ValueError on malformed input, including a trailing comma, and on
+    an element longer than MAX_ELEMENT_CHARS.
+
+    An incomplete element is only decoded again once its buffered text
+    has at least doubled, so an element split over many chunks (or a
+    truncated one) costs linear, not quadratic, time.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+    # "start": before "[", "value": an element (or "]") comes next,
+    # "element": an element comes next (after a ","),
+    # "separator": "," or "]" comes next
+    state = "start"
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+
+        if pos < len(buf):
+            char = buf[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("Expected '[' at start of JSON array")
+                state = "value"
+                pos += 1
+                continue
+            if char == "]":
+                if state == "element":
+                    raise ValueError(f"Trailing ',' before ']' at offset {pos}")
+                return
+            if state == "separator":
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' at offset {pos}")
+                state = "element"
+                pos += 1
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                end = None
+            # a number that runs to the end of the buffer, or stops at a
+            # character that could continue it ("1" + ".5", "2" + "e3"),
+            # may be cut short: wait for more text unless the input ended
+            cut_short = end is not None and (end == len(buf) or buf[end] in NUMBER_CONTINUATIONS)
+            if end is not None and (exhausted or not cut_short):
+                yield value
+                pos = end
+                state = "separator"
+                continue
+
+        if exhausted:
+            raise ValueError("Unexpected end of JSON array")
+
+        pending = len(buf) - pos
+        if pending > MAX_ELEMENT_CHARS:
+            raise ValueError(f"JSON element longer than {MAX_ELEMENT_CHARS} characters")
+        # read at least as much again as is pending before the next try
+        parts = [buf[pos:]]
+        added = 0
+        while added < max(pending, 1):
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                exhausted = True
+                break
+            parts.append(chunk)
+            added += len(chunk)
+        buf = "".join(parts)
+        pos = 0
+
+
+def iter_text_chunks(byte_chunks):
+    """
+    Decode an iterable of UTF-8 byte chunks into text chunks (multi-byte
+    characters split across chunks are handled).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_heroes_from_file(path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield heroes one at a time from a cached all.json, reading the file
+    through a memory map.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            byte_chunks = (mm[i:i + chunk_size] for i in range(0, len(mm), chunk_size))
+            yield from iter_json_array(iter_text_chunks(byte_chunks))
+
+
+def iter_heroes_from_response(resp, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield heroes one at a time straight from a streamed HTTP response
+    (requests.get(..., stream=True)).
+    """
+    yield from iter_json_array(iter_text_chunks(resp.iter_content(chunk_size)))
+
+
+def stream_all_heroes(url=ALL_URL, use_cache=True, ttl=CACHE_TTL_SECONDS):
+    """
+    Like fetch_all_heroes, but returns an iterator over the heroes
+    instead of a list, so the payload is never decoded all at once.
+    """
+    print(f"Streaming heroes from {url} ...")
+    if use_cache:
+        body_path = fetch_cached(url, ttl=ttl)
+        print_cache_stats()
+        return iter_heroes_from_file(body_path)
+
+    resp = requests.get(url, stream=True)
+    resp.raise_for_status()
+    return iter_heroes_from_response(resp)
+
+
 def get_existing_hero_ids(conn):
     """
     Return a set of hero IDs already stored in marvel_heroes.
@@ -33,12 +379,14 @@ def get_existing_hero_ids(conn):
     return {row[0] for row in cur.fetchall()}
 
 
-def choose_new_heroes(all_heroes, existing_ids, max_new=25):
+def iter_new_heroes(all_heroes, existing_ids, max_new=None):
     """
-    From all_heroes, select heroes that are NOT yet in the database,
-    up to max_new heroes.
+    Yield heroes from all_heroes (any iterable) that are NOT yet in the
+    database, stopping after max_new of them (None means no limit).
     """
-    new_heroes = []
+    count = 0
+    if max_new is not None and max_new <= 0:
+        return
 
     for hero in all_heroes:
         hero_id = hero.get("id")
@@ -48,11 +396,20 @@ def choose_new_heroes(all_heroes, existing_ids, max_new=25):
         if hero_id in existing_ids:
             continue
 
-        new_heroes.append(hero)
+        yield hero
+        count += 1
 
-        if len(new_heroes) >= max_new:
+        if max_new is not None and count >= max_new:
             break
 
+
+def choose_new_heroes(all_heroes, existing_ids, max_new=25):
+    """
+    From all_heroes, select heroes that are NOT yet in the database,
+    up to max_new heroes (max_new=None selects all of them).
+    """
+    new_heroes = list(iter_new_heroes(all_heroes, existing_ids, max_new))
+
     print(f"Selected {len(new_heroes)} new heroes to insert.")
     return new_heroes
 
@@ -118,10 +475,19 @@ def parse_float_from_kg_list(weight_list):
     return None
 
 
-def get_or_create_lookup_id(cur, table_name, name):
+# Lookup tables filled from each hero's JSON (see get_hero_lookup_values).
+LOOKUP_TABLES = [
+    "marvel_hero_names",
+    "marvel_publishers",
+    "marvel_alignments",
+    "marvel_genders",
+    "marvel_races",
+]
+
+
+def clean_lookup_name(name):
     """
-    Put a string into a lookup table and return its integer ID.
-    If name is empty or "-", returns None and does not create a row.
+    Normalize a lookup string. Returns None for missing, empty or "-".
     """
     if name is None:
         return None
@@ -129,17 +495,117 @@ def get_or_create_lookup_id(cur, table_name, name):
     text = str(name).strip()
     if text == "" or text == "-":
         return None
+    return text
 
+
+def get_or_create_lookup_id(cur, table_name, name, cache=None):
+    """
+    Put a string into a lookup table and return its integer ID.
+    If name is empty or "-", returns None and does not create a row.
+
+    If cache (a {name: id} dict for this table) is given, it is checked
+    first and updated with any row this call has to look up or create.
+    """
+    text = clean_lookup_name(name)
+    if text is None:
+        return None
+
+    if cache is not None and text in cache:
+        profiling.count("marvel.lookup_cache_hits")
+        return cache[text]
+
+    profiling.count("marvel.lookup_round_trips")
     cur.execute(f"SELECT id FROM {table_name} WHERE name = ?", (text,))
     row = cur.fetchone()
     if row is not None:
-        return row[0]
+        lookup_id = row[0]
+    else:
+        cur.execute(f"INSERT INTO {table_name} (name) VALUES (?)", (text,))
+        lookup_id = cur.lastrowid
+
+    if cache is not None:
+        cache[text] = lookup_id
+    return lookup_id
+
+
+def get_hero_lookup_values(hero):
+    """
+    Return {lookup_table: raw value} for one hero JSON object.
 
-    cur.execute(f"INSERT INTO {table_name} (name) VALUES (?)", (text,))
-    return cur.lastrowid
+    For alignment, if missing we treat it as "unknown" so we still
+    have a category.
+    """
+    biography = hero.get("biography", {})
+    appearance = hero.get("appearance", {})
+
+    alignment = biography.get("alignment")
+    if alignment is None or str(alignment).strip() == "":
+        alignment = "unknown"
 
+    return {
+        "marvel_hero_names": hero.get("name"),
+        "marvel_publishers": biography.get("publisher"),
+        "marvel_alignments": alignment,
+        "marvel_genders": appearance.get("gender"),
+        "marvel_races": appearance.get("race"),
+    }
 
-def split_hero_data(cur, hero):
+
+def load_lookup_table(cur, table_name):
+    """
+    Return a {name: id} dict with every row of a lookup table.
+    """
+    cur.execute(f"SELECT id, name FROM {table_name}")
+    return {name: lookup_id for lookup_id, name in cur.fetchall()}
+
+
+@profiling.timed("marvel.build_lookup_cache")
+def build_lookup_cache(cur, heroes, cache=None):
+    """
+    Preload every lookup table into memory and intern the names used by
+    heroes, so split_hero_data can resolve IDs without any queries.
+
+    Each table is read once, the genuinely new names are inserted with a
+    single executemany (in first-seen order), and their new IDs are read
+    back with one more query.
+
+    Pass the cache from a previous call (same connection) to skip the
+    preload and only intern the names that are new for this batch.
+
+    Returns {table_name: {name: id}}.
+    """
+    if cache is None:
+        cache = {}
+        for table_name in LOOKUP_TABLES:
+            cache[table_name] = load_lookup_table(cur, table_name)
+
+    # dicts keep insertion order, so IDs are assigned in first-seen order
+    new_names = {table_name: {} for table_name in LOOKUP_TABLES}
+    for hero in heroes:
+        if hero.get("id") is None:
+            continue
+        for table_name, value in get_hero_lookup_values(hero).items():
+            text = clean_lookup_name(value)
+            if text is not None and text not in cache[table_name]:
+                new_names[table_name][text] = None
+
+    for table_name, names in new_names.items():
+        if not names:
+            continue
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}")
+        max_id = cur.fetchone()[0]
+        cur.executemany(
+            f"INSERT OR IGNORE INTO {table_name} (name) VALUES (?)",
+            [(name,) for name in names],
+        )
+        cur.execute(f"SELECT id, name FROM {table_name} WHERE id > ?", (max_id,))
+        for lookup_id, name in cur.fetchall():
+            cache[table_name][name] = lookup_id
+
+    return cache
+
+
+def split_hero_data(cur, hero, lookup_cache=None):
     """
     Given one hero JSON object, build:
 
@@ -147,22 +613,16 @@ def split_hero_data(cur, hero):
         powerstats_row: for marvel_powerstats (one row per hero)
 
     This function also fills the lookup tables for names, publishers,
-    alignments, genders, and races.
+    alignments, genders, and races. If lookup_cache (from
+    build_lookup_cache) is given, IDs are resolved from memory.
     """
     hero_id = hero.get("id")
     if hero_id is None:
         return None, None
 
-    name = hero.get("name")
-    biography = hero.get("biography", {})
     appearance = hero.get("appearance", {})
     powerstats = hero.get("powerstats", {})
 
-    publisher = biography.get("publisher")
-    alignment = biography.get("alignment")
-    gender = appearance.get("gender")
-    race = appearance.get("race")
-
     height_list = appearance.get("height")
     weight_list = appearance.get("weight")
 
@@ -170,18 +630,20 @@ def split_hero_data(cur, hero):
     weight_kg = parse_float_from_kg_list(weight_list)
 
     # Map repeated strings into lookup tables
-    name_id = get_or_create_lookup_id(cur, "marvel_hero_names", name)
-    publisher_id = get_or_create_lookup_id(cur, "marvel_publishers", publisher)
-
-    # For alignment, if missing we treat as "unknown" so we still have a category
-    if alignment is None or str(alignment).strip() == "":
-        alignment_value = "unknown"
-    else:
-        alignment_value = alignment
-    alignment_id = get_or_create_lookup_id(cur, "marvel_alignments", alignment_value)
-
-    gender_id = get_or_create_lookup_id(cur, "marvel_genders", gender)
-    race_id = get_or_create_lookup_id(cur, "marvel_races", race)
+    lookup_ids = {}
+    for table_name, value in get_hero_lookup_values(hero).items():
+        table_cache = None
+        if lookup_cache is not None:
+            table_cache = lookup_cache.setdefault(table_name, {})
+        lookup_ids[table_name] = get_or_create_lookup_id(
+            cur, table_name, value, cache=table_cache
+        )
+
+    name_id = lookup_ids["marvel_hero_names"]
+    publisher_id = lookup_ids["marvel_publishers"]
+    alignment_id = lookup_ids["marvel_alignments"]
+    gender_id = lookup_ids["marvel_genders"]
+    race_id = lookup_ids["marvel_races"]
 
     hero_row = (
         hero_id,
@@ -215,72 +677,219 @@ def split_hero_data(cur, hero):
     return hero_row, powerstats_row
 
 
-def store_marvel_data(heroes):
+def insert_hero_batch(cur, heroes, lookup_cache=None):
+    """
+    Insert one batch of heroes and their powerstats using cur.
+
+    Returns (inserted, processed, lookup_cache): heroes actually
+    inserted, heroes with an id that were processed, and the lookup
+    cache so the next batch can reuse it.
+    """
+    lookup_cache = build_lookup_cache(cur, heroes, lookup_cache)
+
+    hero_rows = []
+    powerstats_rows = []
+
+    for hero in heroes:
+        hero_row, ps_row = split_hero_data(cur, hero, lookup_cache)
+        if hero_row is None:
+            continue
+        hero_rows.append(hero_row)
+        powerstats_rows.append(ps_row)
+
+    profiling.count("marvel.heroes_split", len(hero_rows))
+
+    with profiling.timer("marvel.executemany"):
+        # Insert heroes
+        cur.executemany(
+            """
+            INSERT OR IGNORE INTO marvel_heroes
+            (id, name_id, publisher_id, alignment_id, gender_id, race_id, height_cm, weight_kg)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            hero_rows,
+        )
+        inserted = max(cur.rowcount, 0)
+
+        # Insert one-row-per-hero powerstats
+        cur.executemany(
+            """
+            INSERT OR IGNORE INTO marvel_powerstats
+            (hero_id, intelligence, strength, speed, durability, power, combat)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            powerstats_rows,
+        )
+
+    return inserted, len(hero_rows), lookup_cache
+
+
+@profiling.timed("marvel.store_marvel_data")
+def store_marvel_data(heroes, bulk=False):
     """
     Insert heroes and their powerstats into the database.
 
     - marvel_heroes: one row per hero
     - marvel_powerstats: one row per hero (hero_id is PRIMARY KEY)
 
-    Per run, we insert at most 25 hero rows and 25 powerstats rows.
+    In the default mode main() passes at most 25 heroes per run.
+
+    With bulk=True the whole list is loaded in a single explicit
+    transaction (connections use WAL journaling, see database.py),
+    and the secondary indexes are dropped first and rebuilt once at
+    the end.
+
+    The power-index summary tables are kept in sync by triggers on
+    marvel_powerstats, inside the same transaction, and the new names
+    are added to the search index before the commit.
+
+    If a similar-heroes index has been built (marvel_similarity.py),
+    the new heroes are added to it after the commit.
+
+    Returns the number of hero rows inserted.
     """
     if not heroes:
         print("No new heroes to store.")
-        return
+        return 0
+
+    start = time.perf_counter()
 
     conn = get_connection()
+    if bulk:
+        conn.execute("BEGIN")
     cur = conn.cursor()
 
-    hero_rows = []
-    powerstats_rows = []
+    create_power_index_tables(cur)
+    if bulk:
+        drop_marvel_indexes(cur)
+
+    inserted, processed, _ = insert_hero_batch(cur, heroes)
+
+    if bulk:
+        create_marvel_indexes(cur)
+    search.apply_search_queue(cur)
+
+    conn.commit()
+    database.release_connection(conn)
+    if inserted:
+        marvel_similarity.refresh_index()
+
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {inserted} heroes and up to {processed} powerstat rows.")
+    print_timing_report("bulk" if bulk else "incremental", processed, elapsed)
+    return inserted
+
+
+@profiling.timed("marvel.store_marvel_stream")
+def store_marvel_stream(heroes, batch_size=STORE_BATCH_SIZE, bulk=False):
+    """
+    Insert heroes from any iterable in fixed-size batches, so only one
+    batch is in memory at a time.
+
+    With bulk=True everything is one transaction (as in
+    store_marvel_data); otherwise each batch is committed on its own.
+
+    Returns the number of hero rows inserted.
+    """
+    start = time.perf_counter()
+
+    conn = get_connection()
+    if bulk:
+        conn.execute("BEGIN")
+    cur = conn.cursor()
+
+    create_power_index_tables(cur)
+    if bulk:
+        drop_marvel_indexes(cur)
+
+    inserted = 0
+    processed = 0
+    lookup_cache = None
+    batch = []
 
     for hero in heroes:
-        hero_row, ps_row = split_hero_data(cur, hero)
-        if hero_row is None:
+        batch.append(hero)
+        if len(batch) < batch_size:
             continue
-        hero_rows.append(hero_row)
-        powerstats_rows.append(ps_row)
+        batch_inserted, batch_processed, lookup_cache = insert_hero_batch(
+            cur, batch, lookup_cache
+        )
+        inserted += batch_inserted
+        processed += batch_processed
+        batch = []
+        if not bulk:
+            conn.commit()
+
+    if batch:
+        batch_inserted, batch_processed, lookup_cache = insert_hero_batch(
+            cur, batch, lookup_cache
+        )
+        inserted += batch_inserted
+        processed += batch_processed
+
+    if bulk:
+        create_marvel_indexes(cur)
+    search.apply_search_queue(cur)
 
-    # Insert heroes
-    cur.executemany(
-        """
-        INSERT OR IGNORE INTO marvel_heroes
-        (id, name_id, publisher_id, alignment_id, gender_id, race_id, height_cm, weight_kg)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        hero_rows,
-    )
+    conn.commit()
+    database.release_connection(conn)
+    if inserted:
+        marvel_similarity.refresh_index()
 
-    # Insert one-row-per-hero powerstats
-    cur.executemany(
-        """
-        INSERT OR IGNORE INTO marvel_powerstats
-        (hero_id, intelligence, strength, speed, durability, power, combat)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        powerstats_rows,
-    )
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {inserted} heroes in batches of {batch_size}.")
+    print_timing_report("stream-bulk" if bulk else "stream", processed, elapsed)
+    return inserted
 
-    conn.commit()
-    conn.close()
 
-    print(f"Inserted up to {len(hero_rows)} heroes and {len(powerstats_rows)} powerstat rows.")
+def print_timing_report(mode, row_count, elapsed):
+    """
+    Print how long an ingest took and its throughput in rows/sec.
+    """
+    rate = row_count / elapsed if elapsed > 0 else 0.0
+    print(f"[{mode}] stored {row_count} heroes in {elapsed:.3f}s ({rate:,.0f} rows/sec)")
 
 
-def main(max_new=25):
+def main(max_new=25, bulk=False, stream=False, url=ALL_URL):
     """
     Main entry point: select up to max_new new heroes from the API
     and store them in the database.
+
+    With bulk=True every hero that is not stored yet is loaded in one
+    transaction (max_new is ignored).
+
+    With stream=True the payload is parsed hero by hero from the cached
+    file, already-stored heroes are filtered on the fly and the rest is
+    written in batches of STORE_BATCH_SIZE, so memory use does not grow
+    with the catalogue.
     """
     conn = get_connection()
     existing_ids = get_existing_hero_ids(conn)
-    conn.close()
+    database.release_connection(conn)
+
+    if bulk:
+        max_new = None
 
-    all_heroes = fetch_all_heroes()
+    if stream:
+        heroes = stream_all_heroes(url)
+        new_heroes = iter_new_heroes(heroes, existing_ids, max_new=max_new)
+        return store_marvel_stream(new_heroes, bulk=bulk)
+
+    all_heroes = fetch_all_heroes(url)
     new_heroes = choose_new_heroes(all_heroes, existing_ids, max_new=max_new)
-    store_marvel_data(new_heroes)
+    return store_marvel_data(new_heroes, bulk=bulk)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load Marvel heroes into final_project.db")
+    parser.add_argument("--bulk", action="store_true",
+                        help="load the whole catalogue in one transaction")
+    parser.add_argument("--max-new", type=int, default=25,
+                        help="heroes to add per incremental run (default 25)")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse all.json incrementally and store in batches")
+    args = parser.parse_args()
+
     # Per assignment requirement: at most 25 items per run (25 heroes -> 25 rows per table)
-    main(max_new=25)
+    # unless --bulk is given for a full production load.
+    main(max_new=args.max_new, bulk=args.bulk, stream=args.stream)
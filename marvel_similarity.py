@@ -0,0 +1,521 @@
+"""
+marvel_similarity.py
+"Similar heroes": nearest neighbours over the six powerstats.
+
+Each hero with at least one stat becomes a point in six dimensions.
+Stats are z-score normalised (mean and standard deviation per stat,
+computed when the index is built), so a stat with a wide spread does
+not dominate the distance. A missing stat is filled with that stat's
+mean, i.e. 0 after normalising, so it neither pulls a hero towards
+high nor low values. Heroes with no stats at all are not indexed.
+
+The points are stored in a KD-tree kept in flat lists (split axis and
+value, children, and a bucket of up to LEAF_SIZE points per leaf),
+which makes it cheap to save as JSON and to extend: a new hero is
+added to the bucket of the leaf it falls into. The index is written
+next to the database (final_project_similarity.json for
+final_project.db) and loaded once per process. Each lookup checks the marvel_data_version counter (one
+row read); when it has moved, marvel_powerstats is compared with the
+tree once and the tree is brought up to date:
+
+  - heroes were only added: they are inserted into the existing tree
+    (store_marvel_data, store_marvel_stream and store_marvel_json do
+    this right after an ingest, if an index has been built before)
+  - heroes were removed or their stats changed, or the tree has grown
+    by more than REBUILD_GROWTH since its last full build: the tree is
+    rebuilt, which also rebalances it and refreshes the normalisation
+
+    python marvel_similarity.py HERO_ID [--k 5] [--radius 0.5] [--rebuild]
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import threading
+
+import database
+import profiling
+from create_marvel_db import STAT_NAMES
+from marvel_analysis import get_powerstats_watermark
+
+INDEX_VERSION = 1
+DIMENSIONS = len(STAT_NAMES)
+
+# rebuild (and rebalance) once incremental inserts have added this
+# fraction of the heroes present at the last full build
+REBUILD_GROWTH = 0.5
+
+DEFAULT_K = 5
+
+# points per leaf; a leaf's points are compared with one tight loop
+LEAF_SIZE = 8
+
+# db path -> loaded index
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def get_index_path(db_path=None):
+    """
+    Where the index for db_path is saved: next to the database file.
+    """
+    base, _ = os.path.splitext(db_path or database.get_db_path())
+    return base + "_similarity.json"
+
+
+def load_stat_rows(cur, hero_ids=None):
+    """
+    (hero_id, stat, ...) rows of the heroes that have at least one stat,
+    all of them or only those in hero_ids.
+    """
+    stat_columns = ", ".join(STAT_NAMES)
+    any_stat = " OR ".join(f"{s} IS NOT NULL" for s in STAT_NAMES)
+    sql = f"SELECT hero_id, {stat_columns} FROM marvel_powerstats WHERE ({any_stat})"
+    if hero_ids is None:
+        cur.execute(sql + " ORDER BY hero_id")
+        return cur.fetchall()
+
+    hero_ids = sorted(hero_ids)
+    rows = []
+    for i in range(0, len(hero_ids), 500):
+        chunk = hero_ids[i:i + 500]
+        cur.execute(sql + f" AND hero_id IN ({', '.join('?' for _ in chunk)}) ORDER BY hero_id", chunk)
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def compute_scaling(rows):
+    """
+    Per-stat (mean, standard deviation) over the non-null values.
+    A stat with no spread gets a standard deviation of 1.
+    """
+    scaling = []
+    for d in range(DIMENSIONS):
+        values = [r[d + 1] for r in rows if r[d + 1] is not None]
+        mean = sum(values) / len(values) if values else 0.0
+        variance = sum((v - mean) ** 2 for v in values) / len(values) if values else 0.0
+        scaling.append((mean, math.sqrt(variance) or 1.0))
+    return scaling
+
+
+def normalise(stats, scaling):
+    """
+    The point for one hero's six stats; None (missing) becomes 0.0,
+    the normalised mean.
+    """
+    return [
+        0.0 if value is None else (value - mean) / std
+        for value, (mean, std) in zip(stats, scaling)
+    ]
+
+
+# ---------- KD-tree ----------
+
+def new_tree(scaling, watermark=None):
+    """
+    An empty index. Points live in ids / points (one entry per hero);
+    nodes in axes / splits / left / right / buckets (one entry per node).
+    A leaf has axis -1 and a bucket: the positions of its points.
+    """
+    return {
+        "version": INDEX_VERSION,
+        "scaling": scaling,
+        "watermark": watermark,
+        "built_size": 0,
+        "root": -1,
+        "ids": [],
+        "points": [],
+        "axes": [],
+        "splits": [],
+        "left": [],
+        "right": [],
+        "buckets": [],
+    }
+
+
+def add_node(tree, axis=-1, split=0.0, bucket=None):
+    tree["axes"].append(axis)
+    tree["splits"].append(split)
+    tree["left"].append(-1)
+    tree["right"].append(-1)
+    tree["buckets"].append(bucket)
+    return len(tree["axes"]) - 1
+
+
+def build_node(tree, positions):
+    """
+    A subtree over the given point positions: split at the median of
+    the axis with the widest spread until at most LEAF_SIZE points are
+    left (or all points are equal). Points left of a split are <= the
+    split value, points right of it >= the split value.
+    """
+    points = tree["points"]
+    if len(positions) > LEAF_SIZE:
+        spreads = [
+            max(points[i][d] for i in positions) - min(points[i][d] for i in positions)
+            for d in range(DIMENSIONS)
+        ]
+        axis = max(range(DIMENSIONS), key=spreads.__getitem__)
+        if spreads[axis] > 0:
+            positions = sorted(positions, key=lambda i: points[i][axis])
+            middle = len(positions) // 2
+            node = add_node(tree, axis, points[positions[middle]][axis])
+            tree["left"][node] = build_node(tree, positions[:middle])
+            tree["right"][node] = build_node(tree, positions[middle:])
+            return node
+    return add_node(tree, bucket=list(positions))
+
+
+def build_tree(rows, watermark=None):
+    """
+    A balanced KD-tree over the given (hero_id, stats...) rows.
+    """
+    scaling = compute_scaling(rows)
+    tree = new_tree(scaling, watermark)
+    for row in rows:
+        tree["ids"].append(row[0])
+        tree["points"].append(normalise(row[1:], scaling))
+    if rows:
+        tree["root"] = build_node(tree, range(len(rows)))
+    tree["built_size"] = len(rows)
+    return tree
+
+
+def insert_point(tree, hero_id, point):
+    """
+    Add one point to the bucket of the leaf it falls into; a bucket that
+    grows past twice LEAF_SIZE is split into a subtree in place.
+    """
+    tree["ids"].append(hero_id)
+    tree["points"].append(point)
+    position = len(tree["ids"]) - 1
+    if tree["root"] == -1:
+        tree["root"] = add_node(tree, bucket=[position])
+        return
+
+    axes, splits, left, right = tree["axes"], tree["splits"], tree["left"], tree["right"]
+    parent, node = None, tree["root"]
+    while axes[node] != -1:
+        parent = node
+        node = left[node] if point[axes[node]] < splits[node] else right[node]
+    bucket = tree["buckets"][node]
+    bucket.append(position)
+    if len(bucket) <= 2 * LEAF_SIZE:
+        return
+
+    subtree = build_node(tree, bucket)
+    if axes[subtree] == -1:
+        return  # all points equal: keep the one bucket
+    tree["buckets"][node] = None
+    if parent is None:
+        tree["root"] = subtree
+    elif left[parent] == node:
+        left[parent] = subtree
+    else:
+        right[parent] = subtree
+
+
+def squared_distance(a, b):
+    return sum((x - y) * (x - y) for x, y in zip(a, b))
+
+
+def nearest(tree, point, k, exclude=None):
+    """
+    The k points closest to point, as [(squared distance, hero_id)]
+    sorted by distance then hero id. exclude is a hero id to skip.
+
+    The walk is iterative. Every pending subtree carries a lower bound
+    on its distance from point: the per-axis offsets of point from the
+    subtree's cell, squared and summed (kept incrementally, one axis
+    changes per step). A subtree is skipped once its bound exceeds the
+    k-th best distance so far.
+    """
+    if k <= 0 or tree["root"] == -1:
+        return []
+    ids, points, axes, splits, left, right, buckets = (
+        tree["ids"], tree["points"], tree["axes"], tree["splits"],
+        tree["left"], tree["right"], tree["buckets"])
+    q0, q1, q2, q3, q4, q5 = point
+    best = []   # max-heap of (-squared distance, -hero_id)
+    worst = math.inf
+    stack = [(tree["root"], 0.0, (0.0,) * DIMENSIONS)]
+    while stack:
+        node, bound, offsets = stack.pop()
+        if bound > worst:
+            continue
+        axis = axes[node]
+        if axis == -1:
+            for i in buckets[node]:
+                # written out for the six stats: ~3x faster than a generic sum
+                p0, p1, p2, p3, p4, p5 = points[i]
+                d = ((q0 - p0) * (q0 - p0) + (q1 - p1) * (q1 - p1) + (q2 - p2) * (q2 - p2)
+                     + (q3 - p3) * (q3 - p3) + (q4 - p4) * (q4 - p4) + (q5 - p5) * (q5 - p5))
+                if d > worst or ids[i] == exclude:
+                    continue
+                entry = (-d, -ids[i])
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                    if len(best) == k:
+                        worst = -best[0][0]
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+                    worst = -best[0][0]
+            continue
+        diff = point[axis] - splits[node]
+        near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+        # the far side is pushed first so the near side is searched first
+        far_bound = bound - offsets[axis] * offsets[axis] + diff * diff
+        if far_bound <= worst:
+            stack.append((far, far_bound, offsets[:axis] + (diff,) + offsets[axis + 1:]))
+        stack.append((near, bound, offsets))
+    return sorted((-d, -hero_id) for d, hero_id in best)
+
+
+def within(tree, point, radius, exclude=None):
+    """
+    Every point within radius of point, as [(squared distance, hero_id)]
+    sorted by distance then hero id.
+    """
+    if tree["root"] == -1:
+        return []
+    ids, points, axes, splits, left, right, buckets = (
+        tree["ids"], tree["points"], tree["axes"], tree["splits"],
+        tree["left"], tree["right"], tree["buckets"])
+    q0, q1, q2, q3, q4, q5 = point
+    limit = radius * radius
+    found = []
+    # subtrees with their distance bound, as in nearest()
+    stack = [(tree["root"], 0.0, (0.0,) * DIMENSIONS)]
+    while stack:
+        node, bound, offsets = stack.pop()
+        axis = axes[node]
+        if axis == -1:
+            for i in buckets[node]:
+                p0, p1, p2, p3, p4, p5 = points[i]
+                d = ((q0 - p0) * (q0 - p0) + (q1 - p1) * (q1 - p1) + (q2 - p2) * (q2 - p2)
+                     + (q3 - p3) * (q3 - p3) + (q4 - p4) * (q4 - p4) + (q5 - p5) * (q5 - p5))
+                if d <= limit and ids[i] != exclude:
+                    found.append((d, ids[i]))
+            continue
+        diff = point[axis] - splits[node]
+        near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+        far_bound = bound - offsets[axis] * offsets[axis] + diff * diff
+        if far_bound <= limit:
+            stack.append((far, far_bound, offsets[:axis] + (diff,) + offsets[axis + 1:]))
+        stack.append((near, bound, offsets))
+    return sorted(found)
+
+
+# ---------- Persistence ----------
+
+def save_index(tree, path):
+    """
+    Write the index as JSON (to a temporary file first, so a crash
+    never leaves a half-written index).
+    """
+    saved = {key: value for key, value in tree.items() if not key.startswith("_")}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(saved, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_index(path):
+    """
+    The saved index, or None if there is none (or it is unreadable or
+    from another version of this module).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if tree.get("version") != INDEX_VERSION:
+        return None
+    return tree
+
+
+@profiling.timed("marvel.similarity_rebuild")
+def rebuild_index(cur, path):
+    """
+    Build the index from scratch and save it.
+    """
+    tree = build_tree(load_stat_rows(cur), get_powerstats_watermark(cur))
+    save_index(tree, path)
+    return tree
+
+
+@profiling.timed("marvel.similarity_update")
+def update_index(cur, tree, path):
+    """
+    Bring a loaded index up to date with marvel_powerstats: insert new
+    heroes, or rebuild if heroes were removed or changed, or the tree
+    has grown too much since its last full build. Returns the (possibly
+    new) tree.
+
+    An unchanged database costs one read of the marvel_data_version
+    counter; the powerstats are only read after they have changed.
+    """
+    watermark = get_powerstats_watermark(cur)
+    if watermark is not None and tree["watermark"] == watermark:
+        return tree
+
+    rows = load_stat_rows(cur)
+    positions = {hero_id: i for i, hero_id in enumerate(tree["ids"])}
+    points = tree["points"]
+    added = []
+    for row in rows:
+        position = positions.pop(row[0], None)
+        if position is None:
+            added.append(row)
+        elif normalise(row[1:], tree["scaling"]) != list(points[position]):
+            # stats changed in place
+            return rebuild_index(cur, path)
+    if positions:
+        # indexed heroes that are gone (or lost all their stats)
+        return rebuild_index(cur, path)
+
+    if len(tree["ids"]) + len(added) > tree["built_size"] * (1 + REBUILD_GROWTH):
+        return rebuild_index(cur, path)
+
+    for row in added:
+        insert_point(tree, row[0], normalise(row[1:], tree["scaling"]))
+    if added or tree["watermark"] != watermark:
+        tree["watermark"] = watermark
+        save_index(tree, path)
+    return tree
+
+
+def get_index(db_path=None, rebuild=False):
+    """
+    The similarity index for db_path (default: the shared database):
+    from memory, else from disk, else built; updated if the powerstats
+    have changed since it was saved.
+    """
+    db_path = db_path or database.get_db_path()
+    path = get_index_path(db_path)
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        with _index_lock:
+            tree = None if rebuild else (_indexes.get(db_path) or load_index(path))
+            if tree is None:
+                tree = rebuild_index(cur, path)
+            else:
+                tree = update_index(cur, tree, path)
+            _indexes[db_path] = tree
+    finally:
+        database.release_connection(conn)
+    return tree
+
+
+def refresh_index(db_path=None):
+    """
+    Called after an ingest: update the index if one has been built for
+    this database. Nothing is built if similarity search was never used.
+    """
+    db_path = db_path or database.get_db_path()
+    if db_path in _indexes or os.path.exists(get_index_path(db_path)):
+        get_index(db_path)
+
+
+def clear_cache():
+    with _index_lock:
+        _indexes.clear()
+
+
+# ---------- Queries ----------
+
+def get_hero_names(hero_ids, db_path=None):
+    """
+    {hero_id: name} for the given heroes.
+    """
+    hero_ids = list(hero_ids)
+    names = {}
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        for i in range(0, len(hero_ids), 500):
+            chunk = hero_ids[i:i + 500]
+            cur.execute(f"""
+                SELECT h.id, n.name
+                FROM marvel_heroes AS h
+                LEFT JOIN marvel_hero_names AS n
+                    ON h.name_id = n.id
+                WHERE h.id IN ({", ".join("?" for _ in chunk)})
+            """, chunk)
+            names.update(cur.fetchall())
+    finally:
+        database.release_connection(conn)
+    return names
+
+
+def get_point(tree, hero_id):
+    """
+    The indexed point of hero_id. Raises KeyError if the hero is not
+    indexed (unknown, or no powerstats).
+    """
+    positions = tree.get("_positions")
+    if positions is None or len(positions) != len(tree["ids"]):
+        positions = {hero_id: i for i, hero_id in enumerate(tree["ids"])}
+        # kept in memory only; save_index drops keys starting with "_"
+        tree["_positions"] = positions
+    return tree["points"][positions[hero_id]]
+
+
+def with_names(matches, db_path=None):
+    names = get_hero_names([hero_id for _, hero_id in matches], db_path)
+    return [(hero_id, names.get(hero_id), math.sqrt(d)) for d, hero_id in matches]
+
+
+@profiling.timed("marvel.similar_heroes")
+def similar_heroes(hero_id, k=DEFAULT_K, db_path=None):
+    """
+    The k heroes whose powerstats are closest to hero_id's.
+
+    Returns:
+      list of (hero_id, name, distance), closest first (ties by hero id).
+      Distances are in standard deviations (normalised stats).
+    Raises KeyError if hero_id has no powerstats.
+    """
+    tree = get_index(db_path)
+    return with_names(nearest(tree, get_point(tree, hero_id), k, exclude=hero_id), db_path)
+
+
+@profiling.timed("marvel.heroes_within")
+def heroes_within(hero_id, radius, db_path=None):
+    """
+    Every hero within radius (in standard deviations) of hero_id.
+
+    Returns:
+      list of (hero_id, name, distance), closest first.
+    Raises KeyError if hero_id has no powerstats.
+    """
+    tree = get_index(db_path)
+    return with_names(within(tree, get_point(tree, hero_id), radius, exclude=hero_id), db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find heroes with similar powerstats")
+    parser.add_argument("hero_id", type=int, nargs="?")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="how many similar heroes")
+    parser.add_argument("--radius", type=float,
+                        help="list every hero within this distance instead")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the saved index")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        tree = get_index(rebuild=True)
+        print(f"Similarity index rebuilt: {len(tree['ids'])} heroes.")
+    if args.hero_id is not None:
+        try:
+            if args.radius is not None:
+                results = heroes_within(args.hero_id, args.radius)
+            else:
+                results = similar_heroes(args.hero_id, args.k)
+        except KeyError:
+            parser.error(f"hero {args.hero_id} has no powerstats")
+        for hero_id, name, distance in results:
+            print(f"{hero_id:6d}  {name}  ({distance:.3f})")
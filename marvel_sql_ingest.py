@@ -0,0 +1,342 @@
+"""
+marvel_sql_ingest.py
+Load all.json with SQL instead of per-hero Python.
+
+The raw JSON array is put into a temporary staging table with a single
+json_each() statement, and the lookup tables, marvel_heroes and
+marvel_powerstats are then filled set-wise with json_extract() and
+plain SQL string functions. It gives the same rows as
+marvel_api.store_marvel_data (split_hero_data, parse_int and the cm/kg
+parsers), including the "unknown" alignment default and first-seen
+lookup ID order. benchmarks/bench_marvel_sql_ingest.py checks this and
+times both paths.
+
+The SQL mirrors the Python helpers for the value types the API sends:
+strings and numbers for names, lists of strings for height and weight,
+and integers or numeric strings for powerstats. It does not copy
+Python's float() / int() on exotic spellings ("inf", "nan", "1_000",
+non-ASCII digits); those are stored as NULL.
+
+    python marvel_sql_ingest.py [--max-new N] [--bulk]
+"""
+
+import argparse
+import time
+
+import database
+import marvel_api
+import marvel_similarity
+import profiling
+import search
+from create_marvel_db import (
+    STAT_NAMES,
+    create_marvel_indexes,
+    create_power_index_tables,
+    drop_marvel_indexes,
+)
+
+# Characters Python's str.strip() removes, as an SQL char(...) list for trim().
+WHITESPACE_CODES = [
+    0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20, 0x85, 0xA0,
+    0x1680, 0x2000, 0x2001, 0x2002, 0x2003, 0x2004, 0x2005, 0x2006, 0x2007,
+    0x2008, 0x2009, 0x200A, 0x2028, 0x2029, 0x202F, 0x205F, 0x3000,
+]
+WS = "char(" + ", ".join(str(code) for code in WHITESPACE_CODES) + ")"
+
+# staging column -> JSON path, for the lookup tables (see get_hero_lookup_values)
+LOOKUP_COLUMNS = {
+    "name": ("marvel_hero_names", "$.name"),
+    "publisher": ("marvel_publishers", "$.biography.publisher"),
+    "alignment": ("marvel_alignments", "$.biography.alignment"),
+    "gender": ("marvel_genders", "$.appearance.gender"),
+    "race": ("marvel_races", "$.appearance.race"),
+}
+
+# measurement column -> (JSON path of the list, unit stripped before parsing)
+MEASURE_COLUMNS = {
+    "height_cm": ("$.appearance.height", "cm"),
+    "weight_kg": ("$.appearance.weight", "kg"),
+}
+
+
+def scalar_text_sql(path):
+    """
+    str(value) of a JSON scalar at path (NULL if missing, null or a
+    list/object), like the str() calls in the Python helpers.
+    """
+    return f"""
+        CASE json_type(s.hero, '{path}')
+            WHEN 'text' THEN json_extract(s.hero, '{path}')
+            WHEN 'integer' THEN CAST(json_extract(s.hero, '{path}') AS TEXT)
+            WHEN 'real' THEN CAST(json_extract(s.hero, '{path}') AS TEXT)
+            WHEN 'true' THEN 'True'
+            WHEN 'false' THEN 'False'
+        END"""
+
+
+def parse_int_sql(column):
+    """
+    parse_int on a (type, trimmed text) pair of columns: JSON integers
+    and booleans as-is, strings of [+-]digits converted, anything else NULL.
+    """
+    rest = f"CASE WHEN substr({column}, 1, 1) IN ('+', '-') THEN substr({column}, 2) ELSE {column} END"
+    return f"""
+        CASE
+            WHEN {column}_type IN ('integer', 'true', 'false') THEN {column}
+            WHEN {column}_type = 'text' AND ({rest}) <> '' AND ({rest}) NOT GLOB '*[^0-9]*'
+                THEN CAST({column} AS INTEGER)
+        END"""
+
+
+STAGE_SQL = """
+    INSERT INTO temp.marvel_staging (idx, hero_id, hero)
+    SELECT key, json_extract(value, '$.id'), value
+    FROM json_each(?)
+"""
+
+# Step 1: one row per selected hero with every value cleaned the way
+# clean_lookup_name / get_hero_lookup_values / parse_int do it, plus the
+# height and weight lists as JSON. Each CTE is MATERIALIZED so every
+# json_extract runs once per hero; flattened, the CASE expressions that
+# refer to a column several times would repeat them.
+ROWS_SQL = f"""
+    WITH raw AS MATERIALIZED (
+        SELECT s.idx, s.hero_id,
+               {", ".join(f"{scalar_text_sql(path)} AS {c}" for c, (_, path) in LOOKUP_COLUMNS.items())},
+               {", ".join(f"json_type(s.hero, '$.powerstats.{s}') AS {s}_type, "
+                          f"json_extract(s.hero, '$.powerstats.{s}') AS {s}" for s in STAT_NAMES)},
+               {", ".join(f"CASE WHEN json_type(s.hero, '{path}') = 'array' "
+                          f"THEN json_extract(s.hero, '{path}') END AS {c}_json"
+                          for c, (path, _) in MEASURE_COLUMNS.items())}
+        FROM temp.marvel_staging AS s
+        WHERE s.hero_id IS NOT NULL
+          AND s.hero_id NOT IN (SELECT id FROM marvel_heroes)
+        ORDER BY s.idx
+        LIMIT ?
+    ),
+    trimmed AS MATERIALIZED (
+        SELECT idx, hero_id,
+               {", ".join(f"trim({c}, {WS}) AS {c}" for c in LOOKUP_COLUMNS if c != "alignment")},
+               CASE WHEN alignment IS NULL OR trim(alignment, {WS}) = '' THEN 'unknown'
+                    ELSE trim(alignment, {WS}) END AS alignment,
+               {", ".join(f"{s}_type, CASE WHEN {s}_type = 'text' THEN trim({s}, {WS}) ELSE {s} END AS {s}"
+                          for s in STAT_NAMES)},
+               {", ".join(f"{c}_json" for c in MEASURE_COLUMNS)}
+        FROM raw
+    )
+    INSERT INTO temp.marvel_staging_rows
+        (idx, hero_id, {", ".join(LOOKUP_COLUMNS)}, {", ".join(STAT_NAMES)},
+         {", ".join(f"{c}_json" for c in MEASURE_COLUMNS)})
+    SELECT idx, hero_id,
+           {", ".join(f"CASE WHEN {c} IN ('', '-') THEN NULL ELSE {c} END" for c in LOOKUP_COLUMNS)},
+           {", ".join(parse_int_sql(s) for s in STAT_NAMES)},
+           {", ".join(f"{c}_json" for c in MEASURE_COLUMNS)}
+    FROM trimmed
+"""
+
+# Step 2: the first list item that parses as a number, per hero and
+# measurement (parse_float_from_cm_list / parse_float_from_kg_list).
+# Items are trimmed, the unit is removed, "" and "-" are skipped, and
+# the rest must be a decimal number; it is normalised to JSON number
+# syntax (no leading zeros, no bare ".5" or "5.") and checked with
+# json_valid before the CAST.
+MEASURE_ITEMS_SQL = " UNION ALL ".join(
+    f"""
+        SELECT r.idx, '{c}' AS field, e.key AS pos,
+               CASE WHEN instr(trim(CAST(e.value AS TEXT), {WS}), '{unit}') > 0
+                    THEN trim(replace(trim(CAST(e.value AS TEXT), {WS}), '{unit}', ''), {WS})
+                    ELSE trim(CAST(e.value AS TEXT), {WS}) END AS t
+        FROM temp.marvel_staging_rows AS r, json_each(r.{c}_json) AS e
+        WHERE r.{c}_json IS NOT NULL
+          AND e.type IN ('text', 'integer', 'real')"""
+    for c, (_, unit) in MEASURE_COLUMNS.items()
+)
+MEASURES_SQL = f"""
+    WITH items AS MATERIALIZED ({MEASURE_ITEMS_SQL}
+    ),
+    signed AS MATERIALIZED (
+        SELECT idx, field, pos,
+               CASE WHEN substr(t, 1, 1) = '-' THEN '-' ELSE '' END AS sign,
+               CASE WHEN substr(t, 1, 1) IN ('+', '-') THEN substr(t, 2) ELSE t END AS rest
+        FROM items
+        WHERE t NOT IN ('', '-')
+    ),
+    decimals AS MATERIALIZED (
+        SELECT idx, field, pos, sign,
+               replace(replace(
+                   CASE WHEN ltrim(rest, '0') = '' OR substr(ltrim(rest, '0'), 1, 1) IN ('.', 'e', 'E')
+                        THEN '0' || ltrim(rest, '0') ELSE ltrim(rest, '0') END,
+                   '.e', '.0e'), '.E', '.0E') AS num
+        FROM signed
+        WHERE (rest GLOB '[0-9]*' OR rest GLOB '.[0-9]*')
+          AND rest NOT GLOB '*[^0-9.eE+-]*'
+    ),
+    numbers AS (
+        SELECT idx, field, pos, sign,
+               CASE WHEN substr(num, -1) = '.' THEN num || '0' ELSE num END AS num
+        FROM decimals
+    )
+    INSERT INTO temp.marvel_staging_measures (idx, field, value)
+    SELECT idx, field, value FROM (
+        SELECT idx, field, CAST(sign || num AS REAL) AS value, MIN(pos)
+        FROM numbers
+        WHERE json_valid(num) AND json_type(num) IN ('integer', 'real')
+        GROUP BY idx, field
+    )
+"""
+
+# Step 3: new lookup names, in the order they first appear (same IDs as
+# build_lookup_cache would assign).
+LOOKUP_INSERT_SQL = """
+    INSERT OR IGNORE INTO {table} (name)
+    SELECT value FROM (
+        SELECT {column} AS value, MIN(idx) AS first_seen
+        FROM temp.marvel_staging_rows
+        WHERE {column} IS NOT NULL
+          AND {column} NOT IN (SELECT name FROM {table})
+        GROUP BY {column}
+    )
+    ORDER BY first_seen
+"""
+
+HEROES_INSERT_SQL = f"""
+    INSERT OR IGNORE INTO marvel_heroes
+        (id, name_id, publisher_id, alignment_id, gender_id, race_id, height_cm, weight_kg)
+    SELECT r.hero_id, {", ".join(f"l_{c}.id" for c in LOOKUP_COLUMNS)},
+           {", ".join(f"m_{c}.value" for c in MEASURE_COLUMNS)}
+    FROM temp.marvel_staging_rows AS r
+    {" ".join(f"LEFT JOIN {table} AS l_{c} ON l_{c}.name = r.{c}"
+              for c, (table, _) in LOOKUP_COLUMNS.items())}
+    {" ".join(f"LEFT JOIN temp.marvel_staging_measures AS m_{c} "
+              f"ON m_{c}.idx = r.idx AND m_{c}.field = '{c}'" for c in MEASURE_COLUMNS)}
+    ORDER BY r.idx
+"""
+
+POWERSTATS_INSERT_SQL = f"""
+    INSERT OR IGNORE INTO marvel_powerstats (hero_id, {", ".join(STAT_NAMES)})
+    SELECT hero_id, {", ".join(STAT_NAMES)}
+    FROM temp.marvel_staging_rows
+    ORDER BY idx
+"""
+
+
+def create_staging_tables(cur):
+    """
+    Temporary tables (private to this connection) for one load.
+    """
+    drop_staging_tables(cur)
+    cur.execute("""
+        CREATE TEMP TABLE marvel_staging (
+            idx INTEGER PRIMARY KEY,
+            hero_id,
+            hero TEXT
+        )
+    """)
+    cur.execute(f"""
+        CREATE TEMP TABLE marvel_staging_rows (
+            idx INTEGER PRIMARY KEY,
+            hero_id,
+            {", ".join(f"{c} TEXT" for c in LOOKUP_COLUMNS)},
+            {", ".join(f"{s} INTEGER" for s in STAT_NAMES)},
+            {", ".join(f"{c}_json TEXT" for c in MEASURE_COLUMNS)}
+        )
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE marvel_staging_measures (
+            idx INTEGER,
+            field TEXT,
+            value REAL,
+            PRIMARY KEY (idx, field)
+        )
+    """)
+
+
+def drop_staging_tables(cur):
+    for table in ["marvel_staging", "marvel_staging_rows", "marvel_staging_measures"]:
+        cur.execute(f"DROP TABLE IF EXISTS temp.{table}")
+
+
+@profiling.timed("marvel.transform_staged_heroes")
+def transform_staged_heroes(cur, max_new=None):
+    """
+    Fill the lookup tables, marvel_heroes and marvel_powerstats from the
+    staging table: the first max_new heroes (None for all) that have an
+    id and are not stored yet, as in marvel_api.iter_new_heroes.
+
+    Returns (inserted, processed) like marvel_api.insert_hero_batch.
+    """
+    cur.execute(ROWS_SQL, (-1 if max_new is None else max_new,))
+    processed = cur.rowcount
+
+    cur.execute(MEASURES_SQL)
+
+    for column, (table, _) in LOOKUP_COLUMNS.items():
+        cur.execute(LOOKUP_INSERT_SQL.format(table=table, column=column))
+
+    cur.execute(HEROES_INSERT_SQL)
+    inserted = max(cur.rowcount, 0)
+    cur.execute(POWERSTATS_INSERT_SQL)
+    return inserted, processed
+
+
+@profiling.timed("marvel.store_marvel_json")
+def store_marvel_json(json_text, max_new=None, bulk=False):
+    """
+    Store the heroes of a raw all.json document (a string) without
+    decoding it in Python. bulk works as in marvel_api.store_marvel_data.
+
+    Returns the number of hero rows inserted.
+    """
+    start = time.perf_counter()
+
+    conn = database.get_connection()
+    if bulk:
+        conn.execute("BEGIN")
+    cur = conn.cursor()
+
+    create_power_index_tables(cur)
+    create_staging_tables(cur)
+    if bulk:
+        drop_marvel_indexes(cur)
+
+    with profiling.timer("marvel.stage_json"):
+        cur.execute(STAGE_SQL, (json_text,))
+    inserted, processed = transform_staged_heroes(cur, max_new)
+
+    if bulk:
+        create_marvel_indexes(cur)
+    drop_staging_tables(cur)
+    search.apply_search_queue(cur)
+
+    conn.commit()
+    database.release_connection(conn)
+    if inserted:
+        marvel_similarity.refresh_index()
+
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {inserted} heroes and up to {processed} powerstat rows.")
+    marvel_api.print_timing_report("sql-bulk" if bulk else "sql", processed, elapsed)
+    return inserted
+
+
+def main(max_new=25, bulk=False, url=marvel_api.ALL_URL):
+    """
+    Like marvel_api.main, but the cached all.json is handed to SQLite as
+    text and transformed there.
+    """
+    body_path = marvel_api.fetch_cached(url)
+    marvel_api.print_cache_stats()
+    with open(body_path, "r", encoding="utf-8") as f:
+        json_text = f.read()
+    return store_marvel_json(json_text, max_new=None if bulk else max_new, bulk=bulk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load Marvel heroes with SQLite JSON functions")
+    parser.add_argument("--bulk", action="store_true",
+                        help="load the whole catalogue in one transaction")
+    parser.add_argument("--max-new", type=int, default=25,
+                        help="heroes to add per incremental run (default 25)")
+    args = parser.parse_args()
+
+    main(max_new=args.max_new, bulk=args.bulk)
@@ -1,6 +1,6 @@
 import os
 import matplotlib.pyplot as plt
-from marvel_analysis import calculate_power_index, calculate_alignment_averages
+from marvel_analysis import top_k_power_index, calculate_alignment_averages
 
 
 def get_output_path(filename):
@@ -16,13 +16,20 @@ def plot_top_power_index():
     Bar chart of top 10 heroes by power index.
     Also save the figure as 'marvel_top_power_index.png'.
     """
-    results = calculate_power_index()
-    top10 = results[:10]
+    top10 = top_k_power_index(10)
 
     if not top10:
         print("No heroes found for top power index plot.")
         return
 
+    draw_top_power_index(top10, get_output_path("marvel_top_power_index.png"))
+
+
+def draw_top_power_index(top10, out_path, show=True):
+    """
+    Draw the top power index bar chart from already computed rows
+    (hero_id, name, power_index) and save it to out_path.
+    """
     names = [row[1] for row in top10]
     scores = [row[2] for row in top10]
 
@@ -33,11 +40,11 @@ def plot_top_power_index():
     plt.title("Top 10 heroes by power index")
     plt.tight_layout()
 
-    out_path = get_output_path("marvel_top_power_index.png")
     plt.savefig(out_path, dpi=300, bbox_inches="tight")
     print("Saved bar chart to:", out_path)
 
-    plt.show()
+    if show:
+        plt.show()
     plt.close()
 
 
@@ -55,6 +62,14 @@ def plot_alignment_line():
         print("No data for alignment line plot.")
         return
 
+    draw_alignment_line(alignment_avgs, get_output_path("marvel_alignment_powerstats.png"))
+
+
+def draw_alignment_line(alignment_avgs, out_path, show=True):
+    """
+    Draw the alignment line chart from already computed
+    (alignment, stats_dict) pairs and save it to out_path.
+    """
     stat_names = ["intelligence", "strength", "speed",
                   "durability", "power", "combat"]
     x_positions = list(range(len(stat_names)))
@@ -79,11 +94,11 @@ def plot_alignment_line():
     plt.legend(title="Alignment")
     plt.tight_layout()
 
-    out_path = get_output_path("marvel_alignment_powerstats.png")
     plt.savefig(out_path, dpi=300, bbox_inches="tight")
     print("Saved line chart to:", out_path)
 
-    plt.show()
+    if show:
+        plt.show()
     plt.close()
 
 
@@ -1,21 +1,25 @@
-from marvel_analysis import calculate_power_index, calculate_alignment_averages
+from marvel_analysis import top_k_power_index, calculate_alignment_averages
 
 
-def write_marvel_results(output_path="marvel_results.txt"):
+def write_marvel_results(output_path="marvel_results.txt", power_list=None, alignment_avgs=None):
     """
     Write a human-readable summary of Marvel calculations to a text file.
     Includes:
       - Top 10 heroes by power index
       - Average powerstats by alignment
+
+    power_list and alignment_avgs can be passed in when the caller has
+    already computed them; otherwise they are read from the database.
     """
-    power_list = calculate_power_index()
-    alignment_avgs = calculate_alignment_averages()
+    if power_list is None:
+        power_list = top_k_power_index(10)
+    if alignment_avgs is None:
+        alignment_avgs = calculate_alignment_averages()
 
     with open(output_path, "w", encoding="utf-8") as f:
         f.write("Top 10 Heroes by Power Index\n")
         f.write("----------------------------------------\n")
-        top10 = power_list[:10]
-        for hero_id, name, pi in top10:
+        for hero_id, name, pi in power_list:
             f.write(f"{hero_id:4d}  {name:25s}  power_index = {pi:.2f}\n")
 
         f.write("\n\nAverage Powerstats by Alignment\n")
@@ -0,0 +1,324 @@
+"""
+pipeline.py
+One entry point for the whole project.
+
+The individual scripts are modelled as a DAG of stages:
+
+    marvel_schema -> marvel_fetch -> marvel_store -> marvel_analytics -> marvel_report
+    disney_schema ------------------> disney_crawl -> disney_analytics -> disney_report
+                                        marvel_analytics + disney_analytics -> figures
+
+A stage starts as soon as everything it depends on has finished, so
+the Marvel and Disney branches run side by side. Each stage gets the
+return values of the stages before it, so analytics are computed once
+and handed to the reports and figures instead of being re-queried.
+Stages that write to the database take a shared lock, because SQLite
+allows one writer at a time; the Disney crawl takes it only while it
+writes a page, so the Marvel download and store overlap the crawl.
+Reports and figures go through build_cache, so they are only
+regenerated when their inputs change.
+
+    python pipeline.py [--only marvel|disney] [--skip-ingest] [--bulk]
+                       [--max-new N] [--restart] [--serial] [--force]
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import build_cache
+import calculations
+import create_marvel_db
+import database
+import disney_api
+import disney_stats
+import marvel_analysis
+import marvel_api
+import profiling
+import render_figures
+
+# SQLite has a single writer; stages marked as writers hold this lock,
+# disney_crawl only around each page it writes.
+DB_WRITE_LOCK = threading.Lock()
+
+DEFAULT_OPTIONS = {
+    "max_new": 25,
+    "bulk": False,
+    "stream": False,
+    "resume": True,
+    "concurrency": disney_api.DEFAULT_CONCURRENCY,
+    "force": False,
+    "workers": None,
+}
+
+
+# ---------- Stages ----------
+# Every stage is called as stage(results, options), where results maps
+# the names of finished stages to their return values.
+
+def marvel_schema(results, options):
+    create_marvel_db.create_marvel_tables()
+
+
+def marvel_fetch(results, options):
+    """
+    Download (or revalidate the cached copy of) the hero catalogue.
+    No database access, so it runs while the Disney crawl is writing.
+    With --stream the catalogue is only downloaded to the disk cache;
+    the returned iterator parses it hero by hero in marvel_store.
+    """
+    if options["stream"]:
+        return marvel_api.stream_all_heroes()
+    return marvel_api.fetch_all_heroes()
+
+
+def marvel_store(results, options):
+    """
+    Store the heroes that are not in the database yet.
+    """
+    max_new = None if options["bulk"] else options["max_new"]
+    conn = database.get_connection()
+    existing_ids = marvel_api.get_existing_hero_ids(conn)
+    database.release_connection(conn)
+
+    if options["stream"]:
+        new_heroes = marvel_api.iter_new_heroes(results["marvel_fetch"], existing_ids, max_new=max_new)
+        return marvel_api.store_marvel_stream(new_heroes, bulk=options["bulk"])
+
+    new_heroes = marvel_api.choose_new_heroes(results["marvel_fetch"], existing_ids, max_new=max_new)
+    return marvel_api.store_marvel_data(new_heroes, bulk=options["bulk"])
+
+
+def marvel_analytics(results, options):
+    return {
+        "top_power_index": marvel_analysis.top_k_power_index(10),
+        "alignment_averages": marvel_analysis.calculate_alignment_averages(),
+    }
+
+
+def marvel_report(results, options):
+    analytics = results["marvel_analytics"]
+    build_cache.build_marvel_report(
+        analytics["top_power_index"], analytics["alignment_averages"], force=options["force"],
+    )
+
+
+def disney_schema(results, options):
+    disney_api.setup_database()
+
+
+def disney_crawl(results, options):
+    # takes the write lock per page, so Marvel writes fit in between
+    disney_api.store_characters(concurrency=options["concurrency"], resume=options["resume"],
+                                write_lock=DB_WRITE_LOCK)
+
+
+def disney_analytics(results, options):
+    return {
+        "summary": calculations.get_appearance_summary(),
+        "spread_and_total": disney_stats.top_spread_and_total(30),
+    }
+
+
+def disney_report(results, options):
+    build_cache.build_disney_report(results["disney_analytics"]["summary"], force=options["force"])
+
+
+def figures(results, options):
+    """
+    Render every chart whose analytics ran in this pipeline.
+    """
+    data = {}
+    if "marvel_analytics" in results:
+        marvel = results["marvel_analytics"]
+        data["marvel_top_power_index"] = marvel["top_power_index"]
+        data["marvel_alignment_powerstats"] = marvel["alignment_averages"]
+    if "disney_analytics" in results:
+        disney = results["disney_analytics"]
+        data["disney_total_appearances"] = disney["summary"]["top_10"]
+        data["disney_media_spread_vs_total"] = disney["spread_and_total"]
+    if data:
+        render_figures.render_all(list(data), workers=options["workers"],
+                                  force=options["force"], data=data)
+
+
+# name -> (dependencies, function, holds DB_WRITE_LOCK for the whole stage)
+STAGES = {
+    "marvel_schema": ((), marvel_schema, True),
+    "marvel_fetch": ((), marvel_fetch, False),
+    "marvel_store": (("marvel_schema", "marvel_fetch"), marvel_store, True),
+    "marvel_analytics": (("marvel_store",), marvel_analytics, False),
+    "marvel_report": (("marvel_analytics",), marvel_report, False),
+    "disney_schema": ((), disney_schema, True),
+    "disney_crawl": (("disney_schema",), disney_crawl, False),
+    "disney_analytics": (("disney_crawl",), disney_analytics, False),
+    "disney_report": (("disney_analytics",), disney_report, False),
+    "figures": (("marvel_analytics", "disney_analytics"), figures, False),
+}
+
+INGEST_STAGES = ["marvel_fetch", "marvel_store", "disney_crawl"]
+
+
+def select_stages(only=None, skip_ingest=False):
+    """
+    Return the stage table restricted to one branch and/or without the
+    network stages. A dependency on a removed stage is replaced by that
+    stage's own dependencies (transitively), so e.g. with --skip-ingest
+    marvel_analytics still waits for marvel_schema.
+    """
+    names = [
+        name for name in STAGES
+        if (only is None or name.startswith(only) or name == "figures")
+        and not (skip_ingest and name in INGEST_STAGES)
+    ]
+
+    def kept_dependencies(name):
+        deps = []
+        for dep in STAGES[name][0]:
+            for kept in ((dep,) if dep in names else kept_dependencies(dep)):
+                if kept not in deps:
+                    deps.append(kept)
+        return deps
+
+    return {
+        name: (tuple(kept_dependencies(name)),) + STAGES[name][1:]
+        for name in names
+    }
+
+
+def run_stage(name, func, writes, results, options):
+    """
+    Worker: run one stage. Returns (value, start, end) in perf_counter time.
+    """
+    start = time.perf_counter()
+    with profiling.timer(f"stage.{name}"):
+        if writes:
+            with DB_WRITE_LOCK:
+                value = func(results, options)
+        else:
+            value = func(results, options)
+    return value, start, time.perf_counter()
+
+
+def run_pipeline(stages=None, options=None, max_workers=None):
+    """
+    Run the stages in dependency order, starting each one as soon as its
+    dependencies are done. max_workers=1 runs them one after another.
+
+    Returns (results, timings) where timings maps each stage name to
+    (start offset, end offset) in seconds from the start of the run.
+    Stops at the first stage that raises, after the running ones finish.
+    """
+    stages = dict(STAGES if stages is None else stages)
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(options or {})
+
+    for name, (deps, _, _) in stages.items():
+        for dep in deps:
+            if dep not in stages:
+                raise ValueError(f"stage {name} depends on unknown stage {dep}")
+
+    results = {}
+    timings = {}
+    pending = dict(stages)
+    running = {}
+    t0 = time.perf_counter()
+
+    if max_workers == 1:
+        # one stage at a time on this thread (cProfile only sees this thread)
+        while pending:
+            ready = [name for name, (deps, _, _) in pending.items()
+                     if all(dep in results for dep in deps)]
+            if not ready:
+                raise ValueError(f"dependency cycle among stages: {sorted(pending)}")
+            name = ready[0]
+            _, func, writes = pending.pop(name)
+            value, start, end = run_stage(name, func, writes, dict(results), opts)
+            results[name] = value
+            timings[name] = (start - t0, end - t0)
+        return results, timings
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1) as pool:
+        while pending or running:
+            for name, (deps, func, writes) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    # results is only written here, between waits, so a
+                    # stage sees a stable view of everything it depends on
+                    future = pool.submit(run_stage, name, func, writes, dict(results), opts)
+                    running[future] = name
+                    del pending[name]
+
+            if not running:
+                raise ValueError(f"dependency cycle among stages: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                value, start, end = future.result()
+                results[name] = value
+                timings[name] = (start - t0, end - t0)
+
+    return results, timings
+
+
+def print_stage_report(timings):
+    """
+    Per-stage wall time, in the order the stages started.
+    """
+    total = max((end for _, end in timings.values()), default=0.0)
+    busy = sum(end - start for start, end in timings.values())
+
+    print("\nStage timings")
+    print("----------------------------------------------------------")
+    print(f"{'stage':20s} {'start':>8s} {'end':>8s} {'seconds':>9s}")
+    for name, (start, end) in sorted(timings.items(), key=lambda item: item[1][0]):
+        print(f"{name:20s} {start:8.3f} {end:8.3f} {end - start:9.3f}")
+    print("----------------------------------------------------------")
+    print(f"wall time {total:.3f}s, sum of stage times {busy:.3f}s")
+
+
+def main(only=None, skip_ingest=False, serial=False, **options):
+    stages = select_stages(only=only, skip_ingest=skip_ingest)
+    results, timings = run_pipeline(stages, options, max_workers=1 if serial else None)
+    print_stage_report(timings)
+    build_cache.print_cache_stats()
+    return results, timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the whole project as one pipeline")
+    parser.add_argument("--only", choices=["marvel", "disney"],
+                        help="run only one branch (plus its figures)")
+    parser.add_argument("--skip-ingest", action="store_true",
+                        help="do not fetch anything; analyse what is already stored")
+    parser.add_argument("--bulk", action="store_true",
+                        help="load every Marvel hero that is not stored yet")
+    parser.add_argument("--max-new", type=int, default=25,
+                        help="Marvel heroes to add per run (default 25)")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse the Marvel catalogue incrementally")
+    parser.add_argument("--restart", action="store_true",
+                        help="crawl Disney from page 1 instead of the saved cursor")
+    parser.add_argument("--concurrency", type=int, default=disney_api.DEFAULT_CONCURRENCY,
+                        help="Disney pages fetched ahead of the inserter")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for rendering figures")
+    parser.add_argument("--force", action="store_true",
+                        help="regenerate reports and figures even if unchanged")
+    parser.add_argument("--serial", action="store_true",
+                        help="run one stage at a time")
+    args = parser.parse_args()
+
+    main(
+        only=args.only,
+        skip_ingest=args.skip_ingest,
+        serial=args.serial,
+        max_new=args.max_new,
+        bulk=args.bulk,
+        stream=args.stream,
+        resume=not args.restart,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        force=args.force,
+    )
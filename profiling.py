@@ -0,0 +1,211 @@
+"""
+profiling.py
+Opt-in timers, counters and SQL statement counts for the hot paths.
+
+Nothing is recorded unless the FINAL_PROJECT_PROFILE environment
+variable is set when the project is imported:
+
+    FINAL_PROJECT_PROFILE=1 python pipeline.py          # JSON profile
+    FINAL_PROJECT_PROFILE=cprofile python marvel_api.py # JSON + cProfile dump
+
+At exit a JSON profile (wall time, per-timer calls/seconds, counters and
+the SQL statements executed, grouped by kind and by text) is written to
+profiles/ (or FINAL_PROJECT_PROFILE_DIR). In cprofile mode a .prof file
+for pstats/snakeviz is written next to it; cProfile only sees the main
+thread, so run pipeline.py with --serial for a complete picture.
+
+When profiling is off, timed() returns the function unchanged and
+timer()/count() return immediately, so the instrumentation costs
+next to nothing.
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ENV_VAR = "FINAL_PROJECT_PROFILE"
+OUTPUT_DIR_ENV_VAR = "FINAL_PROJECT_PROFILE_DIR"
+DEFAULT_OUTPUT_DIR = "profiles"
+
+# distinct SQL texts listed in the profile, most executed first
+TOP_STATEMENTS = 25
+
+MODE = os.environ.get(ENV_VAR, "").strip().lower()
+ENABLED = MODE not in ("", "0", "off", "false", "no")
+
+_lock = threading.Lock()
+_timers = {}        # name -> [calls, seconds, max seconds]
+_counters = {}      # name -> count
+_sql_kinds = {}     # first keyword -> count
+_sql_texts = {}     # normalised statement -> count
+_state = {"started_at": None, "start": None, "profiler": None}
+
+_WHITESPACE = re.compile(r"\s+")
+# sqlite3 reports statements with their parameters filled in; literals
+# are replaced by ? again so executions of one statement group together
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b|\bNULL\b")
+
+
+def add_time(name, seconds):
+    with _lock:
+        entry = _timers.get(name)
+        if entry is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+@contextmanager
+def timer(name):
+    """
+    Time the body of a with block under name.
+    """
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """
+    Decorator: time every call of the function under name
+    (default: module.function). A no-op when profiling is off.
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add_time(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def trace_sql(statement):
+    """
+    sqlite3 trace callback: count each executed statement. Statements
+    run by triggers are reported (and counted) once per trigger step.
+    """
+    text = _LITERALS.sub("?", _WHITESPACE.sub(" ", statement).strip())
+    kind = text.split(" ", 1)[0].upper() if text else ""
+    with _lock:
+        _sql_kinds[kind] = _sql_kinds.get(kind, 0) + 1
+        _sql_texts[text] = _sql_texts.get(text, 0) + 1
+
+
+def install_sql_trace(conn):
+    """
+    Count the statements run on conn (called by database.connect).
+    """
+    if ENABLED:
+        conn.set_trace_callback(trace_sql)
+
+
+def snapshot():
+    """
+    Everything recorded so far, as a JSON-ready dict.
+    """
+    with _lock:
+        timers = {
+            name: {"calls": calls, "seconds": round(seconds, 6), "max_seconds": round(longest, 6)}
+            for name, (calls, seconds, longest) in sorted(_timers.items())
+        }
+        counters = dict(sorted(_counters.items()))
+        kinds = dict(sorted(_sql_kinds.items()))
+        texts = sorted(_sql_texts.items(), key=lambda item: (-item[1], item[0]))
+
+    start = _state["start"]
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv else "",
+        "argv": sys.argv[1:],
+        "mode": MODE,
+        "started_at": _state["started_at"],
+        "wall_seconds": round(time.perf_counter() - start, 6) if start else None,
+        "timers": timers,
+        "counters": counters,
+        "sql": {
+            "statements": sum(kinds.values()),
+            "by_kind": kinds,
+            "top_statements": [
+                {"sql": text, "count": n} for text, n in texts[:TOP_STATEMENTS]
+            ],
+        },
+    }
+
+
+def get_output_stem():
+    out_dir = os.environ.get(OUTPUT_DIR_ENV_VAR, DEFAULT_OUTPUT_DIR)
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(_state["started_at"] or time.time()))
+    return os.path.join(out_dir, f"{script}-{stamp}-{os.getpid()}")
+
+
+def write_profile(stem=None):
+    """
+    Write the JSON profile (and the cProfile dump, if any).
+    Returns the JSON path.
+    """
+    stem = stem or get_output_stem()
+    os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+    data = snapshot()
+
+    profiler = _state["profiler"]
+    if profiler is not None:
+        profiler.disable()
+        data["cprofile"] = stem + ".prof"
+        profiler.dump_stats(data["cprofile"])
+
+    path = stem + ".json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def _write_at_exit():
+    path = write_profile()
+    print(f"Profile written to {path}", file=sys.stderr)
+
+
+def start():
+    """
+    Begin a profiled run; called on import when profiling is enabled.
+    """
+    if _state["start"] is not None:
+        return
+    _state["started_at"] = time.time()
+    _state["start"] = time.perf_counter()
+    if MODE == "cprofile":
+        _state["profiler"] = cProfile.Profile()
+        _state["profiler"].enable()
+    atexit.register(_write_at_exit)
+
+
+if ENABLED:
+    start()
@@ -0,0 +1,149 @@
+"""
+render_figures.py
+Headless batch rendering of every chart in the project.
+
+The analytics each chart needs are computed once in this process, then
+the figures are drawn in parallel worker processes with the Agg backend
+(no plt.show() windows). A chart whose input data and drawing code have
+not changed since the last run, and whose PNG is still the one that was
+produced, is not rendered again (see build_cache.py).
+
+    python render_figures.py [--workers N] [--force] [--only NAME ...]
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import build_cache
+import disney_stats
+import profiling
+from marvel_analysis import calculate_alignment_averages, top_k_power_index
+
+# name -> (module, draw function, output file)
+FIGURES = {
+    "marvel_top_power_index": (
+        "marvel_visualize", "draw_top_power_index", "marvel_top_power_index.png"),
+    "marvel_alignment_powerstats": (
+        "marvel_visualize", "draw_alignment_line", "marvel_alignment_powerstats.png"),
+    "disney_total_appearances": (
+        "visulizations", "draw_total_appearances", "disney_total_appearances.png"),
+    "disney_media_spread_vs_total": (
+        "visulizations", "draw_media_spread_vs_total", "disney_media_spread_vs_total.png"),
+}
+
+def get_output_dir():
+    """
+    Figures go next to this file, like marvel_visualize.get_output_path.
+    """
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+@profiling.timed("figures.compute_figure_data")
+def compute_figure_data(names):
+    """
+    Run the analytics once and return {figure name: input data}.
+    """
+    data = {}
+    if "marvel_top_power_index" in names:
+        data["marvel_top_power_index"] = top_k_power_index(10)
+    if "marvel_alignment_powerstats" in names:
+        data["marvel_alignment_powerstats"] = calculate_alignment_averages()
+    if "disney_total_appearances" in names:
+        data["disney_total_appearances"] = disney_stats.top_by_appearances(10)
+    if "disney_media_spread_vs_total" in names:
+        data["disney_media_spread_vs_total"] = disney_stats.top_spread_and_total(30)
+    return data
+
+
+def render_figure(name, data, out_path):
+    """
+    Worker: draw one figure headlessly. Returns (name, seconds).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    module_name, func_name, _ = FIGURES[name]
+    draw = getattr(importlib.import_module(module_name), func_name)
+
+    start = time.perf_counter()
+    draw(data, out_path, show=False)
+    return name, time.perf_counter() - start
+
+
+@profiling.timed("figures.render_all")
+def render_all(names=None, workers=None, force=False, output_dir=None, data=None):
+    """
+    Render the given figures (default: all of them) in a pool of
+    spawned worker processes.
+
+    data maps figure names to input data the caller already computed
+    (see compute_figure_data); only the missing ones are computed here.
+
+    Returns {figure name: seconds} for the figures that were rendered;
+    skipped figures are reported but not included.
+    """
+    names = list(names or FIGURES)
+    output_dir = output_dir or get_output_dir()
+    manifest_path = build_cache.manifest_path(output_dir)
+    manifest = build_cache.load_manifest(manifest_path)
+
+    start = time.perf_counter()
+    data = dict(data or {})
+    missing = [name for name in names if name not in data]
+    if missing:
+        data.update(compute_figure_data(missing))
+        print(f"analytics computed once in {time.perf_counter() - start:.3f}s")
+
+    jobs = []
+    keys = {}
+    for name in names:
+        out_path = os.path.join(output_dir, FIGURES[name][2])
+        key = build_cache.artifact_key([name, data[name]], [FIGURES[name][0]])
+        if not force and build_cache.is_fresh(name, key, manifest):
+            build_cache.CACHE_STATS["hits"] += 1
+            build_cache.CACHE_STATS["seconds_saved"] += manifest[name].get("seconds", 0.0)
+            print(f"  {name:30s} unchanged, skipped")
+            continue
+        if not data[name]:
+            print(f"  {name:30s} no data, skipped")
+            continue
+        jobs.append((name, data[name], out_path))
+        keys[name] = key
+
+    timings = {}
+    if jobs:
+        # spawned, not forked: pipeline.py calls this from a worker thread
+        # while other threads may hold database connections and locks
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as pool:
+            futures = [pool.submit(render_figure, *job) for job in jobs]
+            for future in futures:
+                name, seconds = future.result()
+                timings[name] = seconds
+                print(f"  {name:30s} rendered in {seconds:.3f}s")
+
+    if timings:
+        records = [(name, keys[name], [out_path], timings[name]) for name, _, out_path in jobs]
+        build_cache.CACHE_STATS["misses"] += len(records)
+        build_cache.save_records(records, manifest_path)
+
+    print(f"{len(timings)} rendered, {len(names) - len(timings)} skipped, "
+          f"total {time.perf_counter() - start:.3f}s")
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render all charts headlessly")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="render even if the input data is unchanged")
+    parser.add_argument("--only", nargs="+", choices=sorted(FIGURES),
+                        help="render only these figures")
+    args = parser.parse_args()
+
+    render_all(args.only, workers=args.workers, force=args.force)
@@ -0,0 +1,345 @@
+"""
+search.py
+Full-text search over hero names, Disney characters and media titles.
+
+One FTS5 table, search_index, holds every searchable name together with
+its kind ("hero", "character" or "title") and the id of its source row.
+The rowid of an entry is derived from (source id, kind).
+
+Triggers on marvel_hero_names, characters and media_titles record every
+insert, rename and delete in search_queue, inside the same transaction
+as the ingest, whichever script does the writing. The ingest scripts
+apply the queue to search_index with two set-wise statements before
+they commit (refresh_search_index does it for any other writer), so
+search() only ever reads.
+The triggers don't write to search_index directly: every trigger step
+runs in its own statement savepoint and FTS5 flushes a new segment at
+each one, which made bulk loads ~30x slower and got worse with size.
+
+create_search_index() is called by create_marvel_db.create_marvel_tables
+and disney_api.setup_database; the first time it sees a source table it
+indexes the rows already there.
+
+    python search.py spider          # prefix search, best matches first
+    python search.py --exact "iron man" --kind hero --limit 5
+    python search.py --rebuild
+"""
+
+import argparse
+import re
+
+import database
+import profiling
+
+# kind -> (source table, id column, text column, rowid code)
+SOURCES = {
+    "hero": ("marvel_hero_names", "id", "name", 0),
+    "character": ("characters", "id", "name", 1),
+    "title": ("media_titles", "title_id", "title", 2),
+}
+KIND_COUNT = len(SOURCES)
+
+DEFAULT_LIMIT = 20
+
+# bm25 has to score every match before the best can be picked, which
+# takes seconds for a one- or two-letter prefix over a million titles.
+# Queries with more matches than this are returned in index order.
+RANKED_MATCH_LIMIT = 20000
+
+# unicode61 with diacritics folded, so "Pokemon" also finds "Pokémon".
+# Without a prefix index FTS5 merges the doclists of every term with a
+# given prefix up front (~250ms for "kari*" over a million titles);
+# indexes for 1-4 characters cost ~20% more space and keep typed-ahead
+# prefixes in the low milliseconds. Longer prefixes match few terms.
+SEARCH_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        name,
+        kind UNINDEXED,
+        ref_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3 4'
+    )
+"""
+
+# words as the unicode61 tokenizer sees them (letters and digits)
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def table_exists(cur, table):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
+
+# pending changes, applied in seq order; a NULL name removes the entry
+SEARCH_QUEUE_SQL = """
+    CREATE TABLE IF NOT EXISTS search_queue (
+        seq INTEGER PRIMARY KEY,
+        entry_rowid INTEGER NOT NULL,
+        name TEXT,
+        kind TEXT,
+        ref_id INTEGER
+    )
+"""
+
+
+def create_source_triggers(cur, kind):
+    """
+    Triggers that queue inserts, deletes and renames in kind's source
+    table for search_index.
+    """
+    table, id_column, text_column, code = SOURCES[kind]
+    rowid = f"{{row}}.{id_column} * {KIND_COUNT} + {code}"
+    insert = (
+        f"INSERT INTO search_queue (entry_rowid, name, kind, ref_id) "
+        f"SELECT {rowid.format(row='NEW')}, NEW.{text_column}, '{kind}', NEW.{id_column} "
+        f"WHERE NEW.{text_column} IS NOT NULL;"
+    )
+    delete = f"INSERT INTO search_queue (entry_rowid) VALUES ({rowid.format(row='OLD')});"
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{table}_after_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {insert}
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{table}_after_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {delete}
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS search_{table}_after_update
+        AFTER UPDATE OF {id_column}, {text_column} ON {table}
+        BEGIN
+            {delete}
+            {insert}
+        END
+    """)
+
+
+def index_source(cur, kind):
+    """
+    Add every row of kind's source table to search_index.
+    """
+    table, id_column, text_column, code = SOURCES[kind]
+    cur.execute(f"""
+        INSERT INTO search_index (rowid, name, kind, ref_id)
+        SELECT {id_column} * {KIND_COUNT} + {code}, {text_column}, '{kind}', {id_column}
+        FROM {table}
+        WHERE {text_column} IS NOT NULL
+    """)
+
+
+def create_search_index(cur):
+    """
+    Create search_index and, for each source table that exists, its
+    triggers. A source without triggers yet (a database built before
+    the search index, or a recreated table) is indexed in full first.
+    Safe to run on every setup.
+    """
+    cur.execute(SEARCH_TABLE_SQL)
+    cur.execute(SEARCH_QUEUE_SQL)
+    apply_search_queue(cur)
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    triggers = {row[0] for row in cur.fetchall()}
+
+    for kind, (table, _, _, _) in SOURCES.items():
+        if f"search_{table}_after_insert" in triggers or not table_exists(cur, table):
+            continue
+        cur.execute("DELETE FROM search_index WHERE kind = ?", (kind,))
+        index_source(cur, kind)
+        create_source_triggers(cur, kind)
+
+
+def apply_search_queue(cur):
+    """
+    Bring search_index up to date with the queued changes. Entries with
+    a queued removal are deleted, then the latest queued name of every
+    touched entry is inserted. Returns the number of queued changes.
+    """
+    cur.execute("SELECT count(*) FROM search_queue")
+    pending = cur.fetchone()[0]
+    if not pending:
+        return 0
+    cur.execute("""
+        DELETE FROM search_index
+        WHERE rowid IN (SELECT entry_rowid FROM search_queue WHERE name IS NULL)
+    """)
+    # with MAX(), SQLite takes the bare columns from the row holding the max
+    cur.execute("""
+        INSERT INTO search_index (rowid, name, kind, ref_id)
+        SELECT entry_rowid, name, kind, ref_id FROM (
+            SELECT entry_rowid, name, kind, ref_id, MAX(seq)
+            FROM search_queue
+            GROUP BY entry_rowid
+        )
+        WHERE name IS NOT NULL
+    """)
+    cur.execute("DELETE FROM search_queue")
+    return pending
+
+
+def refresh_search_index(db_path=None):
+    """
+    Apply and commit the queued changes, for writes to the source tables
+    made outside the ingest scripts. Returns the number applied.
+    """
+    conn = database.get_connection(db_path)
+    try:
+        with profiling.timer("search.apply_queue"):
+            pending = apply_search_queue(conn.cursor())
+        conn.commit()
+    finally:
+        database.release_connection(conn)
+    return pending
+
+
+def rebuild_search_index(cur):
+    """
+    Refill search_index from the source tables and compact it.
+    """
+    # dropping is much faster than deleting every row of an FTS5 table,
+    # and nothing but this module refers to search_index
+    cur.execute("DELETE FROM search_queue")
+    cur.execute("DROP TABLE IF EXISTS search_index")
+    cur.execute(SEARCH_TABLE_SQL)
+    for kind, (table, _, _, _) in SOURCES.items():
+        if table_exists(cur, table):
+            index_source(cur, kind)
+    cur.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+
+def build_match_query(text, prefix=True):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must
+    match, as a prefix if prefix is true. Words are quoted, so FTS5
+    operators and punctuation in the input are treated as plain text.
+    Returns None if text has no words.
+
+    A prefix query is OR-ed with the whole-word query; bm25 scores both
+    halves, so "hero 12" ranks "Hero 12" above "Hero 120".
+    """
+    words = _TOKEN.findall(text)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    exact = " AND ".join(quoted)
+    if not prefix:
+        return exact
+    return f"({exact}) OR ({' AND '.join(q + '*' for q in quoted)})"
+
+
+@profiling.timed("search.search")
+def search(text, kinds=None, limit=DEFAULT_LIMIT, prefix=True, db_path=None):
+    """
+    Search hero names, Disney characters and media titles.
+
+    Parameters:
+      text:   the words to look for ("spider man", "frozen")
+      kinds:  restrict to some of "hero", "character", "title"
+      limit:  maximum number of results
+      prefix: match words as prefixes ("spi" finds "Spider-Man");
+              False matches whole words only
+
+    Read-only: the index reflects the tables as of the last ingest (or
+    refresh_search_index call).
+
+    Returns:
+      list of (kind, id, name, rank), best match first. id is the hero
+      id, the characters.id or the media_titles.title_id; rank is the
+      FTS5 bm25 score (lower is better). A name shared by several heroes
+      gives one result per hero. If the query matches more than
+      RANKED_MATCH_LIMIT entries, results are in index order and rank
+      is None.
+    """
+    query = build_match_query(text, prefix)
+    if query is None or limit <= 0:
+        return []
+    # the kind is filtered on the rowid code; reading the kind column
+    # would fetch the stored row of every match before ranking
+    kind_filter = ""
+    if kinds:
+        codes = ", ".join(str(SOURCES[kind][3]) for kind in kinds)
+        kind_filter = f"AND rowid % {KIND_COUNT} IN ({codes})"
+
+    conn = database.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT count(*) FROM (
+                SELECT 1 FROM search_index
+                WHERE search_index MATCH ? {kind_filter}
+                LIMIT ?
+            )
+        """, (query, RANKED_MATCH_LIMIT + 1))
+        ranked = cur.fetchone()[0] <= RANKED_MATCH_LIMIT
+
+        cur.execute(f"""
+            SELECT kind, ref_id, name, {"rank" if ranked else "NULL"}
+            FROM search_index
+            WHERE search_index MATCH ? {kind_filter}
+            ORDER BY {"rank, " if ranked else ""}rowid
+            LIMIT ?
+        """, (query, limit))
+        hits = cur.fetchall()
+
+        # hero hits are names; expand them to the heroes that carry them
+        name_ids = [ref_id for kind, ref_id, _, _ in hits if kind == "hero"]
+        heroes = {}
+        for i in range(0, len(name_ids), 500):
+            chunk = name_ids[i:i + 500]
+            cur.execute(f"""
+                SELECT name_id, id FROM marvel_heroes
+                WHERE name_id IN ({", ".join("?" for _ in chunk)})
+                ORDER BY id
+            """, chunk)
+            for name_id, hero_id in cur.fetchall():
+                heroes.setdefault(name_id, []).append(hero_id)
+    finally:
+        database.release_connection(conn)
+
+    results = []
+    for kind, ref_id, name, rank in hits:
+        if kind == "hero":
+            results.extend(("hero", hero_id, name, rank) for hero_id in heroes.get(ref_id, []))
+        else:
+            results.append((kind, ref_id, name, rank))
+    return results[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search heroes, Disney characters and titles")
+    parser.add_argument("text", nargs="*", help="words to search for")
+    parser.add_argument("--kind", action="append", choices=sorted(SOURCES),
+                        help="only this kind of result (repeatable)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--exact", action="store_true",
+                        help="match whole words instead of prefixes")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="rebuild the index from the source tables")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        create_search_index(cur)
+        rebuild_search_index(cur)
+        conn.commit()
+        database.release_connection(conn)
+        print("Search index rebuilt.")
+        if not args.text:
+            return
+
+    results = search(" ".join(args.text), kinds=args.kind, limit=args.limit, prefix=not args.exact)
+    if not results:
+        print("No matches.")
+    for kind, ref_id, name, rank in results:
+        score = "unranked" if rank is None else f"{rank:.2f}"
+        print(f"{kind:10s} {ref_id:8d}  {name}  ({score})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """
+    Point the project at a new, empty database in a temporary directory
+    (also the working directory, for the reports written there).
+    """
+    saved = database.get_db_path()
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "final_project.db")
+    database.set_db_path(path)
+    yield path
+    database.close_all()
+    database.set_db_path(saved)
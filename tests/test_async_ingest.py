@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import io
+import sqlite3
+import time
+
+import pytest
+
+import async_ingest
+import create_marvel_db
+import marvel_api
+import marvel_similarity
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_heroes
+
+
+def test_async_marvel_ingest_updates_similarity_index(empty_db):
+    heroes = make_heroes(40)
+    marvel_similarity.clear_cache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+        marvel_api.store_marvel_data(heroes[:20])
+    indexed = set(marvel_similarity.get_index()["ids"])
+    assert indexed and max(indexed) <= 20
+
+    server, base_url = start_mock_server(heroes=heroes)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = async_ingest.main(disney=False, bulk=True, use_aiohttp=False,
+                                       marvel_url=f"{base_url}/all.json")
+    finally:
+        stop_mock_server(server)
+        marvel_similarity.clear_cache()
+
+    assert result["marvel"] == 20
+    # a fresh process would load the saved index from disk
+    saved = marvel_similarity.load_index(marvel_similarity.get_index_path())
+    assert {hero_id for hero_id in saved["ids"] if hero_id > 20}
+
+
+def disney_pages(count, size=4):
+    characters = [{"_id": i, "name": f"Character {i}", "films": [f"Film {i}"]}
+                  for i in range(1, count + 1)]
+    return [characters[i:i + size] for i in range(0, count, size)]
+
+
+def test_restarted_disney_ingest_reports_the_saved_cursor(empty_db):
+    pages = disney_pages(12)
+    server, base_url = start_mock_server(disney_pages=pages)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            async_ingest.main(marvel=False, use_aiohttp=False, disney_url=f"{base_url}/character")
+    finally:
+        stop_mock_server(server)
+
+    # a second run in the same process, from page 1, that stops after one page
+    server, base_url = start_mock_server(disney_pages=pages[:1])
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            async_ingest.main(marvel=False, use_aiohttp=False, resume=False,
+                              disney_url=f"{base_url}/character")
+    finally:
+        stop_mock_server(server)
+    assert "resume cursor: page 3" in out.getvalue()
+
+
+def test_writer_failure_stops_the_ingest(empty_db, monkeypatch):
+    def broken(db_path=None):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(async_ingest.database, "get_connection", broken)
+
+    server, base_url = start_mock_server(disney_pages=disney_pages(12))
+    start = time.perf_counter()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            asyncio.run(asyncio.wait_for(
+                async_ingest.run_ingest(marvel=False, use_aiohttp=False,
+                                        disney_url=f"{base_url}/character"),
+                timeout=10,
+            ))
+    finally:
+        stop_mock_server(server)
+    # raised as soon as the writer failed, not when the timeout hit
+    assert time.perf_counter() - start < 5
+
+
+def test_async_fetch_refetches_on_304_with_nothing_cached(empty_db):
+    heroes = make_heroes(5)
+    server, base_url = start_mock_server(heroes=heroes)
+    server.spurious_not_modified = 1
+
+    async def fetch():
+        client = async_ingest.make_client(use_aiohttp=False)
+        try:
+            return await async_ingest.fetch_all_heroes_async(client, f"{base_url}/all.json")
+        finally:
+            await client.close()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fetched = asyncio.run(fetch())
+    finally:
+        stop_mock_server(server)
+
+    assert fetched == heroes
+    assert server.request_log == ["/all.json", "/all.json"]
@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+
+import build_cache
+import create_marvel_db
+import database
+import disney_api
+
+
+def setup_tables():
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_marvel_db.create_marvel_tables()
+        disney_api.setup_database()
+
+
+def build_reports(**kwargs):
+    before = dict(build_cache.CACHE_STATS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_cache.build_reports(**kwargs)
+    return {k: build_cache.CACHE_STATS[k] - before[k] for k in ("hits", "misses")}
+
+
+def test_reports_are_rebuilt_only_when_needed(empty_db):
+    setup_tables()
+    assert build_reports() == {"hits": 0, "misses": 2}
+    assert build_reports() == {"hits": 2, "misses": 0}
+    assert build_reports(force=True) == {"hits": 0, "misses": 2}
+
+    os.remove(build_cache.MARVEL_REPORT)
+    assert build_reports() == {"hits": 1, "misses": 1}
+
+
+def test_manifest_lives_next_to_the_outputs(empty_db, tmp_path, monkeypatch):
+    setup_tables()
+    build_reports()
+    assert os.path.exists(tmp_path / build_cache.MANIFEST_PATH)
+
+    # the same outputs, checked from another directory
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    key = build_cache.artifact_key({"a": 1}, ["calculations"])
+    built = build_cache.cached_build("x.txt", key, [str(tmp_path / "x.txt")],
+                                     lambda: (tmp_path / "x.txt").write_text("x"))
+    assert built
+    monkeypatch.chdir(tmp_path)
+    assert not build_cache.cached_build("x.txt", key, ["x.txt"], lambda: None)
+    assert not os.path.exists(elsewhere / build_cache.MANIFEST_PATH)
+
+
+def test_reports_follow_their_source_tables(empty_db, monkeypatch):
+    import marvel_analysis
+
+    setup_tables()
+    build_reports()
+
+    # up to date: the analytics are not run at all
+    def fail(*args):
+        raise AssertionError("analytics ran for an up-to-date report")
+    with monkeypatch.context() as m:
+        m.setattr(marvel_analysis, "top_k_power_index", fail)
+        assert build_reports() == {"hits": 2, "misses": 0}
+
+    conn = database.get_connection()
+    conn.execute("INSERT INTO characters (id, name) VALUES (1, 'Mickey Mouse')")
+    conn.commit()
+    database.release_connection(conn)
+    assert build_reports() == {"hits": 1, "misses": 1}
+
+
+def test_unchanged_reports_are_checked_without_scanning_tables(empty_db):
+    setup_tables()
+    build_reports()
+
+    statements = []
+    conn = database.get_connection()
+    conn.set_trace_callback(statements.append)
+    database.release_connection(conn)
+    assert build_reports() == {"hits": 2, "misses": 0}
+    conn = database.get_connection()
+    conn.set_trace_callback(None)
+    database.release_connection(conn)
+    assert not any(s.lstrip().upper().startswith("SELECT *") for s in statements), statements
+
+
+def test_verify_catches_changes_behind_the_counters(empty_db):
+    setup_tables()
+    build_reports()
+    assert build_reports(verify=True) == {"hits": 0, "misses": 2}
+    assert build_reports(verify=True) == {"hits": 2, "misses": 0}
+
+    # a write whose counter bump is undone, as if made without the triggers
+    conn = database.get_connection()
+    conn.execute("INSERT INTO characters (id, name) VALUES (1, 'Mickey Mouse')")
+    conn.execute("UPDATE disney_data_version SET version = version - 1")
+    conn.commit()
+    database.release_connection(conn)
+    assert build_reports() == {"hits": 2, "misses": 0}
+    assert build_reports(verify=True) == {"hits": 1, "misses": 1}
+
+
+def test_rebuilding_the_summaries_rebuilds_the_report(empty_db):
+    import marvel_analysis
+    from benchmarks.fixtures import populate_database
+    from benchmarks.synthetic import make_heroes
+
+    populate_database(str(empty_db), heroes=make_heroes(20))
+    conn = database.get_connection()
+    conn.execute("UPDATE marvel_power_index SET power_index = 999 WHERE hero_id = 1")
+    conn.commit()
+    database.release_connection(conn)
+    build_reports()
+    with open(build_cache.MARVEL_REPORT, encoding="utf-8") as f:
+        assert "999.00" in f.read()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        marvel_analysis.rebuild_materialized()
+        assert marvel_analysis.check_materialized()
+    assert build_reports() == {"hits": 1, "misses": 1}
+    with open(build_cache.MARVEL_REPORT, encoding="utf-8") as f:
+        assert "999.00" not in f.read()
@@ -0,0 +1,97 @@
+import contextlib
+import io
+
+import pytest
+
+import database
+import disney_api
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+
+DISNEY_TABLES = ["characters", "media_titles", "character_media", "crawl_state"]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(disney_api, "BACKOFF_SECONDS", 0.001)
+    # 24 characters with one film each, in 6 pages: one run stores them
+    # all (MAX_PER_RUN is 25)
+    characters = [{"_id": i, "name": f"Character {i}", "films": [f"Film {i % 5}"]}
+                  for i in range(1, 25)]
+    pages = [characters[i:i + 4] for i in range(0, 24, 4)]
+    server, base_url = start_mock_server(disney_pages=pages)
+    server.url = f"{base_url}/character"
+    yield server
+    stop_mock_server(server)
+
+
+def crawl(server, concurrency):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return disney_api.store_characters(server.url, concurrency=concurrency)
+
+
+def dump_tables():
+    conn = database.get_connection()
+    cur = conn.cursor()
+    rows = {}
+    for table in DISNEY_TABLES:
+        cur.execute(f"SELECT * FROM {table} ORDER BY 1, 2")
+        rows[table] = cur.fetchall()
+    database.release_connection(conn)
+    return rows
+
+
+def stored_cursor():
+    conn = database.get_connection()
+    cursor = disney_api.get_crawl_cursor(conn.cursor())
+    database.release_connection(conn)
+    return cursor
+
+
+def page_requests(server, page):
+    return sum(path.endswith(f"page={page}") for path in server.request_log)
+
+
+def test_concurrent_crawl_stores_the_same_rows_as_a_serial_one(empty_db, tmp_path, server):
+    crawl(server, concurrency=1)
+    serial = dump_tables()
+    assert len(serial["characters"]) == 24
+
+    database.set_db_path(str(tmp_path / "concurrent.db"))
+    crawl(server, concurrency=4)
+    assert dump_tables() == serial
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_transient_failures_are_retried(empty_db, server, concurrency):
+    server.page_failures = {2: [503, "drop"], 4: [429, 500, 502]}
+    counts = crawl(server, concurrency)
+
+    assert counts["characters"] == 24
+    assert stored_cursor() == 6
+    assert page_requests(server, 2) == 3
+    assert page_requests(server, 4) == 4
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_client_error_ends_the_crawl_without_moving_the_cursor(empty_db, server, concurrency):
+    server.page_failures = {3: [403] * 10}
+    counts = crawl(server, concurrency)
+
+    # pages 1 and 2 only; the failed page is not retried
+    assert counts["characters"] == 8
+    assert stored_cursor() == 2
+    assert page_requests(server, 3) == 1
+
+    # the next run resumes at the page that failed
+    server.page_failures = {}
+    assert crawl(server, concurrency)["characters"] == 16
+    assert stored_cursor() == 6
+
+
+def test_page_still_failing_after_retries_ends_the_crawl(empty_db, server):
+    server.page_failures = {2: [503] * (disney_api.MAX_RETRIES + 1)}
+    counts = crawl(server, concurrency=1)
+
+    assert counts["characters"] == 4
+    assert stored_cursor() == 1
+    assert page_requests(server, 2) == disney_api.MAX_RETRIES + 1
@@ -0,0 +1,47 @@
+import re
+
+import pytest
+
+import database
+import disney_api
+import disney_stats
+from benchmarks.bench_disney_indexes import QUERIES, build_legacy_database
+
+# plan lines that read character_media (as "cm" or by name)
+CHARACTER_MEDIA_ACCESS = re.compile(r"^(SCAN|SEARCH) (cm|character_media)\b")
+
+# per-character aggregates over every row: a scan is needed, but only
+# of the (character_id, type_id) covering index
+AGGREGATE_SCANS = {disney_stats.CHARACTER_STATS_SQL}
+
+
+def character_media_plan(cur, sql):
+    cur.execute("EXPLAIN QUERY PLAN " + sql)
+    return [row[3] for row in cur.fetchall() if CHARACTER_MEDIA_ACCESS.match(row[3])]
+
+
+@pytest.mark.parametrize("schema, covering_index", [
+    # the UNIQUE(character_id, type_id, title_id) constraint's index
+    ("current", "sqlite_autoindex_character_media_1"),
+    # a database from before the constraint, after migration
+    ("legacy", disney_api.CHARACTER_SIDE_INDEX[0]),
+])
+def test_no_full_scans_of_character_media(empty_db, schema, covering_index):
+    conn = database.get_connection()
+    cur = conn.cursor()
+    if schema == "legacy":
+        build_legacy_database(cur, 200, 2000)
+    else:
+        disney_api.setup_database()
+    disney_api.migrate_disney_schema(cur)
+    conn.commit()
+
+    for name, sql in QUERIES.items():
+        plan = character_media_plan(cur, sql)
+        assert plan, name
+        for detail in plan:
+            if sql in AGGREGATE_SCANS:
+                assert detail == f"SCAN character_media USING COVERING INDEX {covering_index}", name
+            else:
+                assert detail.startswith("SEARCH "), (name, detail)
+    database.release_connection(conn)
@@ -0,0 +1,92 @@
+import pytest
+
+import database
+import disney_api
+import disney_graph
+import disney_stats
+from benchmarks.synthetic import make_disney_characters
+
+
+def store(characters):
+    conn = database.get_connection()
+    cur = conn.cursor()
+    disney_api.seed_media_types(cur)
+    type_ids = disney_api.load_type_ids(cur)
+    counts = {"characters": 0, "media": 0, "titles": 0}
+    disney_api.store_page(cur, characters, set(), type_ids, {}, counts, float("inf"))
+    conn.commit()
+    database.release_connection(conn)
+
+
+def execute(sql, params=()):
+    conn = database.get_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    database.release_connection(conn)
+
+
+def test_cache_sees_updates_that_keep_row_counts(empty_db):
+    disney_api.setup_database()
+    disney_stats.clear_cache()
+    disney_graph.clear_cache()
+    store([
+        {"_id": 1, "name": "Mickey", "films": ["Fantasia"], "tvShows": []},
+        {"_id": 2, "name": "Minnie", "films": ["Fantasia"]},
+        {"_id": 3, "name": "Goofy"},
+    ])
+    assert disney_stats.top_by_appearances(1) == [("Mickey", 1)]
+    before = disney_graph.get_coappearance()
+
+    # same row counts, same highest character_media id
+    execute("UPDATE characters SET name = 'Mickey Mouse' WHERE id = 1")
+    assert disney_stats.top_by_appearances(1) == [("Mickey Mouse", 1)]
+    execute("UPDATE character_media SET character_id = 3 WHERE character_id = 2")
+    assert disney_graph.get_coappearance() is not before
+    assert disney_graph.coappearances(1) == [(3, "Goofy", 1)]
+
+
+def test_unchanged_tables_are_served_from_the_cache(empty_db):
+    disney_api.setup_database()
+    disney_stats.clear_cache()
+    store([{"_id": 1, "name": "Mickey", "films": ["Fantasia"]}])
+    assert disney_stats.get_character_stats() is disney_stats.get_character_stats()
+
+
+def test_top_connected_with_nothing_requested(empty_db):
+    disney_api.setup_database()
+    disney_graph.clear_cache()
+    store([
+        {"_id": 1, "name": "Mickey", "films": ["Fantasia"]},
+        {"_id": 2, "name": "Minnie", "films": ["Fantasia"]},
+    ])
+    assert disney_graph.top_connected(0) == []
+    assert disney_graph.top_connected(-1, by="strength") == []
+    assert [cid for cid, _, _, _ in disney_graph.top_connected(1)] == [1]
+
+    with pytest.raises(ValueError):
+        disney_graph.top_connected(1, by="appearances")
+
+
+def graph_lists(graph):
+    return {key: [int(v) for v in graph[key]] for key in
+            ("character_ids", "indptr", "indices", "counts", "degree", "strength")}
+
+
+@pytest.mark.parametrize("engine, needs", [("scipy", "scipy"), ("numpy", "numpy")])
+def test_engines_build_the_same_graph(empty_db, monkeypatch, engine, needs):
+    pytest.importorskip(needs)
+    disney_api.setup_database()
+    # a few titles with a large cast, many with a small one
+    characters = make_disney_characters(300, title_pool=40, max_titles=3)
+    characters.append({"_id": 301, "name": "Loner", "films": ["Only Me"]})
+    store(characters)
+
+    conn = database.get_connection()
+    cur = conn.cursor()
+    expected = graph_lists(disney_graph.compute_coappearance(cur, "sql"))
+    assert graph_lists(disney_graph.compute_coappearance(cur, engine)) == expected
+    if engine == "numpy":
+        # pairs expanded a few at a time, big titles split across chunks
+        monkeypatch.setattr(disney_graph, "PAIR_BUDGET", 50)
+        assert graph_lists(disney_graph.compute_coappearance(cur, engine)) == expected
+    database.release_connection(conn)
@@ -0,0 +1,125 @@
+import contextlib
+import io
+import threading
+
+import pytest
+
+import database
+import disney_api
+import disney_stats
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+
+PAGE_SIZE = 4
+
+
+def make_pages(count, renamed=()):
+    characters = [
+        {"_id": i, "name": f"Renamed {i}" if i in renamed else f"Character {i}",
+         "films": [f"Film {i}"]}
+        for i in range(1, count + 1)
+    ]
+    return [characters[i:i + PAGE_SIZE] for i in range(0, count, PAGE_SIZE)]
+
+
+@pytest.fixture
+def api():
+    """start(pages) serves the pages and returns the character url"""
+    servers = []
+
+    def start(pages):
+        server, base_url = start_mock_server(disney_pages=pages)
+        servers.append(server)
+        return f"{base_url}/character"
+
+    yield start
+    for server in servers:
+        stop_mock_server(server)
+
+
+def stored_cursor():
+    conn = database.get_connection()
+    cursor = disney_api.get_crawl_cursor(conn.cursor())
+    database.release_connection(conn)
+    return cursor
+
+
+def quietly(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def test_sync_renames_show_up_in_cached_stats(empty_db, api):
+    disney_stats.clear_cache()
+    quietly(disney_api.store_characters, api(make_pages(12)), concurrency=1)
+    names = {name for _, name, _, _ in disney_stats.get_character_stats()["characters"]}
+    assert "Character 3" in names
+
+    result = quietly(disney_api.sync_characters, api(make_pages(12, renamed={3})), concurrency=1)
+    assert result["updated"] == 1
+    names = {name for _, name, _, _ in disney_stats.get_character_stats()["characters"]}
+    assert "Renamed 3" in names and "Character 3" not in names
+
+
+@pytest.mark.parametrize("rerun", ["restart", "sync"])
+def test_cursor_never_moves_back(empty_db, api, rerun):
+    quietly(disney_api.store_characters, api(make_pages(12)), concurrency=1)
+    assert stored_cursor() == 3
+
+    # a run from page 1 that stops after one page (as if interrupted)
+    url = api(make_pages(12)[:1])
+    if rerun == "restart":
+        quietly(disney_api.store_characters, url, concurrency=1, resume=False)
+    else:
+        quietly(disney_api.sync_characters, url, concurrency=1)
+    assert stored_cursor() == 3
+
+
+def test_capped_sync_adds_no_media_less_characters(empty_db, api):
+    # 10 films each: the media cap is reached on the first page
+    pages = make_pages(40)
+    for page in pages:
+        for character in page:
+            character["films"] = [f"Film {character['_id']}.{n}" for n in range(10)]
+
+    result = quietly(disney_api.sync_characters, api(pages), concurrency=1)
+    assert 0 < result["new"] < disney_api.MAX_PER_RUN
+    assert result["new_waiting"] == 40 - result["new"]
+
+    conn = database.get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*) FROM characters
+        WHERE id NOT IN (SELECT character_id FROM character_media);
+    """)
+    assert cur.fetchone()[0] == 0
+    database.release_connection(conn)
+
+
+class InterleavingLock:
+    """a write lock that lets another writer into the database each time it is released"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.other_writes = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        # fails with "database is locked" if the crawl kept its transaction open
+        conn = database.connect()
+        conn.execute("PRAGMA busy_timeout = 100")
+        conn.execute("INSERT INTO media_titles (title) VALUES (?)", (f"Other {self.other_writes}",))
+        conn.commit()
+        conn.close()
+        self.other_writes += 1
+
+
+def test_crawl_holds_the_write_lock_per_page(empty_db, api):
+    lock = InterleavingLock()
+    counts = quietly(disney_api.store_characters, api(make_pages(12)), concurrency=1, write_lock=lock)
+    assert counts["characters"] == 12
+    # setup, start of the crawl, three pages, end of the crawl
+    assert lock.other_writes == 6
+    assert stored_cursor() == 3
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+import marvel_api
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_heroes
+
+
+@pytest.fixture
+def server(empty_db):
+    """the mock API serving a small all.json; the cache goes next to empty_db"""
+    server, base_url = start_mock_server(heroes=make_heroes(5))
+    server.url = f"{base_url}/all.json"
+    yield server
+    stop_mock_server(server)
+
+
+def fetch(server, ttl=marvel_api.CACHE_TTL_SECONDS):
+    """fetch_cached, returning (path, counter changes, requests made)"""
+    before = dict(marvel_api.CACHE_STATS)
+    requests_before = len(server.request_log)
+    path = marvel_api.fetch_cached(server.url, ttl=ttl)
+    changes = {k: marvel_api.CACHE_STATS[k] - before[k] for k in before}
+    return path, changes, len(server.request_log) - requests_before
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_first_fetch_is_a_miss(server):
+    path, changes, requests = fetch(server)
+    assert changes == {"hits": 0, "misses": 1, "revalidated": 0}
+    assert requests == 1
+    assert read(path) == server.heroes_body
+    meta = marvel_api.load_cache_meta(marvel_api.get_cache_paths(server.url)[1])
+    assert meta["etag"] == server.heroes_etag
+
+
+def test_fresh_copy_is_a_hit_without_a_request(server):
+    fetch(server)
+    path, changes, requests = fetch(server)
+    assert changes == {"hits": 1, "misses": 0, "revalidated": 0}
+    assert requests == 0
+    assert read(path) == server.heroes_body
+
+
+def test_expired_copy_is_revalidated(server):
+    fetch(server)
+    path, changes, requests = fetch(server, ttl=0)
+    assert changes == {"hits": 1, "misses": 0, "revalidated": 1}
+    assert requests == 1
+    assert server.request_log[-1] == "/all.json"
+    assert read(path) == server.heroes_body
+
+
+def test_stale_copy_is_used_when_the_network_fails(server):
+    fetch(server)
+    stop_mock_server(server)
+    path, changes, _ = fetch(server, ttl=0)
+    assert changes == {"hits": 1, "misses": 0, "revalidated": 0}
+    assert json.loads(read(path)) == json.loads(server.heroes_body)
+
+
+def test_not_modified_with_nothing_cached_refetches(server):
+    server.spurious_not_modified = 1
+    path, changes, requests = fetch(server)
+    assert changes == {"hits": 0, "misses": 1, "revalidated": 0}
+    assert requests == 2
+    assert read(path) == server.heroes_body
+    assert os.path.getsize(path) > 0
@@ -0,0 +1,82 @@
+import contextlib
+import io
+
+import pytest
+
+import database
+import marvel_analysis
+from benchmarks.fixtures import populate_database
+from benchmarks.synthetic import make_heroes
+
+
+def assert_materialized():
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        ok = marvel_analysis.check_materialized()
+    assert ok, out.getvalue()
+
+
+def write(sql, params=()):
+    conn = database.get_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    database.release_connection(conn)
+
+
+def test_summaries_follow_inserts_updates_and_deletes(empty_db):
+    populate_database(str(empty_db), heroes=make_heroes(60))
+    assert_materialized()
+
+    write("UPDATE marvel_powerstats SET strength = 100, speed = NULL WHERE hero_id = 3")
+    write("UPDATE marvel_powerstats SET intelligence = intelligence + 1")
+    write("""UPDATE marvel_powerstats SET intelligence = 55, strength = 55, speed = 55,
+             durability = 55, power = 55, combat = 55 WHERE hero_id = 7""")
+    assert_materialized()
+    assert dict((h, p) for h, _, p in marvel_analysis.calculate_power_index())[7] == 55.0
+
+    # move heroes between alignments, to and from NULL
+    conn = database.get_connection()
+    alignment_ids = [row[0] for row in conn.execute("SELECT id FROM marvel_alignments")]
+    database.release_connection(conn)
+    write("UPDATE marvel_heroes SET alignment_id = ? WHERE id <= 20", (alignment_ids[0],))
+    write("UPDATE marvel_heroes SET alignment_id = NULL WHERE id BETWEEN 21 AND 30")
+    write("UPDATE marvel_heroes SET alignment_id = ? WHERE id = 25", (alignment_ids[-1],))
+    assert_materialized()
+
+    write("DELETE FROM marvel_powerstats WHERE hero_id % 4 = 0")
+    assert_materialized()
+
+    write("""INSERT INTO marvel_powerstats (hero_id, intelligence, strength, speed,
+             durability, power, combat) VALUES (8, 10, 20, NULL, 40, 50, 60)""")
+    write("UPDATE marvel_powerstats SET strength = NULL, combat = NULL WHERE hero_id = 8")
+    assert_materialized()
+
+
+def test_numpy_columns_follow_in_place_updates(empty_db):
+    pytest.importorskip("numpy")
+    populate_database(str(empty_db), heroes=make_heroes(40))
+    before = marvel_analysis.calculate_stat_percentiles((50,))
+
+    write("UPDATE marvel_powerstats SET strength = 1000")
+    after = marvel_analysis.calculate_stat_percentiles((50,))
+    assert before["strength"][50] != 1000.0
+    assert after["strength"][50] == 1000.0
+
+
+def test_top_k_agrees_with_the_full_ranking_on_ties(empty_db):
+    populate_database(str(empty_db), heroes=make_heroes(30))
+    # only three distinct power-index values, in no particular id order
+    write("""UPDATE marvel_powerstats SET intelligence = (hero_id * 7) % 3 * 10,
+             strength = NULL, speed = NULL, durability = NULL, power = NULL, combat = NULL""")
+    ranking = marvel_analysis.calculate_power_index()
+    n = len(ranking)
+    assert n == 30
+    assert [hero_id for hero_id, _, _ in ranking[:3]] == [2, 5, 8]
+
+    shuffled = sorted(ranking, key=lambda row: (row[0] * 11) % 31)
+    for k in (0, 1, 5, 10, 11, n - 1, n, n + 5):
+        expected = ranking[:k]
+        assert marvel_analysis.top_k_power_index(k) == expected, k
+        assert marvel_analysis.top_k_rows(shuffled, k) == expected, k
+        assert marvel_analysis.top_k_rows(iter(shuffled), k) == expected, k
+        assert marvel_analysis.calculate_power_index(top_n=k) == expected, k
+        assert marvel_analysis.recompute_power_index_sql(top_n=k) == expected, k
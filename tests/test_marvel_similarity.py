@@ -0,0 +1,48 @@
+import sqlite3
+
+import database
+import marvel_similarity
+from benchmarks.fixtures import populate_database
+from benchmarks.synthetic import make_heroes
+
+
+def test_hero_names_under_the_old_placeholder_limit(empty_db):
+    populate_database(str(empty_db), heroes=make_heroes(1200))
+
+    # the pooled connection get_hero_names will use, limited like an
+    # sqlite built with the old default of 999 ? placeholders
+    conn = database.get_connection()
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    database.release_connection(conn)
+
+    names = marvel_similarity.get_hero_names(range(1, 1201))
+    assert len(names) == 1200
+    assert marvel_similarity.get_hero_names([]) == {}
+
+
+def test_lookups_only_read_the_counter_until_stats_change(empty_db):
+    populate_database(str(empty_db), heroes=make_heroes(200))
+    marvel_similarity.clear_cache()
+    first = marvel_similarity.similar_heroes(1, k=3)
+
+    statements = []
+    conn = database.get_connection()
+    conn.set_trace_callback(statements.append)
+    database.release_connection(conn)
+    assert marvel_similarity.similar_heroes(1, k=3) == first
+    assert not any("marvel_powerstats" in s for s in statements), statements
+
+    # move hero 2 onto hero 1's stats: it must become the nearest one
+    conn = database.get_connection()
+    conn.set_trace_callback(None)
+    conn.execute("""
+        UPDATE marvel_powerstats SET
+            (intelligence, strength, speed, durability, power, combat) =
+            (SELECT intelligence, strength, speed, durability, power, combat
+             FROM marvel_powerstats WHERE hero_id = 1)
+        WHERE hero_id = 2
+    """)
+    conn.commit()
+    database.release_connection(conn)
+    hero_id, _, distance = marvel_similarity.similar_heroes(1, k=1)[0]
+    assert (hero_id, distance) == (2, 0.0)
@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+from benchmarks.bench_marvel_sql_ingest import (
+    EDGE_CASE_HEROES,
+    MARVEL_TABLES,
+    load_python,
+    load_sql,
+    run_path,
+)
+from benchmarks.synthetic import make_heroes
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_python_and_sql_ingest_store_identical_rows(empty_db, tmp_path, bulk):
+    json_text = json.dumps(make_heroes(200) + EDGE_CASE_HEROES)
+    _, python_rows = run_path(str(tmp_path), "python",
+                              lambda text: load_python(text, bulk), json_text)
+    _, sql_rows = run_path(str(tmp_path), "sql",
+                           lambda text: load_sql(text, bulk), json_text)
+
+    assert python_rows["marvel_heroes"]
+    for table in MARVEL_TABLES:
+        assert python_rows[table] == sql_rows[table], table
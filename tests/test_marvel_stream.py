@@ -0,0 +1,82 @@
+import json
+import random
+
+import pytest
+
+import marvel_api
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(["int", "float", "exp", "string", "literal", "list", "object"]
+                      if depth < 3 else ["int", "float", "string", "literal"])
+    if kind == "int":
+        return rng.randint(-10**6, 10**6)
+    if kind == "float":
+        return round(rng.uniform(-1000, 1000), rng.randint(0, 6))
+    if kind == "exp":
+        return rng.choice([1.5e-7, -2e21, 3.25e10, 6.02e23])
+    if kind == "string":
+        return "".join(rng.choice('ab "\\/\n\tçé€😀') for _ in range(rng.randint(0, 8)))
+    if kind == "literal":
+        return rng.choice([True, False, None])
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 3))}
+
+
+def random_chunks(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 12))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_chunk_splits_match_json_loads():
+    rng = random.Random(0)
+    for _ in range(500):
+        array = [random_value(rng) for _ in range(rng.randint(0, 6))]
+        text = json.dumps(array, ensure_ascii=rng.random() < 0.5,
+                          indent=rng.choice([None, 1]))
+        chunks = random_chunks(text, rng)
+        assert list(marvel_api.iter_json_array(chunks)) == json.loads(text), chunks
+
+
+@pytest.mark.parametrize("text", ["[1.5, -2e-3, 10E+2, -0.25]", "[12345, true, null]",
+                                  '["a", {"b": [1, 2.5e1]}, -7]'])
+def test_every_split_point(text):
+    for i in range(1, len(text)):
+        chunks = [text[:i], text[i:]]
+        assert list(marvel_api.iter_json_array(chunks)) == json.loads(text), chunks
+
+
+@pytest.mark.parametrize("chunks", [["[1,]"], ["[1,", "]"], ["[1 2]"], ["[1,"], ["{}"], ["[,1]"]])
+def test_malformed_arrays_are_rejected(chunks):
+    with pytest.raises(ValueError):
+        list(marvel_api.iter_json_array(chunks))
+
+
+def test_large_element_in_small_chunks_is_decoded_a_few_times(monkeypatch):
+    calls = []
+    raw_decode = json.JSONDecoder.raw_decode
+
+    def counting_raw_decode(self, s, idx=0):
+        calls.append(idx)
+        return raw_decode(self, s, idx)
+
+    monkeypatch.setattr(json.JSONDecoder, "raw_decode", counting_raw_decode)
+    text = json.dumps([{"powers": ["x" * 50] * 20000}, 1])
+    chunks = [text[i:i + 100] for i in range(0, len(text), 100)]
+    assert list(marvel_api.iter_json_array(chunks)) == json.loads(text)
+    assert len(calls) < 50
+
+    # truncated: fails at the end of the input after the same few tries
+    calls.clear()
+    with pytest.raises(ValueError):
+        list(marvel_api.iter_json_array(chunks[:-20]))
+    assert len(calls) < 50
+
+
+def test_element_over_the_limit_is_rejected(monkeypatch):
+    monkeypatch.setattr(marvel_api, "MAX_ELEMENT_CHARS", 1000)
+    text = json.dumps([[1] * 200, "x" * 5000])
+    chunks = [text[i:i + 64] for i in range(0, len(text), 64)]
+    with pytest.raises(ValueError, match="longer than"):
+        list(marvel_api.iter_json_array(chunks))
@@ -0,0 +1,51 @@
+import contextlib
+import io
+
+import build_cache
+import marvel_api
+import pipeline
+from benchmarks.synthetic import make_heroes
+
+
+def test_skip_ingest_keeps_order_through_removed_stages():
+    stages = pipeline.select_stages(skip_ingest=True)
+    assert stages["marvel_analytics"][0] == ("marvel_schema",)
+    assert stages["disney_analytics"][0] == ("disney_schema",)
+    assert stages["figures"][0] == ("marvel_analytics", "disney_analytics")
+
+
+def test_only_drops_the_other_branch():
+    stages = pipeline.select_stages(only="disney", skip_ingest=True)
+    assert sorted(stages) == ["disney_analytics", "disney_report", "disney_schema", "figures"]
+    assert stages["figures"][0] == ("disney_analytics",)
+
+
+def test_skip_ingest_on_empty_database(empty_db):
+    results, timings = pipeline.main(skip_ingest=True)
+    for analytics, schema in [("marvel_analytics", "marvel_schema"),
+                              ("disney_analytics", "disney_schema")]:
+        assert timings[analytics][0] >= timings[schema][1]
+    assert results["marvel_analytics"]["top_power_index"] == []
+
+
+def test_pipeline_and_build_reports_share_report_records(empty_db):
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline.main(skip_ingest=True)
+        before = dict(build_cache.CACHE_STATS)
+        build_cache.build_reports()
+        pipeline.main(skip_ingest=True)
+    assert build_cache.CACHE_STATS["misses"] == before["misses"]
+
+
+def test_streamed_marvel_download_runs_outside_the_write_lock(empty_db, monkeypatch):
+    def stream_all_heroes():
+        # the Disney crawl must be able to write while this downloads
+        assert not pipeline.DB_WRITE_LOCK.locked()
+        return iter(make_heroes(10))
+
+    monkeypatch.setattr(marvel_api, "stream_all_heroes", stream_all_heroes)
+    stages = {name: pipeline.STAGES[name]
+              for name in ("marvel_schema", "marvel_fetch", "marvel_store")}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, _ = pipeline.run_pipeline(stages, {"stream": True, "max_new": 4}, max_workers=1)
+    assert results["marvel_store"] == 4
@@ -0,0 +1,37 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+import build_cache
+import render_figures
+
+DATA = {
+    "marvel_top_power_index": [(1, "Hero 1", 80.5), (2, "Hero 2", 61.0)],
+    "marvel_alignment_powerstats": [
+        ("good", {"intelligence": 60.0, "strength": 40.0, "speed": 35.0,
+                  "durability": 55.0, "power": 50.0, "combat": 62.0}),
+        ("bad", {"intelligence": 58.0, "strength": None, "speed": 30.0,
+                 "durability": 50.0, "power": 45.0, "combat": 60.0}),
+    ],
+}
+
+
+def render(tmp_path, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return render_figures.render_all(list(DATA), workers=2, output_dir=str(tmp_path),
+                                         data=DATA, **kwargs)
+
+
+def test_figures_render_in_worker_processes_and_are_cached(tmp_path):
+    pytest.importorskip("matplotlib")
+    assert sorted(render(tmp_path)) == sorted(DATA)
+    for name in DATA:
+        path = tmp_path / render_figures.FIGURES[name][2]
+        with open(path, "rb") as f:
+            assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+
+    assert render(tmp_path) == {}
+    assert os.path.exists(tmp_path / build_cache.MANIFEST_PATH)
+    assert sorted(render(tmp_path, force=True)) == sorted(DATA)
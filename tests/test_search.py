@@ -0,0 +1,62 @@
+import contextlib
+import io
+import sqlite3
+
+import database
+import disney_api
+import marvel_api
+import search
+from benchmarks.fixtures import populate_database
+from benchmarks.mock_server import start_mock_server, stop_mock_server
+from benchmarks.synthetic import make_heroes
+
+
+def pending_changes():
+    conn = database.get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM search_queue")
+    count = cur.fetchone()[0]
+    database.release_connection(conn)
+    return count
+
+
+def test_ingests_update_the_index_and_search_only_reads(empty_db):
+    heroes = make_heroes(20)
+    populate_database(str(empty_db), heroes=heroes[:10])
+    with contextlib.redirect_stdout(io.StringIO()):
+        marvel_api.store_marvel_data(heroes[10:])
+    assert pending_changes() == 0
+    assert search.search(heroes[15]["name"], kinds=["hero"])[0][:3] == ("hero", 16, "Hero 16")
+
+    # a write outside the ingest scripts waits for refresh_search_index
+    conn = database.get_connection()
+    conn.execute("INSERT INTO media_titles (title) VALUES ('Zyzzyva Returns')")
+    conn.commit()
+    database.release_connection(conn)
+    assert search.search("zyzzyva") == []
+    assert pending_changes() == 1
+
+    assert search.refresh_search_index() == 1
+    assert [name for _, _, name, _ in search.search("zyzzyva")] == ["Zyzzyva Returns"]
+
+
+def test_disney_crawl_updates_the_index(empty_db):
+    pages = [[{"_id": 1, "name": "Quuxley Duck", "films": ["Quuxley Goes West"]}]]
+    server, base_url = start_mock_server(disney_pages=pages)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            disney_api.store_characters(f"{base_url}/character", concurrency=1)
+    finally:
+        stop_mock_server(server)
+    found = {(kind, name) for kind, _, name, _ in search.search("quuxley")}
+    assert found == {("character", "Quuxley Duck"), ("title", "Quuxley Goes West")}
+
+
+def test_many_matching_hero_names_under_the_old_placeholder_limit(empty_db):
+    populate_database(str(empty_db), heroes=make_heroes(1200))
+    conn = database.get_connection()
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    database.release_connection(conn)
+
+    results = search.search("Hero", kinds=["hero"], limit=1200)
+    assert sorted(ref_id for _, ref_id, _, _ in results) == list(range(1, 1201))
@@ -1,11 +1,14 @@
 import matplotlib.pyplot as plt
-import sqlite3
-from calculations import calculate_character_stats, DB_NAME
+import disney_stats
+from calculations import get_appearance_summary
 
 def visualize_total_appearances():
     """bar chart for top 10 characters by total media appearances"""
-    stats = calculate_character_stats()
-    top_10 = stats["top_10"]
+    stats = get_appearance_summary()
+    draw_total_appearances(stats["top_10"])
+
+def draw_total_appearances(top_10, out_path=None, show=True):
+    """draws the bar chart from (name, count) rows; saves it if out_path is given"""
     names = [x[0] for x in top_10]
     counts = [x[1] for x in top_10]
 
@@ -15,33 +18,25 @@ def visualize_total_appearances():
     plt.title("Top 10 Disney Characters by Total Media Appearances")
     plt.ylabel("Number of Appearances")
     plt.tight_layout()
-    plt.show()
+    if out_path:
+        plt.savefig(out_path)
+    if show:
+        plt.show()
+    plt.close()
 
-def get_media_spread_and_total(db_path=DB_NAME, limit=30):
+def get_media_spread_and_total(db_path=None, limit=30):
     """
     returns list of (name, spread, total_appearances) for characters
     spread = distinct media types, total_appearances = total join rows
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
-    cur.execute(f"""
-        select c.name,
-               count(distinct cm.type_id) as spread,
-               count(cm.id) as total_appearances
-        from characters c
-        left join character_media cm on c.id = cm.character_id
-        group by c.id
-        order by total_appearances desc
-        limit {limit};
-    """)
-    results = cur.fetchall()
-    conn.close()
-    return results
+    return disney_stats.top_spread_and_total(limit, db_path)
 
 def visualize_media_spread_vs_total():
     """scatter plot showing media spread vs total appearances"""
-    data = get_media_spread_and_total()
+    draw_media_spread_vs_total(get_media_spread_and_total())
+
+def draw_media_spread_vs_total(data, out_path=None, show=True):
+    """draws the scatter plot from (name, spread, total) rows; saves it if out_path is given"""
     spreads = [x[1] for x in data]
     totals = [x[2] for x in data]
     names = [x[0] for x in data]
@@ -57,7 +52,11 @@ def visualize_media_spread_vs_total():
     plt.ylabel("total appearances")
     plt.title("media spread vs total appearances for top disney characters")
     plt.tight_layout()
-    plt.show()
+    if out_path:
+        plt.savefig(out_path)
+    if show:
+        plt.show()
+    plt.close()
 
 if __name__ == "__main__":
     visualize_total_appearances()